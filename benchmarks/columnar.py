@@ -0,0 +1,84 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Time to get from a seeded file on disk to a GameDataset (and to the map used by inference),
+# for the .json layout and the columnar layout of the same synthetic games.
+#
+# python -m benchmarks.columnar --games 1000000
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from columnar import ColumnarData, export_columnar, load_map
+from model_dataset import GameDataset, get_sizes
+from benchmarks.synthetic import make_games
+
+def make_map(sizes):
+	ids_to_names = {}
+	names_to_ids = {}
+	for group, size in zip(("series", "genres", "esrb_ratings", "developers", "publishers"), sizes + (1, 1)):
+		ids_to_names[group] = {str(id): group + " " + str(id) for id in range(size)}
+		ids_to_names[group]["0"] = "None"
+		names_to_ids[group] = {name: int(id) for id, name in ids_to_names[group].items()}
+	return {"id-to-name": ids_to_names, "name-to-id": names_to_ids}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of synthetic games to benchmark on", default=1000000)
+	args = parser.parse_args()
+	
+	games, sizes = make_games(int(args.games))
+	data = {"games": games, "map": make_map(sizes)}
+	with tempfile.TemporaryDirectory() as directory:
+		json_path = os.path.join(directory, "data.json")
+		columnar_path = os.path.join(directory, "data")
+		with open(json_path, "w", encoding='utf-8') as f:
+			f.write(json.dumps(data))
+		export_columnar(data, columnar_path)
+		del data, games
+		
+		start = time.perf_counter()
+		with open(json_path, "r", encoding='utf-8') as f:
+			data = json.loads(f.read())
+		ds = GameDataset(data["games"], list(data["games"]), get_sizes(data["map"]["id-to-name"]))
+		json_dataset = time.perf_counter() - start
+		del data, ds
+		
+		start = time.perf_counter()
+		columnar = ColumnarData(columnar_path)
+		ds = GameDataset.from_columnar(columnar, np.arange(len(columnar)), get_sizes(columnar.map["id-to-name"]))
+		columnar_dataset = time.perf_counter() - start
+		
+		start = time.perf_counter()
+		load_map(json_path)
+		json_map = time.perf_counter() - start
+		start = time.perf_counter()
+		load_map(columnar_path)
+		columnar_map = time.perf_counter() - start
+		
+		print(json.dumps({
+			"games": int(args.games),
+			"json_bytes": os.path.getsize(json_path),
+			"json_dataset_seconds": json_dataset,
+			"columnar_dataset_seconds": columnar_dataset,
+			"json_map_seconds": json_map,
+			"columnar_map_seconds": columnar_map
+		}))
@@ -0,0 +1,35 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Measurements shared by the benchmarks.
+
+import resource
+import time
+import numpy as np
+
+def peak_rss_mb():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# the median and 99th percentile time of calling function with each query, in milliseconds
+def get_latencies(function, queries):
+	latencies = []
+	for query in queries:
+		start = time.perf_counter()
+		function(query)
+		latencies.append(time.perf_counter() - start)
+	return {"p50_ms": float(np.percentile(latencies, 50)) * 1000, "p99_ms": float(np.percentile(latencies, 99)) * 1000}
@@ -0,0 +1,106 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares the old per-item GameDataset path (building one_hot tensors for every item and letting
+# the DataLoader collate them) with batches sliced out of the dataset by GameBatchSampler.
+#
+# python -m benchmarks.dataset --games 1000000
+
+import argparse
+import json
+import time
+import numpy as np
+from torch.utils.data import DataLoader
+from model_dataset import GameDataset, GameBatchSampler
+from benchmarks.synthetic import make_games
+
+# the GameDataset.__init__ loop before it was vectorized, kept to compare against
+def build_legacy(game_dict, keys):
+	num_games = len(keys)
+	X_categorical = np.zeros((num_games, 3), dtype=np.int32)
+	X_continuous = np.zeros((num_games, 3), dtype=np.float32)
+	Y = np.zeros(num_games, dtype=np.float32)
+	indices_to_remove = []
+	i = 0
+	for key in keys:
+		current_game = game_dict[key]
+		if current_game["metacritic"] == -1:
+			current_game["metacritic"] = 70
+		if len(current_game["genres"]) < 1 or current_game["gameplay_main"] == -1 or len(current_game["release_date"]) < 4:
+			indices_to_remove.append(i)
+			i = i + 1
+			continue
+		X_categorical[i][0] = current_game["series"]
+		X_categorical[i][1] = current_game["genres"][0]
+		X_categorical[i][2] = current_game["esrb"]
+		X_continuous[i][0] = current_game["gameplay_main"]
+		X_continuous[i][1] = current_game["metacritic"]
+		X_continuous[i][2] = float((current_game["release_date"])[0:4])
+		Y[i] = current_game["target_value"]
+		i = i + 1
+	return np.delete(X_categorical, indices_to_remove, 0), np.delete(X_continuous, indices_to_remove, 0), np.delete(Y, indices_to_remove)
+
+# iterating over at most max_batches batches, extrapolated to a whole epoch
+def time_epoch(dl, max_batches):
+	start = time.perf_counter()
+	num_batches = 0
+	for xb, yb in dl:
+		num_batches = num_batches + 1
+		if num_batches == max_batches:
+			break
+	elapsed = time.perf_counter() - start
+	return elapsed * len(dl) / num_batches
+
+def run(name, games, sizes, batch_size, max_batches):
+	keys = list(games)
+	start = time.perf_counter()
+	build_legacy(games, keys)
+	legacy_build = time.perf_counter() - start
+	start = time.perf_counter()
+	ds = GameDataset(games, keys, sizes)
+	build = time.perf_counter() - start
+	
+	legacy_epoch = time_epoch(DataLoader(ds, batch_size=batch_size, shuffle=True), max_batches)
+	epoch = time_epoch(DataLoader(ds, sampler=GameBatchSampler(len(ds), batch_size, shuffle=True), batch_size=None), max_batches)
+	return {
+		"data": name,
+		"games": len(ds),
+		"batch_size": batch_size,
+		"build_seconds_before": legacy_build,
+		"build_seconds_after": build,
+		"epochs_per_second_before": 1 / legacy_epoch,
+		"epochs_per_second_after": 1 / epoch
+	}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input", required=False, help="seeded data to benchmark on", default="seeded_data/example_data.json")
+	parser.add_argument("--games", required=False, help="number of synthetic games to benchmark on", default=1000000)
+	parser.add_argument("--batch_size", required=False, help="batch size used for both paths", default=32)
+	parser.add_argument("--max_batches", required=False, help="batches timed per epoch, the rest of the epoch is extrapolated", default=2000)
+	args = parser.parse_args()
+	
+	with open(args.input, "r", encoding='utf-8') as f:
+		data_file = json.loads(f.read())
+	map_json = data_file["map"]["id-to-name"]
+	sizes = (len(map_json["series"]), len(map_json["genres"]), len(map_json["esrb_ratings"]))
+	results = [run(args.input, data_file["games"], sizes, int(args.batch_size), int(args.max_batches))]
+	games, sizes = make_games(int(args.games))
+	results.append(run("synthetic", games, sizes, int(args.batch_size), int(args.max_batches)))
+	for result in results:
+		print(json.dumps(result))
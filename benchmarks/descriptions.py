@@ -0,0 +1,79 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Time and peak memory of hashing generated descriptions into the cache used by the description model, and of
+# slicing batches of them out of the memory mapped cache. The descriptions are generated one at a time while they
+# are hashed, so the peak memory is that of the hashing alone.
+#
+# python -m benchmarks.descriptions --games 1000000
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from benchmarks.common import peak_rss_mb
+from descriptions import load_hashed_descriptions, write_hashed_descriptions
+from model_dataset import slice_bag
+
+def make_descriptions(num_games, words_per_description, vocabulary, seed=0):
+	rng = np.random.default_rng(seed)
+	words = ["word" + str(i) for i in range(vocabulary)]
+	for _ in range(num_games):
+		yield " ".join(words[i] for i in rng.integers(0, vocabulary, words_per_description))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of descriptions to hash", default=1000000)
+	parser.add_argument("--words", required=False, help="words per description", default=150)
+	parser.add_argument("--vocabulary", required=False, help="number of distinct words", default=50000)
+	parser.add_argument("--buckets", required=False, help="number of hash buckets", default=2 ** 18)
+	parser.add_argument("--batch_size", required=False, help="games per sliced batch", default=1024)
+	args = parser.parse_args()
+
+	num_games = int(args.games)
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "descriptions")
+		rss_before = peak_rss_mb()
+		start = time.perf_counter()
+		write_hashed_descriptions(make_descriptions(num_games, int(args.words), int(args.vocabulary)), num_games, int(args.buckets), path, {})
+		hash_seconds = time.perf_counter() - start
+		rss_after_hash = peak_rss_mb()
+
+		ids, offsets = load_hashed_descriptions(path)
+		ids_tensor, offsets_tensor = torch.from_numpy(ids), torch.from_numpy(offsets)
+		order = torch.randperm(num_games)
+		start = time.perf_counter()
+		num_batches = 0
+		for batch in torch.split(order, int(args.batch_size))[0:1000]:
+			slice_bag(ids_tensor, offsets_tensor, batch)
+			num_batches = num_batches + 1
+		slice_seconds = (time.perf_counter() - start) / num_batches
+		print(json.dumps({
+			"games": num_games,
+			"tokens": int(offsets[-1]),
+			"cache_mb": (os.path.getsize(os.path.join(path, "ids.bin")) + os.path.getsize(os.path.join(path, "offsets.npy"))) / 1024 / 1024,
+			"hash_seconds": hash_seconds,
+			"descriptions_per_second": num_games / hash_seconds,
+			"peak_rss_mb_before": rss_before,
+			"peak_rss_mb_after_hashing": rss_after_hash,
+			"peak_rss_mb_after_slicing": peak_rss_mb(),
+			"batch_slice_ms": slice_seconds * 1000
+		}))
@@ -0,0 +1,68 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Training throughput of train.py --workers from 1 to N processes on the same synthetic games, with the cores of the
+# machine divided among the workers. Every run is a separate train.py whose profile trace gives the samples trained
+# per second (not counting the start of the processes or the loading of the data).
+#
+# python -m benchmarks.distributed --games 1000000 --workers 1,2,4,8
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from columnar import export_columnar
+from benchmarks.columnar import make_map
+from benchmarks.synthetic import make_games
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of synthetic games to train on", default=1000000)
+	parser.add_argument("--workers", required=False, help="comma separated numbers of workers to train with", default="1,2,4")
+	parser.add_argument("--model", required=False, help="model type to train", default="embedding")
+	parser.add_argument("--epochs", required=False, help="epochs to train for", default=2)
+	parser.add_argument("--batch_size", required=False, help="batch size, split among the workers", default=1024)
+	args = parser.parse_args()
+
+	games, sizes = make_games(int(args.games))
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "data")
+		export_columnar({"games": games, "map": make_map(sizes)}, path)
+		del games
+		results = []
+		for workers in [int(workers) for workers in args.workers.split(",")]:
+			trace_path = os.path.join(directory, "trace-" + str(workers) + ".json")
+			start = time.perf_counter()
+			subprocess.run([sys.executable, "train.py", "--input", path, "--output", os.path.join(directory, "model.pt"), "--model", args.model, "--shuffles", "1", "--epochs", str(args.epochs), "--eval_interval", str(args.epochs), "--batch_size", str(args.batch_size), "--workers", str(workers), "--profile", "--profile_output", trace_path], check=True, stdout=subprocess.DEVNULL)
+			wall_seconds = time.perf_counter() - start
+			with open(trace_path, "r", encoding='utf-8') as f:
+				trace = json.loads(f.read())
+			results.append({
+				"games": int(args.games),
+				"model": args.model,
+				"workers": workers,
+				"wall_seconds": wall_seconds,
+				"samples_per_second": trace["values"]["train samples per second"]
+			})
+		for result in results:
+			result["speedup"] = result["samples_per_second"] / results[0]["samples_per_second"]
+			result["efficiency"] = result["speedup"] * results[0]["workers"] / result["workers"]
+			print(json.dumps(result))
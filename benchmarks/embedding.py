@@ -0,0 +1,77 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Memory and forward-pass time of the one-hot TrainingModel and the EmbeddingTrainingModel as the vocabulary grows.
+# The one-hot input of a batch is (batch_size * vocabulary) floats for each category, the embedding input only ids.
+#
+# python -m benchmarks.embedding --batch_size 1024
+
+import argparse
+import json
+import time
+import torch
+import torch.nn.functional as F
+from model_dataset import TrainingModel, EmbeddingTrainingModel
+
+def parameter_bytes(model):
+	return sum(parameter.numel() * parameter.element_size() for parameter in model.parameters())
+
+def time_forward(func, repeats):
+	with torch.no_grad():
+		func()
+		start = time.perf_counter()
+		for _ in range(repeats):
+			func()
+	return (time.perf_counter() - start) / repeats
+
+def run(vocabulary, batch_size, repeats, max_input_bytes):
+	sizes = (vocabulary, vocabulary, 5)
+	categorical = torch.stack([torch.randint(0, size, (batch_size,)) for size in sizes], 1)
+	continuous = torch.rand(batch_size, 3)
+	one_hot_model = TrainingModel(sizes).eval()
+	embedding_model = EmbeddingTrainingModel.from_one_hot(one_hot_model).eval()
+	
+	one_hot_input_bytes = batch_size * sum(sizes) * 4
+	result = {
+		"vocabulary": vocabulary,
+		"batch_size": batch_size,
+		"one_hot_parameter_bytes": parameter_bytes(one_hot_model),
+		"embedding_parameter_bytes": parameter_bytes(embedding_model),
+		"one_hot_input_bytes": one_hot_input_bytes,
+		"embedding_input_bytes": categorical.numel() * categorical.element_size(),
+		"one_hot_forward_ms": None,
+		"embedding_forward_ms": time_forward(lambda: embedding_model((categorical, continuous)), repeats) * 1000
+	}
+	# the one-hot input of huge vocabularies does not fit into memory
+	if one_hot_input_bytes <= max_input_bytes:
+		def one_hot_forward():
+			one_hot = tuple(F.one_hot(categorical[:, i], size).type(torch.FloatTensor) for i, size in enumerate(sizes))
+			return one_hot_model((one_hot, continuous))
+		result["one_hot_forward_ms"] = time_forward(one_hot_forward, repeats) * 1000
+	return result
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--vocabularies", required=False, help="comma separated vocabulary sizes of series and genres", default="100,1000,10000,100000,1000000")
+	parser.add_argument("--batch_size", required=False, help="number of games per forward pass", default=1024)
+	parser.add_argument("--repeats", required=False, help="forward passes timed per vocabulary size", default=20)
+	parser.add_argument("--max_input_mb", required=False, help="largest one-hot batch to try, in megabytes", default=2048)
+	args = parser.parse_args()
+	
+	for vocabulary in args.vocabularies.split(","):
+		print(json.dumps(run(int(vocabulary), int(args.batch_size), int(args.repeats), int(args.max_input_mb) * 1024 * 1024)))
@@ -0,0 +1,84 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Time to find the top K games of a columnar catalogue of synthetic games with the contribution tables of ranking.py,
+# versus running the torch model over the whole catalogue a batch at a time and sorting every prediction.
+#
+# python -m benchmarks.ranking --games 1000000
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from columnar import export_columnar
+from model_dataset import GameDataset, get_sizes
+from numpy_model import NumpyModel, export_tables
+from ranking import Catalogue, rank_games
+from train import get_model
+from benchmarks.columnar import make_map
+from benchmarks.synthetic import make_games
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of synthetic games in the catalogue", default=1000000)
+	parser.add_argument("--model", required=False, help="model type to rank with", default="embedding")
+	parser.add_argument("--top", required=False, help="how many games to rank", default=10)
+	parser.add_argument("--batch_size", required=False, help="games per forward pass of the torch model", default=65536)
+	args = parser.parse_args()
+
+	torch.manual_seed(0)
+	games, sizes = make_games(int(args.games))
+	data = {"games": games, "map": make_map(sizes)}
+	sizes = get_sizes(data["map"]["id-to-name"])
+	model, _ = get_model(sizes, 0.001, args.model)
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "data")
+		export_columnar(data, path)
+		del data, games
+
+		start = time.perf_counter()
+		tables = NumpyModel(export_tables(model))
+		export_seconds = time.perf_counter() - start
+		start = time.perf_counter()
+		catalogue = Catalogue(path)
+		catalogue.load(tables)
+		load_seconds = time.perf_counter() - start
+		start = time.perf_counter()
+		ranked = rank_games(tables, catalogue, int(args.top))
+		rank_seconds = time.perf_counter() - start
+
+		ds = GameDataset.from_columnar(catalogue.data, np.arange(len(catalogue.data)), sizes, args.model)
+		start = time.perf_counter()
+		with torch.no_grad():
+			predictions = torch.cat([model(ds.get_batch(batch)[0]).reshape(-1) for batch in torch.split(torch.arange(len(ds)), int(args.batch_size))])
+		torch_order = torch.argsort(predictions, descending=True)[0:int(args.top)].numpy()
+		torch_seconds = time.perf_counter() - start
+
+		print(json.dumps({
+			"games": len(catalogue),
+			"model": args.model,
+			"top": int(args.top),
+			"export_tables_seconds": export_seconds,
+			"load_catalogue_seconds": load_seconds,
+			"rank_seconds": rank_seconds,
+			"torch_forward_and_sort_seconds": torch_seconds,
+			"same_top": [int(i) for i, _, _ in ranked] == torch_order.tolist()
+		}))
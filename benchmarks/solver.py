@@ -0,0 +1,97 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Wall-clock time and validation L1 loss of training with SGD (as train.py does by default) versus the
+# direct lstsq and l1 solvers, all on the same train / validation split.
+#
+# python -m benchmarks.solver --games 100000
+
+import argparse
+import contextlib
+import io
+import json
+import time
+import numpy as np
+import torch
+from model_dataset import get_sizes
+from train import get_model, get_data, get_data_sets, get_loss, fit
+from solver import fit_direct
+from benchmarks.synthetic import make_games
+
+# the random targets of make_games cannot be learned, so they are replaced by a noisy linear function
+def make_linear_targets(games, seed=0):
+	rng = np.random.default_rng(seed)
+	series_effect = rng.normal(0, 1.5, max(game["series"] for game in games.values()) + 1)
+	for game in games.values():
+		target = 5 + series_effect[game["series"]] + (game["metacritic"] - 70) / 10 + rng.normal(0, 0.5)
+		game["target_value"] = float(min(max(target, 0), 10))
+
+def run(name, games, sizes, model_type, epochs, batch_size, validity_size, lr, l2):
+	torch.manual_seed(0)
+	np.random.seed(0)
+	train_ds, valid_ds = get_data_sets(games, sizes, model_type)
+	train_dl, valid_dl = get_data(train_ds, valid_ds, batch_size, validity_size)
+	results = []
+
+	model, opt = get_model(sizes, lr, model_type)
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		fit(0, epochs, model, torch.nn.L1Loss(), opt, train_dl, valid_dl)
+	elapsed = time.perf_counter() - start
+	results.append(("sgd", elapsed, get_loss(model, torch.nn.L1Loss(), valid_dl)))
+
+	for solver in ("lstsq", "l1"):
+		model, _ = get_model(sizes, lr, model_type)
+		start = time.perf_counter()
+		fit_direct(model, train_ds, solver, l2)
+		elapsed = time.perf_counter() - start
+		results.append((solver, elapsed, get_loss(model, torch.nn.L1Loss(), valid_dl)))
+
+	return [{
+		"data": name,
+		"model": model_type,
+		"games": len(train_ds) + len(valid_ds),
+		"solver": solver,
+		"epochs": epochs if solver == "sgd" else None,
+		"seconds": elapsed,
+		"validation_l1_loss": float(loss)
+	} for solver, elapsed, loss in results]
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input", required=False, help="seeded data to benchmark on", default="seeded_data/example_data.json")
+	parser.add_argument("--games", required=False, help="number of synthetic games to benchmark on", default=100000)
+	parser.add_argument("--model", required=False, help="model type to train", default="one_hot")
+	parser.add_argument("--epochs", required=False, help="SGD epochs on the seeded data (train.py trains for 2 * 1000)", default=2000)
+	parser.add_argument("--synthetic_epochs", required=False, help="SGD epochs on the synthetic data", default=5)
+	parser.add_argument("--batch_size", required=False, help="SGD batch size", default=32)
+	parser.add_argument("--learning_rate", required=False, help="SGD learning rate", default=0.000001)
+	parser.add_argument("--l2", required=False, help="ridge penalty of the direct solvers", default=0)
+	args = parser.parse_args()
+
+	with open(args.input, "r", encoding='utf-8') as f:
+		data_file = json.loads(f.read())
+	sizes = get_sizes(data_file["map"]["id-to-name"])
+	results = run(args.input, data_file["games"], sizes, args.model, int(args.epochs), int(args.batch_size), 64, float(args.learning_rate), float(args.l2))
+	games, sizes = make_games(int(args.games))
+	make_linear_targets(games)
+	# the synthetic games have no developers or publishers
+	sizes = sizes + (1, 1)
+	results = results + run("synthetic", games, sizes, args.model, int(args.synthetic_epochs), int(args.batch_size), 1024, float(args.learning_rate), float(args.l2))
+	for result in results:
+		print(json.dumps(result))
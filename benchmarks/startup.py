@@ -0,0 +1,74 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Import time and end-to-end command line latency of inference.py, with a torch model and with the same model
+# exported to numpy tables. Also checks that the numpy path never imports torch or the RAWG / Howlongtobeat clients,
+# since that alone is far slower than evaluating the model.
+#
+# python -m benchmarks.startup --runs 10
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+GAME = ["--series", "Final Fantasy", "--genre", "RPG", "--esrb", "Teen", "--gameplay", "30", "--metacritic", "80", "--release", "2030"]
+
+def time_command(command, runs):
+	times = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		times.append(time.perf_counter() - start)
+	return float(np.median(times))
+
+def get_imported_modules(arguments):
+	code = "import sys, runpy; sys.argv = " + repr(["inference.py"] + arguments) + "; runpy.run_path('inference.py', run_name='__main__'); print(' '.join(sys.modules))"
+	out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+	return out.strip().split("\n")[-1].split(" ")
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input_model", required=False, help="torch model to benchmark (by default one is trained for a few epochs on --input_map, since models/example_model.pt can not be converted)", default="")
+	parser.add_argument("--input_map", required=False, help="map of the model", default="seeded_data/example_data.json")
+	parser.add_argument("--runs", required=False, help="runs per measurement, the median is reported", default=10)
+	args = parser.parse_args()
+	runs = int(args.runs)
+	
+	with tempfile.TemporaryDirectory() as directory:
+		if args.input_model == "":
+			args.input_model = os.path.join(directory, "model.pt")
+			subprocess.run([sys.executable, "train.py", "--input", args.input_map, "--output", args.input_model, "--epochs", "5", "--shuffles", "1"], check=True, stdout=subprocess.DEVNULL)
+		numpy_model = os.path.join(directory, "model.npz")
+		subprocess.run([sys.executable, "convert_model.py", "--input_model", args.input_model, "--input_map", args.input_map, "--to", "numpy", "--output", numpy_model], check=True, stdout=subprocess.DEVNULL)
+		torch_arguments = ["--input_model", args.input_model, "--input_map", args.input_map] + GAME
+		numpy_arguments = ["--input_model", numpy_model, "--input_map", args.input_map] + GAME
+		modules = get_imported_modules(numpy_arguments)
+		print(json.dumps({
+			"python_seconds": time_command([sys.executable, "-c", "pass"], runs),
+			"import_torch_seconds": time_command([sys.executable, "-c", "import torch"], runs),
+			"import_inference_seconds": time_command([sys.executable, "-c", "import inference"], runs),
+			"cli_torch_seconds": time_command([sys.executable, "inference.py"] + torch_arguments, runs),
+			"cli_numpy_seconds": time_command([sys.executable, "inference.py"] + numpy_arguments, runs),
+			"numpy_path_imports_torch": "torch" in modules,
+			"numpy_path_imports_clients": "howlongtobeatpy" in modules or "rawg" in modules
+		}))
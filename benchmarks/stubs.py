@@ -0,0 +1,139 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A local HTTP server which stands in for RAWG and Howlongtobeat, answering with the games of a SyntheticVocabulary
+# after a configurable delay, and clients for it with the same search() interface as the real ones, which Lookup
+# and seed.create_games accept in their place. Seeding the .csv file written by benchmarks.synthetic against it gives
+# the same seeded file as benchmarks.synthetic writes, with real requests, threads and rate limits in between.
+#
+# python -m benchmarks.stubs --port 8765 --latency_ms 50
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.synthetic import SyntheticVocabulary
+
+# RAWG returns this many results for every search; seeding with a selector of 1 picks the second one
+NUM_RESULTS = 2
+
+class StubHandler(BaseHTTPRequestHandler):
+	def do_GET(self):
+		url = urllib.parse.urlparse(self.path)
+		query = urllib.parse.parse_qs(url.query)
+		name = query.get("name", [""])[0]
+		result = int(query.get("result", ["0"])[0])
+		time.sleep(self.server.latency)
+		with self.server.lock:
+			self.server.requests = self.server.requests + 1
+		if url.path == "/rawg/search":
+			body = [{"name": name, "result": i} for i in range(NUM_RESULTS)]
+		elif url.path == "/rawg/game":
+			body = self.server.vocabulary.get_rawg(name, result)
+		elif url.path == "/hltb/search":
+			body = [self.server.vocabulary.get_hltb(name, i) for i in range(NUM_RESULTS)]
+		else:
+			self.send_error(404)
+			return
+		encoded = json.dumps(body).encode('utf-8')
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(encoded)))
+		self.end_headers()
+		self.wfile.write(encoded)
+
+	def log_message(self, format, *args):
+		pass
+
+# serves on a background thread until shutdown() is called; port 0 picks a free port (see server.server_port)
+def start_stub_server(vocabulary, port=0, latency=0.):
+	server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+	server.daemon_threads = True
+	server.vocabulary = vocabulary
+	server.latency = latency
+	server.lock = threading.Lock()
+	server.requests = 0
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+def get_json(url, path, **params):
+	with urllib.request.urlopen(url + path + "?" + urllib.parse.urlencode(params)) as response:
+		return json.loads(response.read())
+
+class Named:
+	def __init__(self, name):
+		self.name = name
+
+# a search result of the RAWG client, whose details are only requested by populate()
+class StubRawgGame:
+	def __init__(self, url, name, result):
+		self.url = url
+		self.name = name
+		self.result = result
+
+	def populate(self):
+		game = get_json(self.url, "/rawg/game", name=self.name, result=self.result)
+		# like the real client, the attributes RAWG has no data for are missing
+		if game["esrb"] is not None:
+			self.esrb_rating = {"name": game["esrb"]}
+		if game["metacritic"] is not None:
+			self.metacritic = game["metacritic"]
+		self.genres = [Named(name) for name in game["genres"]]
+		self.developers = [Named(name) for name in game["developers"]]
+		self.publishers = [Named(name) for name in game["publishers"]]
+		self.description_raw = game["description"]
+		self.released = game["released"]
+
+class StubRawg:
+	def __init__(self, url):
+		self.url = url
+
+	def search(self, name):
+		return [StubRawgGame(self.url, result["name"], result["result"]) for result in get_json(self.url, "/rawg/search", name=name)]
+
+class StubHltbEntry:
+	def __init__(self, entry):
+		self.gameplay_main = entry["gameplay_main"]
+		self.gameplay_main_unit = entry["gameplay_main_unit"]
+		self.gameplay_completionist = entry["gameplay_completionist"]
+		self.gameplay_completionist_unit = entry["gameplay_completionist_unit"]
+
+class StubHltb:
+	def __init__(self, url):
+		self.url = url
+
+	def search(self, name):
+		return [StubHltbEntry(entry) for entry in get_json(self.url, "/hltb/search", name=name)]
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--port", required=False, help="port to serve on", default=8765)
+	parser.add_argument("--latency_ms", required=False, help="delay of every response in milliseconds", default=0)
+	parser.add_argument("--seed", required=False, help="random seed of the vocabulary, the same as given to benchmarks.synthetic", default=0)
+	args = parser.parse_args()
+
+	server = start_stub_server(SyntheticVocabulary(seed=int(args.seed)), int(args.port), float(args.latency_ms) / 1000)
+	print("Serving stub RAWG / Howlongtobeat on http://127.0.0.1:" + str(server.server_port))
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		server.shutdown()
@@ -0,0 +1,300 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# The whole pipeline on synthetic data, end to end: generating seeded data with benchmarks.synthetic, seeding part
+# of its rows again against the stub RAWG / Howlongtobeat server of benchmarks.stubs, building the datasets, training
+# and scoring games one at a time and in batches. Every stage runs in its own process (python -m benchmarks.suite
+# --stage ...) so that its peak memory is its own. The results are written to benchmark_results/ as a JSON file
+# named after the time and the commit, and --compare prints how they changed against an earlier one.
+#
+# python -m benchmarks.suite --games 100000
+# python -m benchmarks.suite --games 100000 --compare benchmark_results/<earlier run>.json
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.common import get_latencies, peak_rss_mb
+from columnar import load_seeded
+
+STAGES = ["generate", "seed", "dataset", "train", "inference"]
+
+# the seeded .json file and the .csv file of its rows, and the same data as a columnar directory
+def run_generate(args):
+	from benchmarks.synthetic import SyntheticVocabulary, tee_rows, write_seeded_data
+	from columnar import export_columnar
+	vocabulary = SyntheticVocabulary(seed=args.seed)
+	start = time.perf_counter()
+	num_games = write_seeded_data(os.path.join(args.directory, "data.json"), vocabulary, tee_rows(os.path.join(args.directory, "rows.csv"), vocabulary.make_games(args.games, args.seed)))
+	generate_seconds = time.perf_counter() - start
+	start = time.perf_counter()
+	export_columnar(load_seeded(os.path.join(args.directory, "data.json")), os.path.join(args.directory, "columnar"))
+	return {
+		"games": num_games,
+		"generate_seconds": generate_seconds,
+		"export_columnar_seconds": time.perf_counter() - start,
+		"json_mb": os.path.getsize(os.path.join(args.directory, "data.json")) / 1024 / 1024
+	}
+
+# seed.py on the first rows of the .csv file, with every RAWG / Howlongtobeat request answered by the stub server
+def run_seed(args):
+	import seed
+	from benchmarks.stubs import StubHltb, StubRawg, start_stub_server
+	from benchmarks.synthetic import SyntheticVocabulary
+	input = os.path.join(args.directory, "seed_rows.csv")
+	with open(os.path.join(args.directory, "rows.csv"), "r", encoding='utf-8') as f:
+		lines = list(itertools.islice(f, args.seed_games + 1))
+	with open(input, "w", encoding='utf-8') as f:
+		f.writelines(lines)
+	server = start_stub_server(SyntheticVocabulary(seed=args.seed), latency=args.latency_ms / 1000)
+	url = "http://127.0.0.1:" + str(server.server_port)
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		seed.create_games(input, os.path.join(args.directory, "seeded.json"), workers=args.seed_workers, rawg=StubRawg(url), hltb=StubHltb(url))
+	elapsed = time.perf_counter() - start
+	server.shutdown()
+	return {
+		"rows": len(lines) - 1,
+		"workers": args.seed_workers,
+		"latency_ms": args.latency_ms,
+		"requests": server.requests,
+		"seconds": elapsed,
+		"rows_per_second": (len(lines) - 1) / elapsed
+	}
+
+# the hashed descriptions of the games and the sizes of the model for them, only needed by the description model
+def get_descriptions(args, path, games, sizes):
+	from descriptions import DEFAULT_BUCKETS, get_hashed_descriptions
+	if args.model != "description":
+		return None, sizes
+	return get_hashed_descriptions(path, games, DEFAULT_BUCKETS), sizes + (DEFAULT_BUCKETS,)
+
+# loading the games and building the GameDatasets of one shuffle, from the .json file and from the columnar directory
+def run_dataset(args):
+	from columnar import ColumnarData
+	from model_dataset import get_sizes
+	from train import get_data_sets
+	result = {}
+	for name, path in (("json", os.path.join(args.directory, "data.json")), ("columnar", os.path.join(args.directory, "columnar"))):
+		start = time.perf_counter()
+		if name == "json":
+			data = load_seeded(path)
+			games = data["games"]
+			sizes = get_sizes(data["map"]["name-to-id"])
+		else:
+			games = ColumnarData(path)
+			sizes = get_sizes(games.map["name-to-id"])
+		load_seconds = time.perf_counter() - start
+		start = time.perf_counter()
+		descriptions, sizes = get_descriptions(args, path, games, sizes)
+		hash_seconds = time.perf_counter() - start
+		start = time.perf_counter()
+		train_ds, valid_ds = get_data_sets(games, sizes, args.model, descriptions)
+		result[name] = {"load_seconds": load_seconds, "hash_seconds": hash_seconds, "build_seconds": time.perf_counter() - start, "games": len(train_ds) + len(valid_ds)}
+	return result
+
+# fit() for a few epochs of one shuffle; the model is kept for the inference stage
+def run_train(args):
+	import torch
+	from columnar import ColumnarData
+	from model_dataset import get_sizes
+	from numpy_model import export_tables, save_tables
+	from train import fit, get_data, get_data_sets, get_model
+	random.seed(args.seed)
+	np.random.seed(args.seed)
+	torch.manual_seed(args.seed)
+	games = ColumnarData(os.path.join(args.directory, "columnar"))
+	descriptions, sizes = get_descriptions(args, os.path.join(args.directory, "columnar"), games, get_sizes(games.map["name-to-id"]))
+	train_ds, valid_ds = get_data_sets(games, sizes, args.model, descriptions)
+	train_dl, valid_dl = get_data(train_ds, valid_ds, args.batch_size, 1024)
+	model, opt = get_model(sizes, 0.0001, args.model)
+	start = time.perf_counter()
+	fit(0, args.epochs, model, torch.nn.L1Loss(), opt, train_dl, valid_dl, verbose=False)
+	elapsed = time.perf_counter() - start
+	model.eval()
+	torch.save(model.state_dict(), os.path.join(args.directory, "model.pt"))
+	save_tables(export_tables(model), os.path.join(args.directory, "model.npz"))
+	return {
+		"model": args.model,
+		"games": len(train_ds),
+		"batch_size": args.batch_size,
+		"epochs": args.epochs,
+		"epochs_per_second": args.epochs / elapsed,
+		"samples_per_second": len(train_ds) * args.epochs / elapsed
+	}
+
+# the batch input of inference.py for the games of the seeded data
+def write_batch_input(path, data):
+	names = data["map"]["id-to-name"]
+	with open(path, "w", encoding='utf-8') as f:
+		for game in data["games"].values():
+			f.write(json.dumps({
+				"series": names["series"][str(game["series"])],
+				"genre": [names["genres"][str(id)] for id in game["genres"]],
+				"esrb": names["esrb_ratings"][str(game["esrb"])],
+				"gameplay": game["gameplay_main"],
+				"metacritic": game["metacritic"],
+				"release": int(game["release_date"][0:4]) if len(game["release_date"]) >= 4 else -1,
+				"developers": [names["developers"][str(id)] for id in game["developers"]],
+				"publishers": [names["publishers"][str(id)] for id in game["publishers"]],
+				"description": game["description"]
+			}) + "\n")
+	return len(data["games"])
+
+# scoring single games (what inference.py does for one --name) and whole files (inference.py --batch_input), with the
+# torch model and with the same model exported for NumpyModel
+def run_inference(args):
+	from inference import load_model, predict, run_batch
+	from model_dataset import get_sizes
+	from title_index import GameIndex
+	data = load_seeded(os.path.join(args.directory, "data.json"))
+	names_to_ids = data["map"]["name-to-id"]
+	sizes = get_sizes(names_to_ids)
+	games = list(data["games"].values())
+	rng = random.Random(args.seed)
+	queries = [games[rng.randrange(len(games))] for _ in range(args.queries)]
+	input = os.path.join(args.directory, "batch.jsonl")
+	num_games = write_batch_input(input, data)
+	start = time.perf_counter()
+	index = GameIndex(os.path.join(args.directory, "data.json"), data)
+	result = {"index_build_seconds": time.perf_counter() - start, "local_lookup": get_latencies(lambda game: index.find(game["name"]), queries)}
+	for name in ("model.pt", "model.npz"):
+		model = load_model(os.path.join(args.directory, name), names_to_ids)
+		def predict_game(game):
+			release = int(game["release_date"][0:4]) if len(game["release_date"]) >= 4 else -1
+			genre = game["genres"][0] if len(game["genres"]) > 0 else 0
+			predict(model, sizes, [[game["series"], genre, game["esrb"]]], [[game["gameplay_main"], game["metacritic"], release]], [[game["genres"], game["developers"], game["publishers"]]], [game["description"]])
+		latencies = get_latencies(predict_game, queries)
+		start = time.perf_counter()
+		with contextlib.redirect_stdout(io.StringIO()):
+			run_batch(model, names_to_ids, input, os.path.join(args.directory, "predictions.csv"), args.inference_batch_size)
+		result[name.replace(".", "_")] = {"predict": latencies, "batch_games_per_second": num_games / (time.perf_counter() - start)}
+	return result
+
+STAGE_FUNCTIONS = {"generate": run_generate, "seed": run_seed, "dataset": run_dataset, "train": run_train, "inference": run_inference}
+
+def get_git(*arguments):
+	try:
+		return subprocess.run(["git"] + list(arguments), capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return ""
+
+def get_versions():
+	versions = {"python": platform.python_version(), "numpy": np.__version__}
+	try:
+		import torch
+		versions["torch"] = torch.__version__
+	except ImportError:
+		pass
+	return versions
+
+# runs one stage in a new process, which prints its result as the last line of its output
+def run_stage(stage, args, directory):
+	arguments = [sys.executable, "-m", "benchmarks.suite", "--stage", stage, "--directory", directory]
+	for name in ("games", "seed", "seed_games", "seed_workers", "latency_ms", "model", "epochs", "batch_size", "queries", "inference_batch_size"):
+		arguments = arguments + ["--" + name, str(getattr(args, name))]
+	start = time.perf_counter()
+	output = subprocess.run(arguments, capture_output=True, text=True)
+	if output.returncode != 0:
+		print(output.stdout + output.stderr)
+		print("Error: the " + stage + " stage failed")
+		exit(-1)
+	result = json.loads(output.stdout.strip().split("\n")[-1])
+	result["wall_seconds"] = time.perf_counter() - start
+	return result
+
+# the numbers of two results with the same layout, as (path, before, after)
+def get_changes(before, after, path=""):
+	if isinstance(before, dict) and isinstance(after, dict):
+		return [change for key in after if key in before for change in get_changes(before[key], after[key], path + "/" + key)]
+	if isinstance(before, (int, float)) and isinstance(after, (int, float)) and not isinstance(after, bool):
+		return [(path, before, after)]
+	return []
+
+def compare(path, result):
+	with open(path, "r", encoding='utf-8') as f:
+		before = json.loads(f.read())
+	print("Compared with " + str(before.get("commit", "")) + " (" + path + "):")
+	changed = [name for name in result["config"] if before.get("config", {}).get(name) != result["config"][name]]
+	if len(changed) > 0:
+		print("Warning: the runs were made with different " + ", ".join(changed) + ", so not all numbers are comparable")
+	for name, old, new in get_changes(before["results"], result["results"]):
+		ratio = "%.2fx" % (new / old) if old != 0 else "-"
+		print("  " + name + ": " + "%.4g" % old + " -> " + "%.4g" % new + " (" + ratio + ")")
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of synthetic games to generate", default=100000)
+	parser.add_argument("--seed", required=False, help="random seed of the synthetic games", default=0)
+	parser.add_argument("--seed_games", required=False, help="number of the games seeded again against the stub server", default=2000)
+	parser.add_argument("--seed_workers", required=False, help="workers of seed.py", default=8)
+	parser.add_argument("--latency_ms", required=False, help="delay of every response of the stub server in milliseconds", default=20)
+	parser.add_argument("--model", required=False, help="model type to train and score with", default="embedding")
+	parser.add_argument("--epochs", required=False, help="epochs to train for", default=3)
+	parser.add_argument("--batch_size", required=False, help="training batch size", default=256)
+	parser.add_argument("--queries", required=False, help="number of single games scored for the latencies", default=1000)
+	parser.add_argument("--inference_batch_size", required=False, help="batch size of inference.py --batch_input", default=65536)
+	parser.add_argument("--stages", required=False, help="comma separated stages to run (generate always runs)", default=",".join(STAGES))
+	parser.add_argument("--output", required=False, help="directory to write the results to", default="benchmark_results")
+	parser.add_argument("--compare", required=False, help="results of an earlier run to compare with", default="")
+	parser.add_argument("--stage", required=False, help=argparse.SUPPRESS, choices=STAGES)
+	parser.add_argument("--directory", required=False, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	for name in ("games", "seed", "seed_games", "seed_workers", "epochs", "batch_size", "queries", "inference_batch_size"):
+		setattr(args, name, int(getattr(args, name)))
+	args.latency_ms = float(args.latency_ms)
+
+	if args.stage is not None:
+		result = STAGE_FUNCTIONS[args.stage](args)
+		result["peak_rss_mb"] = peak_rss_mb()
+		print(json.dumps(result))
+		exit(0)
+
+	stages = ["generate"] + [stage for stage in args.stages.split(",") if stage in STAGES and stage != "generate"]
+	results = {}
+	with tempfile.TemporaryDirectory() as directory:
+		for stage in stages:
+			print("Running " + stage)
+			results[stage] = run_stage(stage, args, directory)
+	status = get_git("status", "--porcelain", "--untracked-files=no")
+	result = {
+		"commit": get_git("rev-parse", "HEAD"),
+		"dirty": status != "",
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+		"versions": get_versions(),
+		"config": {name: value for name, value in vars(args).items() if name not in ("stage", "directory", "output", "compare")},
+		"results": results
+	}
+	os.makedirs(args.output, exist_ok=True)
+	path = os.path.join(args.output, time.strftime("%Y%m%d-%H%M%S") + "-" + (result["commit"][0:10] or "unknown") + ".json")
+	with open(path, "w", encoding='utf-8') as f:
+		f.write(json.dumps(result, indent=2))
+	print(json.dumps(results, indent=2))
+	print("Wrote the results to " + path)
+	if args.compare != "":
+		compare(args.compare, result)
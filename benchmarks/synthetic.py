@@ -0,0 +1,190 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Generated games for the benchmarks. make_games quickly builds games with uniformly drawn ids and no text, for
+# benchmarks which only need the numbers. SyntheticVocabulary describes games the way RAWG and Howlongtobeat do, with
+# series, genres, developers, publishers and description words drawn from Zipfian distributions like those of real
+# games (a few very common names and a long tail of rare ones), and is used to write whole seeded files of any size,
+# the .csv files seed.py reads, and the answers of the stub servers in benchmarks/stubs.py. Every game is derived from
+# its title alone, so the stub servers answer exactly what the generated seeded file contains.
+#
+# python -m benchmarks.synthetic --games 1000000 --output seeded_data/synthetic.json --csv raw_data/synthetic.csv
+
+import argparse
+import csv
+import itertools
+import json
+import random
+import zlib
+import numpy as np
+from seed import add_game
+
+GENRES = ["Action", "Indie", "Adventure", "RPG", "Strategy", "Shooter", "Casual", "Simulation", "Puzzle", "Arcade", "Platformer", "Racing", "Massively Multiplayer", "Sports", "Fighting", "Family", "Board Games", "Educational", "Card"]
+ESRB_RATINGS = ["Everyone", "Teen", "Mature", "Everyone 10+", "Rating Pending", "Adults Only Rating"]
+SYLLABLES = ["ka", "ro", "mi", "ta", "lu", "ne", "so", "vi", "da", "go", "ri", "zel", "mar", "ion", "tor", "qua", "pel", "sha", "dor", "fin", "bra", "cle", "xo", "ny", "wen", "ul", "em", "ash"]
+
+# builds a dict in the same layout as the "games" of a seeded file, without any network access
+def make_games(num_games, num_series=1000, num_genres=20, num_esrb_ratings=5, seed=0):
+	rng = np.random.default_rng(seed)
+	series = rng.integers(0, num_series, num_games)
+	genres = rng.integers(1, num_genres, num_games)
+	esrb = rng.integers(0, num_esrb_ratings, num_games)
+	gameplay = rng.integers(1, 100, num_games)
+	metacritic = rng.integers(40, 100, num_games)
+	release = rng.integers(1980, 2025, num_games)
+	target = rng.integers(0, 11, num_games)
+	games = {}
+	for i in range(num_games):
+		games["Game " + str(i)] = {
+			"name": "Game " + str(i),
+			"esrb": int(esrb[i]),
+			"description": "",
+			"release_date": str(release[i]) + "-01-01",
+			"metacritic": int(metacritic[i]),
+			"genres": [int(genres[i])],
+			"developers": [],
+			"publishers": [],
+			"series": int(series[i]),
+			"gameplay_main": int(gameplay[i]),
+			"gameplay_completionist": -1,
+			"target_value": int(target[i])
+		}
+	return games, (num_series, num_genres, num_esrb_ratings)
+
+# cumulative weights of a Zipfian distribution over num_values ranks, for random.choices
+def get_zipf_weights(num_values, exponent):
+	return list(itertools.accumulate((rank + 1) ** -exponent for rank in range(num_values)))
+
+def make_word(rng, min_syllables=1, max_syllables=3):
+	return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(min_syllables, max_syllables)))
+
+# num_values distinct names, each of 1 to max_words made up words
+def make_names(rng, num_values, max_words):
+	names = []
+	seen = set()
+	while len(names) < num_values:
+		name = " ".join(make_word(rng).capitalize() for _ in range(rng.randint(1, max_words)))
+		if name not in seen:
+			seen.add(name)
+			names.append(name)
+	return names
+
+class SyntheticVocabulary:
+	def __init__(self, num_series=20000, num_developers=30000, num_publishers=10000, num_words=30000, exponent=1.1, seed=0):
+		rng = random.Random(seed)
+		self.seed = seed
+		self.series = make_names(rng, num_series, 2)
+		self.developers = [name + " " + rng.choice(["Studios", "Games", "Entertainment", "Interactive", "Software"]) for name in make_names(rng, num_developers, 2)]
+		self.publishers = [name + " " + rng.choice(["Publishing", "Digital", "Media", "Inc."]) for name in make_names(rng, num_publishers, 2)]
+		self.words = [make_word(rng) for _ in range(num_words)]
+		self.series_weights = get_zipf_weights(num_series, exponent)
+		self.genre_weights = get_zipf_weights(len(GENRES), exponent)
+		self.developer_weights = get_zipf_weights(num_developers, exponent)
+		self.publisher_weights = get_zipf_weights(num_publishers, exponent)
+		self.word_weights = get_zipf_weights(num_words, exponent)
+		self.esrb_weights = get_zipf_weights(len(ESRB_RATINGS), exponent)
+
+	def choose(self, rng, values, weights, k):
+		return rng.choices(values, cum_weights=weights, k=k)
+
+	# the RAWG details (as returned by lookup.fetch_rawg) of the game with the given title, and of other games
+	# RAWG finds for the title after it (result > 0)
+	def get_rawg(self, title, result=0):
+		rng = random.Random(zlib.crc32((title + "|" + str(result) + "|" + str(self.seed)).encode('utf-8')))
+		genres = list(dict.fromkeys(self.choose(rng, GENRES, self.genre_weights, rng.randint(1, 3))))
+		num_words = 0 if rng.random() < 0.05 else min(int(rng.lognormvariate(4.3, 0.7)), 1000)
+		return {
+			"esrb": None if rng.random() < 0.2 else self.choose(rng, ESRB_RATINGS, self.esrb_weights, 1)[0],
+			"metacritic": None if rng.random() < 0.3 else int(min(max(rng.gauss(72, 10), 20), 99)),
+			"genres": genres if rng.random() >= 0.02 else [],
+			"developers": list(dict.fromkeys(self.choose(rng, self.developers, self.developer_weights, rng.randint(1, 2)))),
+			"publishers": self.choose(rng, self.publishers, self.publisher_weights, 1),
+			"description": " ".join(self.choose(rng, self.words, self.word_weights, num_words)),
+			"released": "%d-%02d-%02d" % (rng.randint(1985, 2024), rng.randint(1, 12), rng.randint(1, 28))
+		}
+
+	# the Howlongtobeat entry (as returned by lookup.fetch_hltb) of the game with the given title
+	def get_hltb(self, title, result=0):
+		rng = random.Random(zlib.crc32((title + "|hltb|" + str(result) + "|" + str(self.seed)).encode('utf-8')))
+		if rng.random() < 0.1:
+			return {"gameplay_main": -1, "gameplay_main_unit": None, "gameplay_completionist": -1, "gameplay_completionist_unit": None}
+		hours = max(int(rng.lognormvariate(2.3, 0.8)), 1)
+		return {"gameplay_main": hours, "gameplay_main_unit": "Hours", "gameplay_completionist": hours * rng.randint(1, 4), "gameplay_completionist_unit": "Hours"}
+
+	# a learnable target: effects of the series and first genre, the metacritic score and some noise
+	def get_target(self, series, rawg, rng):
+		effect = (zlib.crc32(series.encode('utf-8')) % 1000) / 250 - 2
+		if len(rawg["genres"]) > 0:
+			effect = effect + GENRES.index(rawg["genres"][0]) / 10 - 0.9
+		metacritic = rawg["metacritic"] if rawg["metacritic"] is not None else 70
+		return int(min(max(round(5 + effect + (metacritic - 70) / 10 + rng.gauss(0, 0.5)), 0), 10))
+
+	# the rows of a .csv file for seed.py (unique titles, most of them in a series, with their target values), together
+	# with the RAWG details of their games
+	def make_games(self, num_games, seed=0):
+		rng = random.Random(seed)
+		titles = set()
+		while len(titles) < num_games:
+			series = "None" if rng.random() < 0.4 else self.choose(rng, self.series, self.series_weights, 1)[0]
+			subtitle = " ".join(make_word(rng).capitalize() for _ in range(rng.randint(1, 3)))
+			title = subtitle if series == "None" else series + (" " + str(rng.randint(2, 9)) if rng.random() < 0.3 else ": " + subtitle)
+			if title in titles:
+				continue
+			titles.add(title)
+			rawg = self.get_rawg(title)
+			yield {"name": title, "series": series, "target_value": self.get_target(series, rawg, rng), "selector": 0}, rawg
+
+# passes the games on, writing their rows to a .csv file for seed.py on the way
+def tee_rows(path, games):
+	with open(path, "w", newline='', encoding='utf-8') as f:
+		writer = csv.writer(f)
+		writer.writerow(["Name", "Series", "Target Value", "Selector"])
+		for row, rawg in games:
+			writer.writerow([row["name"], row["series"], row["target_value"], row["selector"]])
+			yield row, rawg
+
+# writes the seeded file seed.py would write for the games made by make_games, one game at a time
+def write_seeded_data(path, vocabulary, games):
+	ids_to_names = {group: {0: "None"} for group in ("esrb_ratings", "genres", "developers", "publishers", "series")}
+	names_to_ids = {group: {"None": 0} for group in ids_to_names}
+	keys = set()
+	num_games = 0
+	with open(path, "w", encoding='utf-8') as f:
+		f.write('{"games": {')
+		for row, rawg in games:
+			key, game = add_game(keys, ids_to_names, names_to_ids, row, rawg, vocabulary.get_hltb(row["name"]))
+			keys.add(key)
+			f.write((", " if num_games > 0 else "") + json.dumps(key) + ": " + json.dumps(game))
+			num_games = num_games + 1
+		f.write('}, "map": ' + json.dumps({"id-to-name": ids_to_names, "name-to-id": names_to_ids}) + "}")
+	return num_games
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--games", required=False, help="number of games to generate", default=100000)
+	parser.add_argument("--output", required=False, help="seeded .json file to write", default="seeded_data/synthetic.json")
+	parser.add_argument("--csv", required=False, help="also write the rows as a .csv file for seed.py", default="")
+	parser.add_argument("--seed", required=False, help="random seed of the vocabulary and the games", default=0)
+	args = parser.parse_args()
+
+	vocabulary = SyntheticVocabulary(seed=int(args.seed))
+	games = vocabulary.make_games(int(args.games), int(args.seed))
+	if args.csv != "":
+		games = tee_rows(args.csv, games)
+	num_games = write_seeded_data(args.output, vocabulary, games)
+	print("Wrote " + str(num_games) + " games to " + args.output + ("" if args.csv == "" else " and their rows to " + args.csv))
@@ -0,0 +1,124 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Build time, size and lookup latency of a TitleIndex of generated titles, for titles which are in the index, titles
+# with a typo, and titles which are not in it at all. Also the end-to-end latency of inference.py --name on a synthetic
+# seeded file, as a .json file and as a columnar directory: the first run builds and saves the index of its titles,
+# later runs load it.
+#
+# python -m benchmarks.title_index --titles 1000000 --cli_games 100000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.common import get_latencies, peak_rss_mb
+from benchmarks.startup import time_command
+from benchmarks.synthetic import SyntheticVocabulary, write_seeded_data
+from columnar import export_columnar
+from inference import is_local_game_complete
+from numpy_model import save_tables
+from title_index import TitleIndex
+
+def make_titles(num_titles, vocabulary=20000, seed=0):
+	rng = np.random.default_rng(seed)
+	letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+	words = ["".join(rng.choice(letters, rng.integers(3, 10))).capitalize() for _ in range(vocabulary)]
+	titles = []
+	for _ in range(num_titles):
+		title = " ".join(words[i] for i in rng.integers(0, vocabulary, rng.integers(2, 6)))
+		if rng.random() < 0.2:
+			title = title + " " + str(rng.integers(2, 10))
+		titles.append(title)
+	return titles
+
+def add_typo(title, rng):
+	i = int(rng.integers(0, len(title)))
+	return title[0:i] + title[i + 1:]
+
+# an embedding model which predicts 0 for every game, since only the time it takes to find the game matters
+def write_zero_model(path, names_to_ids):
+	tables = {"model_type": np.array("embedding"), "continuous": np.zeros(3, dtype=np.float32), "bias": np.zeros(1, dtype=np.float32)}
+	for name, group in (("series", "series"), ("genres", "genres"), ("esrb", "esrb_ratings")):
+		tables[name] = np.zeros(len(names_to_ids[group]), dtype=np.float32)
+	save_tables(tables, path)
+
+# seconds of the first run of inference.py --name, which builds the index, the median of the runs after it, and the
+# median without --name, which only loads the map and the model
+def time_cli(model, path, name, runs):
+	arguments = [sys.executable, "inference.py", "--input_model", model, "--input_map", path, "--series", "None"]
+	return {
+		"first_seconds": time_command(arguments + ["--name", name], 1),
+		"seconds": time_command(arguments + ["--name", name], runs),
+		"without_name_seconds": time_command(arguments + ["--genre", "None", "--gameplay", "30", "--metacritic", "80", "--release", "2030"], runs)
+	}
+
+def run_cli(num_games, runs):
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "data.json")
+		vocabulary = SyntheticVocabulary()
+		write_seeded_data(path, vocabulary, vocabulary.make_games(num_games))
+		with open(path, "r", encoding='utf-8') as f:
+			data = json.loads(f.read())
+		export_columnar(data, os.path.join(directory, "columnar"))
+		model = os.path.join(directory, "model.npz")
+		write_zero_model(model, data["map"]["name-to-id"])
+		name = next(game["name"] for game in data["games"].values() if is_local_game_complete(game))
+		del data
+		return {
+			"games": num_games,
+			"json": time_cli(model, path, name, runs),
+			"columnar": time_cli(model, os.path.join(directory, "columnar"), name, runs)
+		}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--titles", required=False, help="number of titles in the index", default=1000000)
+	parser.add_argument("--queries", required=False, help="number of lookups of each kind", default=1000)
+	parser.add_argument("--cli_games", required=False, help="number of games of the seeded file inference.py is run on (0 to skip)", default=100000)
+	parser.add_argument("--runs", required=False, help="runs of inference.py per measurement, the median is reported", default=5)
+	args = parser.parse_args()
+
+	num_queries = int(args.queries)
+	titles = make_titles(int(args.titles) + num_queries)
+	missing = titles[int(args.titles):]
+	titles = titles[0:int(args.titles)]
+	rss_before = peak_rss_mb()
+	start = time.perf_counter()
+	index = TitleIndex(titles)
+	build_seconds = time.perf_counter() - start
+
+	rng = np.random.default_rng(1)
+	present = [titles[i] for i in rng.integers(0, len(titles), num_queries)]
+	typos = [add_typo(title, rng) for title in present]
+	print(json.dumps({
+		"titles": len(index),
+		"build_seconds": build_seconds,
+		"index_mb": (index.titles.nbytes + index.offsets.nbytes + index.num_trigrams.nbytes + index.hashes.nbytes + index.hash_order.nbytes) / 1024 / 1024,
+		"peak_rss_mb_before": rss_before,
+		"peak_rss_mb_after_build": peak_rss_mb(),
+		"find_present": get_latencies(index.find, present),
+		"find_missing": get_latencies(index.find, missing),
+		"match_typo": get_latencies(index.match, typos),
+		"match_missing": get_latencies(index.match, missing),
+		"typos_matched": sum(index.match(typo) is not None and index.names[index.match(typo)] == index.names[titles.index(title)] for typo, title in zip(typos[0:100], present[0:100])),
+		"cli": run_cli(int(args.cli_games), int(args.runs)) if int(args.cli_games) > 0 else None
+	}))
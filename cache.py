@@ -0,0 +1,122 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import profiling
+
+class CacheMissError(Exception):
+	pass
+
+class ResponseCache:
+	def __init__(self, path, ttl=30 * 24 * 60 * 60, max_size=256 * 1024 * 1024, offline=False):
+		directory = os.path.dirname(path)
+		if directory != "" and not os.path.exists(directory):
+			os.makedirs(directory)
+		self.ttl = ttl
+		self.max_size = max_size
+		self.offline = offline
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, service TEXT, value TEXT, size INTEGER, created REAL, accessed REAL)")
+		self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+		self.connection.commit()
+		self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+	@staticmethod
+	def make_key(service, query, selector):
+		return hashlib.sha256(json.dumps([service, query, selector]).encode('utf-8')).hexdigest()
+
+	# returns (True, value) on a hit and (False, None) on a miss; a cached value can itself be None
+	def get(self, service, query, selector):
+		key = ResponseCache.make_key(service, query, selector)
+		now = time.time()
+		with self.lock:
+			row = self.connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+			# expired entries are still served when offline, since there is nothing better to fall back to
+			if row is None or (self.ttl > 0 and now - row[1] > self.ttl and not self.offline):
+				self.misses = self.misses + 1
+				profiling.count("cache misses")
+				return False, None
+			self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+			self.connection.commit()
+			self.hits = self.hits + 1
+		profiling.count("cache hits")
+		return True, json.loads(row[0])
+
+	def put(self, service, query, selector, value):
+		key = ResponseCache.make_key(service, query, selector)
+		data = json.dumps(value)
+		now = time.time()
+		with self.lock:
+			row = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+			if row is not None:
+				self.size = self.size - row[0]
+			self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, service, data, len(data), now, now))
+			self.size = self.size + len(data)
+			self.evict()
+			self.connection.commit()
+
+	# least recently used entries are dropped until the cache fits in max_size again
+	def evict(self):
+		while self.max_size > 0 and self.size > self.max_size:
+			rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 64").fetchall()
+			if len(rows) == 0:
+				break
+			for key, size in rows:
+				self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+				self.size = self.size - size
+				if self.size <= self.max_size:
+					break
+
+	def fetch(self, service, query, selector, func):
+		found, value = self.get(service, query, selector)
+		if found:
+			return value
+		if self.offline:
+			raise CacheMissError("No cached " + service + " response for \"" + str(query) + "\" (selector " + str(selector) + ") and running offline")
+		value = func()
+		self.put(service, query, selector, value)
+		return value
+
+	def stats(self):
+		return "Cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses"
+
+	def close(self):
+		with self.lock:
+			self.connection.close()
+
+def add_cache_arguments(parser):
+	parser.add_argument("--cache", required=False, help="sqlite file to cache RAWG / Howlongtobeat responses in (empty to disable)", default="cache/responses.sqlite")
+	parser.add_argument("--cache_ttl", required=False, help="days before a cached response is fetched again (0 to never expire)", default=30)
+	parser.add_argument("--cache_size", required=False, help="maximum size of the cache in megabytes (0 for no limit)", default=256)
+	parser.add_argument("--offline", required=False, help="only use cached responses, never query RAWG / Howlongtobeat", action="store_true")
+
+def get_cache_from_args(args):
+	if args.cache == "":
+		if args.offline:
+			print("Error: --offline needs a --cache to read from")
+			exit(-1)
+		return None
+	return ResponseCache(args.cache, float(args.cache_ttl) * 24 * 60 * 60, int(float(args.cache_size) * 1024 * 1024), args.offline)
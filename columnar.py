@@ -0,0 +1,158 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import numpy as np
+
+# Columnar layout of a seeded file: a directory with one .npy array per numeric column, flat id arrays plus offsets
+# for the genre / developer / publisher lists, the text of the keys, names and descriptions concatenated into
+# .bin blobs (again with offsets), and the map in a small map.json. Arrays are memory mapped when loaded,
+# and text is only read when it is asked for, so opening even a huge file takes next to no time or memory.
+
+COLUMNS = {
+	"series": np.int32,
+	"esrb": np.int32,
+	"metacritic": np.int32,
+	"release_year": np.int32,
+	"gameplay_main": np.int32,
+	"gameplay_completionist": np.int32,
+	"target_value": np.float32,
+	"selector": np.int32
+}
+LIST_COLUMNS = ("genres", "developers", "publishers")
+TEXT_COLUMNS = ("keys", "names", "descriptions")
+
+def is_columnar(path):
+	return os.path.isdir(path)
+
+def get_release_year(release_date):
+	if release_date is None or len(release_date) < 4:
+		return -1
+	return int(release_date[0:4])
+
+def export_columnar(data, output):
+	if not os.path.exists(output):
+		os.makedirs(output)
+	games = data["games"]
+	num_games = len(games)
+	columns = {column: np.zeros(num_games, dtype=dtype) for column, dtype in COLUMNS.items()}
+	list_lengths = {column: np.zeros(num_games + 1, dtype=np.int64) for column in LIST_COLUMNS}
+	list_ids = {column: [] for column in LIST_COLUMNS}
+	text_offsets = {column: np.zeros(num_games + 1, dtype=np.int64) for column in TEXT_COLUMNS}
+	text_files = {column: open(os.path.join(output, column + ".bin"), "wb") for column in TEXT_COLUMNS}
+	try:
+		for i, (key, game) in enumerate(games.items()):
+			columns["series"][i] = game["series"]
+			columns["esrb"][i] = game["esrb"]
+			columns["metacritic"][i] = game["metacritic"] if game["metacritic"] is not None else -1
+			columns["release_year"][i] = get_release_year(game["release_date"])
+			columns["gameplay_main"][i] = game["gameplay_main"]
+			columns["gameplay_completionist"][i] = game["gameplay_completionist"]
+			columns["target_value"][i] = game["target_value"]
+			columns["selector"][i] = game.get("selector", 0)
+			for column in LIST_COLUMNS:
+				list_lengths[column][i + 1] = len(game[column])
+				list_ids[column].extend(game[column])
+			for column, text in (("keys", key), ("names", game["name"]), ("descriptions", game["description"] or "")):
+				encoded = text.encode('utf-8')
+				text_files[column].write(encoded)
+				text_offsets[column][i + 1] = text_offsets[column][i] + len(encoded)
+	finally:
+		for f in text_files.values():
+			f.close()
+	
+	for column, values in columns.items():
+		np.save(os.path.join(output, column + ".npy"), values)
+	for column in LIST_COLUMNS:
+		np.save(os.path.join(output, column + "_ids.npy"), np.array(list_ids[column], dtype=np.int32))
+		np.save(os.path.join(output, column + "_offsets.npy"), np.cumsum(list_lengths[column]))
+	for column in TEXT_COLUMNS:
+		np.save(os.path.join(output, column + "_offsets.npy"), text_offsets[column])
+	with open(os.path.join(output, "map.json"), "w", encoding='utf-8') as f:
+		f.write(json.dumps({"num_games": num_games, "map": data["map"]}))
+
+class ColumnarData:
+	def __init__(self, path):
+		self.path = path
+		with open(os.path.join(path, "map.json"), "r", encoding='utf-8') as f:
+			sidecar = json.loads(f.read())
+		self.num_games = sidecar["num_games"]
+		self.map = sidecar["map"]
+		self.arrays = {}
+		self.blobs = {}
+	
+	def __len__(self):
+		return self.num_games
+	
+	# a column ("series", "genres_ids", "genres_offsets", ...) as a read only memory mapped array
+	def __getitem__(self, column):
+		if column not in self.arrays:
+			self.arrays[column] = np.load(os.path.join(self.path, column + ".npy"), mmap_mode="r")
+		return self.arrays[column]
+	
+	def get_list(self, column, i):
+		offsets = self[column + "_offsets"]
+		return self[column + "_ids"][offsets[i]:offsets[i + 1]].tolist()
+	
+	def get_text(self, column, i):
+		if column not in self.blobs:
+			with open(os.path.join(self.path, column + ".bin"), "rb") as f:
+				# an empty file can not be memory mapped
+				if os.fstat(f.fileno()).st_size == 0:
+					self.blobs[column] = b""
+				else:
+					self.blobs[column] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		offsets = self[column + "_offsets"]
+		return self.blobs[column][offsets[i]:offsets[i + 1]].decode('utf-8')
+	
+	def key(self, i):
+		return self.get_text("keys", i)
+	
+	def name(self, i):
+		return self.get_text("names", i)
+	
+	def description(self, i):
+		return self.get_text("descriptions", i)
+
+# a seeded .json file as its parsed json, or a columnar directory as a ColumnarData (which reads no games yet)
+def load_seeded(path):
+	if is_columnar(path):
+		return ColumnarData(path)
+	with open(path, "r", encoding='utf-8') as f:
+		return json.loads(f.read())
+
+def get_map(seeded):
+	return seeded.map if isinstance(seeded, ColumnarData) else seeded["map"]
+
+# the map of a seeded .json file or of a columnar directory, without reading any games from the latter
+def load_map(path):
+	return get_map(load_seeded(path))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input", required=False, help="seeded .json file to convert", default="seeded_data/data.json")
+	parser.add_argument("--output", required=False, help="directory to write the columnar files to", default="seeded_data/data")
+	args = parser.parse_args()
+	
+	with open(args.input, "r", encoding='utf-8') as f:
+		data = json.loads(f.read())
+	export_columnar(data, args.output)
+	print("Wrote " + str(len(data["games"])) + " games to " + args.output)
@@ -0,0 +1,87 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import profiling
+
+class TokenBucket:
+	def __init__(self, rate, capacity=None):
+		# a rate of 0 (or less) disables limiting entirely
+		self.rate = float(rate)
+		self.capacity = float(capacity) if capacity is not None else max(1., self.rate)
+		self.tokens = self.capacity
+		self.last = time.monotonic()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		if self.rate <= 0:
+			return
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+				self.last = now
+				if self.tokens >= 1:
+					self.tokens = self.tokens - 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+class Service:
+	def __init__(self, name, rate=0, retries=0, backoff=1.):
+		self.name = name
+		self.bucket = TokenBucket(rate)
+		self.retries = retries
+		self.backoff = backoff
+
+	def call(self, func, *args):
+		attempt = 0
+		while True:
+			with profiling.stage(self.name + " rate limit"):
+				self.bucket.acquire()
+			profiling.count(self.name + " requests")
+			try:
+				with profiling.stage(self.name + " request"):
+					return func(*args)
+			except Exception as e:
+				profiling.count(self.name + " failed requests")
+				if attempt >= self.retries:
+					raise
+				delay = self.backoff * (2 ** attempt)
+				print("Request to " + self.name + " failed (" + repr(e) + "), retrying in " + str(delay) + "s")
+				time.sleep(delay)
+				attempt = attempt + 1
+
+# like map(), but runs func on a thread pool while still yielding results in input order.
+# At most 2 * workers items are in flight, so long inputs are never fully buffered.
+def ordered_map(func, items, workers):
+	if workers <= 1:
+		for item in items:
+			yield func(item)
+		return
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		pending = deque()
+		for item in items:
+			pending.append(executor.submit(func, item))
+			if len(pending) >= workers * 2:
+				yield pending.popleft().result()
+		while len(pending) > 0:
+			yield pending.popleft().result()
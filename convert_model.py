@@ -0,0 +1,52 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import torch
+from model_dataset import EmbeddingTrainingModel, get_sizes, load_model
+from columnar import load_map
+from numpy_model import export_tables, save_tables
+
+# converts a one-hot TrainingModel into an EmbeddingTrainingModel which gives the same predictions,
+# or any model into the .npz tables evaluated by NumpyModel (which needs no torch)
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input_model", required=False, help="model to convert", default="models/model.pt")
+	parser.add_argument("--input_map", required=False, help="name of json file (or columnar directory) which maps ids to categories, vice versa", default="seeded_data/data.json")
+	parser.add_argument("--to", required=False, help="embedding (only for one-hot models), or numpy", choices=["embedding", "numpy"], default="embedding")
+	parser.add_argument("--output", required=False, help="name of the model to output (defaults to models/model_embedding.pt or models/model.npz)")
+	args = parser.parse_args()
+	
+	data = load_map(args.input_map)["name-to-id"]
+	
+	model = load_model(args.input_model, get_sizes(data))
+	# the random layers would be baked into the converted model, without the warning load_model prints
+	if model.legacy:
+		print("Error: " + args.input_model + " was saved without its series / genre / esrb layers, so it can not be converted. Retrain it with train.py first")
+		exit(-1)
+	if args.to == "numpy":
+		output = args.output if args.output is not None else "models/model.npz"
+		print("Saving to " + output)
+		save_tables(export_tables(model), output)
+		exit(0)
+	if model.model_type != "one_hot":
+		print(args.input_model + " is not a one-hot model")
+		exit(-1)
+	output = args.output if args.output is not None else "models/model_embedding.pt"
+	print("Saving to " + output)
+	torch.save(EmbeddingTrainingModel.from_one_hot(model).state_dict(), output)
@@ -0,0 +1,108 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Hashed bag of words features of the game descriptions, used by the "description" model. Every word is hashed into
+# one of num_buckets ids, so the feature space has a fixed size and no vocabulary is ever kept in memory. The ids of
+# all descriptions are stored in the same layout as make_bag (flat ids plus offsets), and are written to a cache
+# next to the seeded data a chunk of descriptions at a time, then memory mapped when training.
+
+import json
+import os
+import re
+import zlib
+import numpy as np
+from columnar import ColumnarData, is_columnar
+from features import make_bag
+
+DEFAULT_BUCKETS = 2 ** 18
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+	return TOKEN_PATTERN.findall((text or "").lower())
+
+# crc32 instead of hash(), which is salted differently in every process
+def hash_description(text, num_buckets):
+	return [zlib.crc32(token.encode('utf-8')) % num_buckets for token in tokenize(text)]
+
+# the bag (ids and offsets, see make_bag) of the hashed words of every text
+def hash_descriptions(texts, num_buckets):
+	return make_bag([hash_description(text, num_buckets) for text in texts])
+
+# the cache of a seeded .json file is a directory next to it, the cache of a columnar directory lives inside it
+def get_cache_path(input, num_buckets):
+	if is_columnar(input):
+		return os.path.join(input, "descriptions_" + str(num_buckets))
+	return os.path.splitext(input)[0] + "_descriptions_" + str(num_buckets)
+
+# the file the descriptions were read from; the cache is rebuilt when it changes
+def get_source(input):
+	path = os.path.join(input, "descriptions.bin") if is_columnar(input) else input
+	stat = os.stat(path)
+	return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def write_hashed_descriptions(texts, num_games, num_buckets, path, source, chunk_size=10000):
+	if not os.path.exists(path):
+		os.makedirs(path)
+	offsets = np.zeros(num_games + 1, dtype=np.int64)
+	i = 0
+	chunk = []
+	with open(os.path.join(path, "ids.bin"), "wb") as f:
+		for text in texts:
+			chunk.append(text)
+			if len(chunk) == chunk_size:
+				i = write_chunk(f, chunk, offsets, i, num_buckets)
+				chunk = []
+		i = write_chunk(f, chunk, offsets, i, num_buckets)
+	np.save(os.path.join(path, "offsets.npy"), offsets)
+	# written last, so that an interrupted build is never mistaken for a finished one
+	with open(os.path.join(path, "meta.json"), "w", encoding='utf-8') as f:
+		f.write(json.dumps({"num_games": num_games, "num_buckets": num_buckets, "source": source}))
+
+def write_chunk(f, chunk, offsets, i, num_buckets):
+	ids, chunk_offsets = hash_descriptions(chunk, num_buckets)
+	f.write(ids.astype(np.int32).tobytes())
+	offsets[i + 1:i + len(chunk) + 1] = offsets[i] + chunk_offsets[1:]
+	return i + len(chunk)
+
+def is_cache_valid(path, num_games, num_buckets, source):
+	if not os.path.exists(os.path.join(path, "meta.json")):
+		return False
+	with open(os.path.join(path, "meta.json"), "r", encoding='utf-8') as f:
+		meta = json.loads(f.read())
+	return meta["num_games"] == num_games and meta["num_buckets"] == num_buckets and meta["source"] == source
+
+# memory mapped (ids, offsets) of the hashed descriptions of every game, in the order of the games of the file
+def load_hashed_descriptions(path):
+	offsets = np.load(os.path.join(path, "offsets.npy"))
+	if offsets[-1] == 0:
+		return np.zeros(0, dtype=np.int32), offsets
+	# copy on write, so that torch.from_numpy can wrap it without copying
+	return np.memmap(os.path.join(path, "ids.bin"), dtype=np.int32, mode="c"), offsets
+
+# games is the "games" dict of a seeded .json file, or a ColumnarData (input is the path either was loaded from)
+def get_hashed_descriptions(input, games, num_buckets=DEFAULT_BUCKETS):
+	path = get_cache_path(input, num_buckets)
+	source = get_source(input)
+	if not is_cache_valid(path, len(games), num_buckets, source):
+		print("Hashing the descriptions of " + str(len(games)) + " games into " + path)
+		if isinstance(games, ColumnarData):
+			texts = (games.description(i) for i in range(len(games)))
+		else:
+			texts = (game["description"] for game in games.values())
+		write_hashed_descriptions(texts, len(games), num_buckets, path, source)
+	return load_hashed_descriptions(path)
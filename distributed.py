@@ -0,0 +1,154 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Data parallel training on the cores of one machine, used by train.py --workers. Every worker process (a "rank")
+# builds the same datasets and model from a seed shared by all of them, trains on its own share of every batch, and
+# averages its gradients with the other ranks over torch.distributed's gloo backend before each optimizer step, so
+# every rank holds the same weights after every step. Validation losses are summed over the ranks the same way, so
+# early stopping decides the same on all of them, and only rank 0 prints and writes files.
+
+import os
+import socket
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing
+from torch.utils.data import Sampler
+
+# like GameBatchSampler, but every step's batch of batch_size games is split among the ranks. All ranks draw the
+# same order of the games (from seed and the epoch set with set_epoch), and each takes every world_size-th game of
+# it. With pad, the order is padded with games from its start so that every rank gets the same number of games and
+# thus takes part in every gradient average; validation needs no padding, which would count some games twice
+class DistributedBatchSampler(Sampler):
+	def __init__(self, num_items, batch_size, rank, world_size, shuffle=False, seed=0, pad=True):
+		self.num_items = num_items
+		self.batch_size = (batch_size + world_size - 1) // world_size
+		self.rank = rank
+		self.world_size = world_size
+		self.shuffle = shuffle
+		self.seed = seed
+		self.pad = pad
+		self.epoch = 0
+
+	def set_epoch(self, epoch):
+		self.epoch = epoch
+
+	def get_num_shard_items(self):
+		if self.pad:
+			return (self.num_items + self.world_size - 1) // self.world_size
+		return len(range(self.rank, self.num_items, self.world_size))
+
+	def __len__(self):
+		return (self.get_num_shard_items() + self.batch_size - 1) // self.batch_size
+
+	def __iter__(self):
+		if self.shuffle:
+			generator = torch.Generator()
+			generator.manual_seed(self.seed + self.epoch)
+			order = torch.randperm(self.num_items, generator=generator)
+		else:
+			order = torch.arange(self.num_items)
+		if self.pad and self.num_items > 0:
+			padding = self.get_num_shard_items() * self.world_size - self.num_items
+			order = torch.cat([order, order[0:padding]])
+		return iter(torch.split(order[self.rank::self.world_size], self.batch_size))
+
+# a free port on this machine for the ranks to meet on
+def get_free_port():
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+# runs worker(rank, world_size, *args) in world_size new processes and waits for all of them
+def launch(worker, world_size, *args):
+	port = get_free_port()
+	torch.multiprocessing.spawn(run_rank, args=(world_size, port, worker, args), nprocs=world_size, join=True)
+
+def run_rank(rank, world_size, port, worker, args):
+	os.environ["MASTER_ADDR"] = "127.0.0.1"
+	os.environ["MASTER_PORT"] = str(port)
+	dist.init_process_group("gloo", rank=rank, world_size=world_size)
+	try:
+		worker(rank, world_size, *args)
+	finally:
+		dist.destroy_process_group()
+
+def is_distributed():
+	return dist.is_available() and dist.is_initialized()
+
+def get_world_size():
+	return dist.get_world_size() if is_distributed() else 1
+
+def barrier():
+	dist.barrier()
+
+# the value of rank 0, on every rank
+def broadcast_object(value):
+	values = [value]
+	dist.broadcast_object_list(values, src=0)
+	return values[0]
+
+# averages the gradients of the model over all ranks with a single all-reduce. The sparse gradients of the
+# EmbeddingBags of the multi_hot and description models are made dense for it, which the optimizers accept
+def average_gradients(model):
+	parameters = [parameter for parameter in model.parameters() if parameter.grad is not None]
+	if len(parameters) == 0:
+		return
+	grads = [parameter.grad.to_dense() if parameter.grad.is_sparse else parameter.grad for parameter in parameters]
+	buffer = torch.cat([grad.reshape(-1) for grad in grads])
+	dist.all_reduce(buffer)
+	buffer /= get_world_size()
+	offset = 0
+	for parameter, grad in zip(parameters, grads):
+		parameter.grad = buffer[offset:offset + grad.numel()].view_as(grad).clone()
+		offset = offset + grad.numel()
+
+# an optimizer which averages the gradients over all ranks before every step. Its state_dict is the one of the
+# optimizer it wraps, so checkpoints are the same as those of training in one process
+class AllReduceOptimizer:
+	def __init__(self, model, opt):
+		self.model = model
+		self.opt = opt
+
+	@property
+	def param_groups(self):
+		return self.opt.param_groups
+
+	def step(self):
+		average_gradients(self.model)
+		self.opt.step()
+
+	def zero_grad(self):
+		self.opt.zero_grad()
+
+	def state_dict(self):
+		return self.opt.state_dict()
+
+	def load_state_dict(self, state):
+		self.opt.load_state_dict(state)
+
+# the loss over the validation games of all ranks, each of which only computes the loss of its own share of them
+def get_loss(model, loss_func, valid_dl):
+	model.eval()
+	totals = torch.zeros(2, dtype=torch.float64)
+	with torch.no_grad():
+		for xb, yb in valid_dl:
+			totals[0] += loss_func(model(xb), yb).item() * len(yb)
+			totals[1] += len(yb)
+	dist.all_reduce(totals)
+	return np.float64(totals[0] / totals[1])
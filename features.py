@@ -0,0 +1,43 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Helpers describing the features of a game which only need numpy, so that they can be used without importing torch
+
+import numpy as np
+
+TAG_GROUPS = ("genres", "developers", "publishers")
+
+# sizes of the series, genres, esrb_ratings, developers and publishers maps (either direction of the map works)
+def get_sizes(map):
+	return (len(map["series"].keys()), len(map["genres"].keys()), len(map["esrb_ratings"].keys()), len(map["developers"].keys()), len(map["publishers"].keys()))
+
+# stores a list of id lists as one flat array of ids plus the offset at which each list starts (CSR layout)
+def make_bag(lists):
+	offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+	np.cumsum([len(ids) for ids in lists], out=offsets[1:])
+	ids = np.fromiter((id for ids in lists for id in ids), dtype=np.int64, count=offsets[-1])
+	return ids, offsets
+
+# the lists at the given indices of a bag made by make_bag, as a new bag
+def take_bag(ids, offsets, indices):
+	starts = offsets[indices]
+	lengths = offsets[indices + 1] - starts
+	new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+	np.cumsum(lengths, out=new_offsets[1:])
+	positions = np.arange(new_offsets[-1]) + np.repeat(starts - new_offsets[:-1], lengths)
+	return np.asarray(ids[positions], dtype=np.int64), new_offsets
@@ -17,16 +17,43 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import json
-import torch
-from model_dataset import TrainingModel
+import csv
+import itertools
+import time
+import numpy as np
 import argparse
-import rawg.rawgpy as rawgpy
-from howlongtobeatpy import HowLongToBeat
-import torch.nn.functional as F
+from lookup import Lookup, get_gameplay_hours
+from cache import CacheMissError, add_cache_arguments, get_cache_from_args
+from columnar import get_map, load_seeded
+from features import TAG_GROUPS, get_sizes
+import features
+from descriptions import hash_descriptions
+from numpy_model import NumpyModel
+from title_index import GameIndex, PropertyMatcher
+from profiling import add_profile_arguments, start_from_args
+import profiling
 
+# torch (and model_dataset, which needs it) is only imported once a torch model is loaded,
+# so that scoring with an exported .npz model starts without it
 
-def get_property(map, property, name, fallback_to_none=False):
+
+# the name in the map most similar to name, or None if none is similar enough. Each match is only printed once, so
+# that a --genre which is also the first of the genres of the multi_hot model is not reported twice
+def get_closest_match(matcher, property, name):
+	match = matcher.match(property, name)
+	if match is not None and (property, name) not in matcher.reported:
+		matcher.reported.add((property, name))
+		print("Could not find \"" + name + "\" in map of \"" + property + "\" to ids. Using the closest match \"" + match + "\"")
+	return match
+
+# a name which is not in the map of matcher (a PropertyMatcher) is replaced by the most similar one in it, if there is
+# one similar enough
+def get_property(matcher, property, name, fallback_to_none=False):
+	map = matcher.map
 	if name not in map[property]:
+		match = get_closest_match(matcher, property, name)
+		if match is not None:
+			return map[property][match]
 		if fallback_to_none is False:
 			print("Error: could not find \"" + name + "\" in map of \"" + property + "\" to ids. Try a different name, or use \"None\" if your training data has nothing for this category.")
 			exit(-1)
@@ -35,87 +62,109 @@ def get_property(map, property, name, fallback_to_none=False):
 			return map[property]["None"]
 	return map[property][name]
 
-def get_attributes_from_user(args, names_to_ids):
-	series = get_property(names_to_ids, "series", args.series)
-	genre = get_property(names_to_ids, "genres", args.genre)
-	esrb = get_property(names_to_ids, "esrb_ratings", args.esrb)
+# ids of every genre, developer and publisher of a game, for the multi_hot model. Unlike get_property,
+# names which are not in the map are left out, since a game without a particular tag is still a valid game.
+# Unless quiet (as when scoring a whole batch), the closest match of such a name is used if there is one; when quiet,
+# the names left out of each group are counted in unknown
+def get_tags(matcher, names, quiet=False, unknown=None):
+	map = matcher.map
+	tags = []
+	for group, group_names in zip(TAG_GROUPS, names):
+		ids = []
+		for name in group_names:
+			if name in map[group]:
+				ids.append(map[group][name])
+			elif not quiet:
+				match = get_closest_match(matcher, group, name)
+				if match is not None:
+					ids.append(map[group][match])
+				else:
+					print("Could not find \"" + name + "\" in map of \"" + group + "\" to ids. Leaving it out")
+			elif unknown is not None:
+				unknown[group] = unknown.get(group, 0) + 1
+		tags.append(ids)
+	return tags
+
+def get_attributes_from_user(args, matcher):
+	series = get_property(matcher, "series", args.series)
+	genre = get_property(matcher, "genres", args.genre)
+	esrb = get_property(matcher, "esrb_ratings", args.esrb)
 	gameplay_main = float(args.gameplay)
 	metacritic = float(args.metacritic)
 	release_date = float(args.release)
-	return series, genre, esrb, gameplay_main, metacritic, release_date
+	tags = get_tags(matcher, [args.genres, args.developers, args.publishers])
+	return series, genre, esrb, gameplay_main, metacritic, release_date, tags, args.description
 
-def get_htlb_data(args, names_to_ids):
+def get_htlb_data(args, matcher, lookup):
 	gameplay_main = args.gameplay
 	if gameplay_main != -1:
 		print("Using user selected override for gameplay time")
 		gameplay_main = float(gameplay_main)
 	else:
-		results = HowLongToBeat().search(args.name)
-		if len(results) == 0:
-			print("No HowLongtobeat results were found for \"" + args.name + "\", please try a different name or specify an override with --gameplay")
+		game_hltb = lookup.hltb(args.name, args.selector)
+		if game_hltb is None:
+			print("No HowLongtobeat results were found for \"" + args.name + "\" with index " + str(args.selector) + ", please try a different name or specify an override with --gameplay")
 			exit(-1)
-		if len(results) < args.selector:
-			print("Only " + len(results) + " Howlongtobeat results were found, yet you selected with index " + args.selector + ". Please try again with a smaller index")
-			exit(-1)
-		game_hltb = results[args.selector]
-		if game_hltb.gameplay_main == -1:
+		if game_hltb["gameplay_main"] == -1:
 			print("No gameplay time found in Howlongtobeat page for the game. Please specify an override with --gameplay")
 			exit(-1)
-		if game_hltb.gameplay_main_unit != "Hours":
-			gameplay_main = 1.
-		else:
-			gameplay_main = float(game_hltb.gameplay_main.replace("½", ""))
+		gameplay_main = float(get_gameplay_hours(game_hltb["gameplay_main"], game_hltb["gameplay_main_unit"]))
 			
 	return gameplay_main
 
-def get_rawg_data(args, names_to_ids):
-	with open("rawg_info.json", "r", encoding='utf-8') as f:
-		rawg_data = json.loads(f.read())
-		user_agent = rawg_data["user-agent"]
-		api_key = rawg_data["key"]
-	
-	rawg = rawgpy.RAWG(user_agent, api_key)
-	results = rawg.search(args.name)
-	if len(results) == 0:
+def get_rawg_data(args, matcher, lookup):
+	game_rawg, selector = lookup.rawg(args.name, args.selector)
+	if game_rawg is None:
 		print("No RAWG results were found for \"" + args.name + "\", please try a different name")
 		exit(-1)
-	if len(results) < args.selector:
-		print("Only " + len(results) + " RAWG results were found, yet you selected with index " + args.selector + ". Please try again with a smaller index")
-		exit(-1)
-	game_rawg = results[args.selector]
-	game_rawg.populate()
 	
 	genre = args.genre
 	esrb = args.esrb
 	metacritic = args.metacritic
 	release_date = args.release
 	
+	genres = args.genres
+	developers = args.developers
+	publishers = args.publishers
+	
 	if genre != "None":
 		print("Using user override for genre")
-		genre = get_property(names_to_ids, "genres", genre)
+		genre = get_property(matcher, "genres", genre)
 	else:
-		if len(game_rawg.genres) == 0:
+		if len(game_rawg["genres"]) == 0:
 			print("No genre data found from RAWG. Please specify an override with --genre")
 			exit(-1)
 		else:
-			genre = get_property(names_to_ids, "genres", game_rawg.genres[0].name, True)
+			genre = get_property(matcher, "genres", game_rawg["genres"][0], True)
+			genres = game_rawg["genres"]
+	
+	if len(developers) == 0:
+		developers = game_rawg["developers"]
+	else:
+		print("Using user override for developers")
+	if len(publishers) == 0:
+		publishers = game_rawg["publishers"]
+	else:
+		print("Using user override for publishers")
 			
 	if esrb != "None":
 		print("Using user override for esrb")
-		esrb = get_property(names_to_ids, "esrb_ratings", esrb)
+		esrb = get_property(matcher, "esrb_ratings", esrb)
 	else:
-		if hasattr(game_rawg, "esrb_rating") and game_rawg.esrb_rating["name"] != "No Rating" and game_rawg.esrb_rating["name"] != "Rating Pending":
-			esrb = get_property(names_to_ids, "esrb_ratings", game_rawg.esrb_rating["name"], True)
-		elif not hasattr(game_rawg, "esrb_rating"):
+		if game_rawg["esrb"] is None:
 			print("No esrb data found from RAWG. Please specify an override using --esrb")
 			exit(-1)
+		elif game_rawg["esrb"] != "No Rating" and game_rawg["esrb"] != "Rating Pending":
+			esrb = get_property(matcher, "esrb_ratings", game_rawg["esrb"], True)
+		else:
+			esrb = get_property(matcher, "esrb_ratings", "None")
 			
 	if metacritic != -1:
 		print("Using user override for metacritic")
 		metacritic = float(metacritic)
 	else:
-		if hasattr(game_rawg, "metacritic"):
-			metacritic = float(game_rawg.metacritic)
+		if game_rawg["metacritic"] is not None:
+			metacritic = float(game_rawg["metacritic"])
 		else:
 			print("No metacritic data found from RAWG. Please specify an override with --metacritic")
 			exit(-1)
@@ -124,59 +173,306 @@ def get_rawg_data(args, names_to_ids):
 		print("Using user override for release date")
 		release_date = float(release_date)
 	else:
-		release_date = float(game_rawg.released[0:4])
+		release_date = float(game_rawg["released"][0:4])
 	
-	return genre, esrb, metacritic, release_date
+	description = args.description
+	if description != "":
+		print("Using user override for description")
+	else:
+		description = game_rawg["description"] or ""
+	
+	tags = get_tags(matcher, [genres, developers, publishers])
+	return genre, esrb, metacritic, release_date, tags, description
+
+# the attributes of a game of the seeded data, which were looked up when it was seeded. The ids of the game are
+# those of the map it was seeded with, which is the map inference uses (that of matcher)
+def get_attributes_from_local(args, matcher, game):
+	series = get_property(matcher, "series", args.series)
+	genre = get_property(matcher, "genres", args.genre) if args.genre != "None" else game["genres"][0]
+	esrb = get_property(matcher, "esrb_ratings", args.esrb) if args.esrb != "None" else game["esrb"]
+	gameplay_main = float(args.gameplay) if args.gameplay != -1 else float(game["gameplay_main"])
+	metacritic = float(args.metacritic) if args.metacritic != -1 else float(70 if game["metacritic"] == -1 else game["metacritic"])
+	release_date = float(args.release) if args.release != -1 else float(game["release_date"][0:4])
+	tags = [game[group] for group in TAG_GROUPS]
+	if len(args.genres) > 0 or len(args.developers) > 0 or len(args.publishers) > 0:
+		user_tags = get_tags(matcher, [args.genres, args.developers, args.publishers])
+		tags = [user_tags[i] if len(names) > 0 else tags[i] for i, names in enumerate([args.genres, args.developers, args.publishers])]
+	description = args.description if args.description != "" else game["description"] or ""
+	return series, genre, esrb, gameplay_main, metacritic, release_date, tags, description
 
-def get_attributes_from_internet(args, names_to_ids):
-	series = get_property(names_to_ids, "series", args.series)
-	gameplay_main = get_htlb_data(args, names_to_ids)
-	genre, esrb, metacritic, release_date = get_rawg_data(args, names_to_ids)
-	return series, genre, esrb, gameplay_main, metacritic, release_date
+# a game of the seeded data can be used without RAWG / Howlongtobeat if it has everything the model needs
+def is_local_game_complete(game):
+	return game is not None and len(game["genres"]) >= 1 and game["gameplay_main"] != -1 and len(game["release_date"]) >= 4
+
+def get_attributes_from_internet(args, matcher, lookup):
+	series = get_property(matcher, "series", args.series)
+	try:
+		gameplay_main = get_htlb_data(args, matcher, lookup)
+		genre, esrb, metacritic, release_date, tags, description = get_rawg_data(args, matcher, lookup)
+	except CacheMissError as e:
+		print("Error: " + str(e) + ". Run without --offline to query RAWG / Howlongtobeat")
+		exit(-1)
+	if lookup.cache is not None:
+		print(lookup.cache.stats())
+	return series, genre, esrb, gameplay_main, metacritic, release_date, tags, description
+
+# .npz files are models exported with convert_model.py --to numpy
+def load_model(path, names_to_ids):
+	with profiling.stage("load model"):
+		if path.endswith(".npz"):
+			return NumpyModel.load(path)
+		with profiling.stage("import torch"):
+			import model_dataset
+		return model_dataset.load_model(path, get_sizes(names_to_ids))
+
+# categorical is a (n, 3) array of series, genre and esrb ids, continuous a (n, 3) array of gameplay, metacritic and release.
+# tags holds the genre, developer and publisher id lists of each game, and is only used by the multi_hot and description
+# models; descriptions holds the description text of each game, and is only used by the description model
+def predict(model, sizes, categorical, continuous, tags=None, descriptions=None):
+	if isinstance(model, NumpyModel):
+		return model.predict(categorical, continuous, tags, descriptions)
+	import torch
+	import torch.nn.functional as F
+	categorical = torch.as_tensor(categorical, dtype=torch.long)
+	continuous = torch.as_tensor(continuous, dtype=torch.float32)
+	if model.model_type == "embedding":
+		with torch.no_grad():
+			return model((categorical, continuous))
+	if model.model_type in ("multi_hot", "description"):
+		if tags is None:
+			tags = [[[], [], []] for _ in range(len(categorical))]
+		bags = []
+		for i in range(len(TAG_GROUPS)):
+			ids, offsets = features.make_bag([game_tags[i] for game_tags in tags])
+			bags.append((torch.from_numpy(ids), torch.from_numpy(offsets[:-1])))
+		if model.model_type == "description":
+			ids, offsets = hash_descriptions(descriptions if descriptions is not None else [""] * len(categorical), model.bagTags[3].num_embeddings)
+			bags.append((torch.from_numpy(ids), torch.from_numpy(offsets[:-1])))
+		with torch.no_grad():
+			return model(((categorical, bags), continuous))
+	series_tensor = F.one_hot(categorical[:, 0], sizes[0]).type(torch.FloatTensor)
+	genres_tensor = F.one_hot(categorical[:, 1], sizes[1]).type(torch.FloatTensor)
+	esrb_tensor = F.one_hot(categorical[:, 2], sizes[2]).type(torch.FloatTensor)
+	with torch.no_grad():
+		return model(((series_tensor, genres_tensor, esrb_tensor), continuous))
+
+BATCH_FIELDS = ["series", "genre", "esrb", "gameplay", "metacritic", "release", "developers", "publishers", "description"]
+
+def read_batch_rows(path):
+	with open(path, "r", newline='', encoding='utf-8') as f:
+		if path.endswith(".jsonl"):
+			for line in f:
+				if line.strip() != "":
+					yield json.loads(line)
+		else:
+			for row in csv.DictReader(f):
+				yield row
+
+# the fields of the rows of a batch input, in the order they first appear. The rows of a .jsonl file do not have to
+# share the same fields, so it is read through once for them
+def get_batch_fields(path):
+	if not path.endswith(".jsonl"):
+		with open(path, "r", newline='', encoding='utf-8') as f:
+			return next(csv.reader(f), [])
+	fields = {}
+	for row in read_batch_rows(path):
+		for field in row:
+			fields[field] = True
+	return list(fields)
+
+# lists can be given as json lists, or as "|" separated strings in .csv files
+def get_row_names(row, field):
+	names = row.get(field, [])
+	if isinstance(names, str):
+		names = [name for name in names.split("|") if name != ""]
+	return [str(name) for name in names]
+
+def get_batch_ids(names_to_ids, property, names, unknown):
+	ids = names_to_ids[property]
+	none_id = ids["None"]
+	result = np.empty(len(names), dtype=np.int64)
+	for i, name in enumerate(names):
+		id = ids.get(name)
+		if id is None:
+			unknown[property] = unknown.get(property, 0) + 1
+			id = none_id
+		result[i] = id
+	return result
+
+# the gameplay, metacritic and release of a row, or None if one of them is missing or not a number
+def get_row_numbers(row):
+	try:
+		return [float(row["gameplay"]), float(row["metacritic"]), float(row["release"])]
+	except (KeyError, TypeError, ValueError):
+		return None
+
+# numbers are the get_row_numbers of the rows, none of them None; tag names which are not in the map are counted in
+# unknown_tags
+def score_batch(model, sizes, matcher, rows, numbers, unknown, unknown_tags):
+	names_to_ids = matcher.map
+	genres = [get_row_names(row, "genre") for row in rows]
+	categorical = np.stack([
+		get_batch_ids(names_to_ids, "series", [str(row.get("series", "None")) for row in rows], unknown),
+		get_batch_ids(names_to_ids, "genres", [names[0] if len(names) > 0 else "None" for names in genres], unknown),
+		get_batch_ids(names_to_ids, "esrb_ratings", [str(row.get("esrb", "None")) for row in rows], unknown)
+	], 1)
+	continuous = np.array(numbers, dtype=np.float32)
+	tags = None
+	descriptions = None
+	if model.model_type in ("multi_hot", "description"):
+		tags = [get_tags(matcher, [names, get_row_names(row, "developers"), get_row_names(row, "publishers")], True, unknown_tags) for row, names in zip(rows, genres)]
+	if model.model_type == "description":
+		descriptions = [str(row.get("description") or "") for row in rows]
+	return np.asarray(predict(model, sizes, categorical, continuous, tags, descriptions)).reshape(-1)
+
+# games with a series / genre / esrb missing from the map are scored as "None" instead of stopping the whole batch, and
+# rows without a valid gameplay, metacritic or release are skipped (and left out of the output). The predictions are
+# written as json lines if output is a .jsonl file, and as a .csv file otherwise
+def run_batch(model, names_to_ids, input, output, batch_size):
+	sizes = get_sizes(names_to_ids)
+	matcher = PropertyMatcher(names_to_ids)
+	unknown = {}
+	unknown_tags = {}
+	skipped = []
+	num_skipped = 0
+	num_rows = 0
+	num_games = 0
+	start = time.perf_counter()
+	with open(output, "w", newline='', encoding='utf-8') as f:
+		writer = None
+		if not output.endswith(".jsonl"):
+			writer = csv.DictWriter(f, fieldnames=[field for field in get_batch_fields(input) if field != "prediction"] + ["prediction"], extrasaction='ignore')
+			writer.writeheader()
+		batch = []
+		rows = read_batch_rows(input)
+		while True:
+			with profiling.stage("read rows"):
+				batch = list(itertools.islice(rows, batch_size))
+			if len(batch) == 0:
+				break
+			valid = []
+			numbers = []
+			for row in batch:
+				num_rows = num_rows + 1
+				row_numbers = get_row_numbers(row)
+				if row_numbers is None:
+					num_skipped = num_skipped + 1
+					# only the first few are reported
+					if len(skipped) < 10:
+						skipped.append(num_rows)
+				else:
+					valid.append(row)
+					numbers.append(row_numbers)
+			batch = valid
+			if len(batch) == 0:
+				continue
+			with profiling.stage("score"):
+				predictions = score_batch(model, sizes, matcher, batch, numbers, unknown, unknown_tags)
+			with profiling.stage("write rows"):
+				write_batch(f, writer, batch, predictions)
+			num_games = num_games + len(batch)
+			profiling.count("games scored", len(batch))
+	elapsed = time.perf_counter() - start
+	for property, count in unknown.items():
+		print(str(count) + " games had a \"" + property + "\" which is not in the map. Defaulted to \"None\"")
+	for group, count in unknown_tags.items():
+		print("Left out " + str(count) + " \"" + group + "\" names which are not in the map")
+	if num_skipped > 0:
+		print("Skipped " + str(num_skipped) + " rows without a number for gameplay, metacritic or release (rows " + ", ".join(str(row) for row in skipped) + (", ..." if num_skipped > len(skipped) else "") + ")")
+	print("Scored " + str(num_games) + " games in " + "%.3f" % elapsed + "s (" + "%.0f" % (num_games / max(elapsed, 1e-9)) + " games/s). Wrote predictions to " + output)
+
+# a value of a .csv file; lists are joined with "|", as get_row_names reads them
+def format_batch_value(value):
+	if isinstance(value, list):
+		return "|".join(str(item) for item in value)
+	return value
+
+# writes json lines if writer is None
+def write_batch(f, writer, rows, predictions):
+	for row, prediction in zip(rows, predictions):
+		if writer is None:
+			row["prediction"] = round(float(prediction), 4)
+			f.write(json.dumps(row) + "\n")
+		else:
+			row["prediction"] = "%.4f" % prediction
+			writer.writerow({field: format_batch_value(value) for field, value in row.items()})
 
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser()
-	parser.add_argument("--input_model", required=False, help="model to use for inference", default="models/model.pt")
-	parser.add_argument("--input_map", required=False, help="name of json file which maps ids to categories, vice versa", default="seeded_data/data.json")
+	parser.add_argument("--input_model", required=False, help="model to use for inference (.pt, or .npz exported with convert_model.py --to numpy)", default="models/model.pt")
+	parser.add_argument("--input_map", required=False, help="name of json file (or columnar directory) which maps ids to categories, vice versa", default="seeded_data/data.json")
 	parser.add_argument("--name", required=False, help="The name to search for in RAWG / Howlongtobeat", default="")
 	parser.add_argument("--selector", required=False, help="Which game to pick from RAWG / Howlongtobeat from the results list (0, 1, ...)", default=0)
-	parser.add_argument("--series", required=True, help="The game series (Mario Sports, Katamari, etc)")
-	parser.add_argument("--genre", required=False, help="The game genre (Racing, RPG, Strategy, etc)", default="None")
+	parser.add_argument("--series", required=False, help="The game series (Mario Sports, Katamari, etc). Required unless --batch_input is used")
+	parser.add_argument("--genre", required=False, help="The game genre (Racing, RPG, Strategy, etc). Can be repeated for the multi_hot model, the first genre is used by the others", action="append")
 	parser.add_argument("--esrb", required=False, help="The ESRB (Everyone, Everyone 10+, Teen, Mature)", default="None")
 	parser.add_argument("--gameplay", required=False, help="How long to beat (hours)", default=-1)
 	parser.add_argument("--metacritic", required=False, help="The metacritic score (1-100)", default=-1)
 	parser.add_argument("--release", required=False, help="The release date (yyyy)", default=-1)
+	parser.add_argument("--developer", required=False, help="A developer of the game, used by the multi_hot model. Can be repeated", action="append")
+	parser.add_argument("--publisher", required=False, help="A publisher of the game, used by the multi_hot model. Can be repeated", action="append")
+	parser.add_argument("--description", required=False, help="The description of the game, used by the description model (taken from RAWG when --name is given)", default="")
+	parser.add_argument("--batch_input", required=False, help="a .csv or .jsonl file of games to score, with the fields " + ", ".join(BATCH_FIELDS), default="")
+	parser.add_argument("--batch_output", required=False, help="the .csv (or .jsonl) file to write the predictions of --batch_input to", default="predictions.csv")
+	parser.add_argument("--batch_size", required=False, help="how many games of --batch_input are scored at once", default=65536)
+	parser.add_argument("--skip_local", required=False, help="query RAWG / Howlongtobeat for --name even if the game is in the seeded data of --input_map", action="store_true")
+	parser.add_argument("--title_threshold", required=False, help="how similar (0-1) a title of the seeded data has to be to --name to be used instead of querying RAWG / Howlongtobeat. 1 only uses titles which are the same apart from case, accents and punctuation", default=1)
+	add_cache_arguments(parser)
+	add_profile_arguments(parser)
 	
 	args = parser.parse_args()
+	start_from_args(args, "inference")
+	if args.series is None and args.batch_input == "":
+		parser.error("--series is required unless --batch_input is used")
 	args.selector = int(args.selector)
 	args.gameplay = int(args.gameplay)
 	args.metacritic = int(args.metacritic)
 	args.release = int(args.release)
+	args.genres = [genre for genre in (args.genre or []) if genre != "None"]
+	args.genre = args.genres[0] if len(args.genres) > 0 else "None"
+	args.developers = args.developer or []
+	args.publishers = args.publisher or []
+	
+	# a .json file is parsed once, for the map and for the local lookup of --name
+	with profiling.stage("load map"):
+		seeded = load_seeded(args.input_map)
+		data = get_map(seeded)["name-to-id"]
 	
-	with open(args.input_map, "r", encoding='utf-8') as f:
-		data = json.loads(f.read())["map"]["name-to-id"]
+	# score every game in a file
+	if args.batch_input != "":
+		# the games of the file are not needed for scoring a batch
+		seeded = None
+		run_batch(load_model(args.input_model, data), data, args.batch_input, args.batch_output, int(args.batch_size))
+		exit(0)
 		
+	# finds the names of the map closest to those given which are not in it
+	matcher = PropertyMatcher(data)
+	
 	# use data supplied by user
 	if args.name == "":
-		series, genre, esrb, gameplay_main, metacritic, release_date = get_attributes_from_user(args, data)
+		series, genre, esrb, gameplay_main, metacritic, release_date, tags, description = get_attributes_from_user(args, matcher)
 		
-	# search RAWG / Howlongtobeat for data
+	# use the seeded data of the game if it is in --input_map, otherwise search RAWG / Howlongtobeat for data
 	else:
-		series, genre, esrb, gameplay_main, metacritic, release_date = get_attributes_from_internet(args, data)
-	
-	num_series = len(data["series"].keys())
-	num_genres = len(data["genres"].keys())
-	num_esrb_ratings = len(data["esrb_ratings"])
-	sizes = (num_series, num_genres, num_esrb_ratings)
-	
-	model = TrainingModel(sizes)
-	model.load_state_dict(torch.load(args.input_model))
-	model.eval()
+		game = None
+		if not args.skip_local:
+			with profiling.stage("local lookup"):
+				game = GameIndex(args.input_map, seeded).find(args.name, args.selector, float(args.title_threshold))
+			if game is not None and not is_local_game_complete(game):
+				print("\"" + game["name"] + "\" is in the seeded data, but without a genre, gameplay time or release date. Querying RAWG / Howlongtobeat")
+				game = None
+		if game is not None:
+			print("Using the seeded data of \"" + game["name"] + "\"")
+			series, genre, esrb, gameplay_main, metacritic, release_date, tags, description = get_attributes_from_local(args, matcher, game)
+		else:
+			lookup = Lookup(cache=get_cache_from_args(args))
+			with profiling.stage("lookup"):
+				series, genre, esrb, gameplay_main, metacritic, release_date, tags, description = get_attributes_from_internet(args, matcher, lookup)
 	
-	series_tensor = F.one_hot(torch.tensor([series], dtype=torch.long), len(data["series"].keys())).type(torch.FloatTensor)
-	genres_tensor = F.one_hot(torch.tensor([genre], dtype=torch.long), len(data["genres"].keys())).type(torch.FloatTensor)
-	esrb_tensor = F.one_hot(torch.tensor([esrb], dtype=torch.long), len(data["esrb_ratings"].keys())).type(torch.FloatTensor)
-	continuous = torch.unsqueeze(torch.tensor([gameplay_main,metacritic,release_date], dtype=torch.float32), 0)
-	with torch.no_grad():
-		out_data = model(((series_tensor, genres_tensor, esrb_tensor), continuous))
-		print(out_data)
\ No newline at end of file
+	model = load_model(args.input_model, data)
+	with profiling.stage("predict"):
+		out_data = predict(model, get_sizes(data), [[series, genre, esrb]], [[gameplay_main, metacritic, release_date]], [tags], [description])
+	if isinstance(model, NumpyModel):
+		print("%.4f" % out_data[0])
+	else:
+		print(out_data)
@@ -0,0 +1,116 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from concurrency import Service
+import json
+import threading
+
+# the clients are imported when they are first needed, so that offline runs never load them
+def get_rawg_client():
+	import rawg.rawgpy as rawgpy
+	with open("rawg_info.json", "r", encoding='utf-8') as f:
+		rawg_data = json.loads(f.read())
+		user_agent = rawg_data["user-agent"]
+		api_key = rawg_data["key"]
+	return rawgpy.RAWG(user_agent, api_key)
+
+# the network lookups only return plain values so that they can run on worker threads and be cached
+def fetch_rawg(rawg, service, name, selector):
+	results = service.call(rawg.search, name)
+	if len(results) == 0:
+		return None, selector
+	if len(results) <= selector:
+		print("a selector of " + str(selector) + " was specified, but there were only " + str(len(results)) + " results. Using first result")
+		selector = 0
+	game_rawg = results[selector]
+	service.call(game_rawg.populate)
+	
+	# RAWG does not always have data for these categories
+	game_esrb = None
+	if hasattr(game_rawg, "esrb_rating"):
+		game_esrb = game_rawg.esrb_rating["name"]
+	game_metacritic = None
+	if hasattr(game_rawg, "metacritic"):
+		game_metacritic = game_rawg.metacritic
+	return {
+		"esrb": game_esrb,
+		"metacritic": game_metacritic,
+		"genres": [genre.name for genre in game_rawg.genres],
+		"developers": [developer.name for developer in game_rawg.developers],
+		"publishers": [publisher.name for publisher in game_rawg.publishers],
+		"description": game_rawg.description_raw,
+		"released": game_rawg.released
+	}, selector
+
+def fetch_hltb(hltb, service, name, selector):
+	results = service.call(hltb.search, name)
+	if len(results) <= selector:
+		return None
+	game_hltb = results[selector]
+	return {
+		"gameplay_main": game_hltb.gameplay_main,
+		"gameplay_main_unit": game_hltb.gameplay_main_unit,
+		"gameplay_completionist": game_hltb.gameplay_completionist,
+		"gameplay_completionist_unit": game_hltb.gameplay_completionist_unit
+	}
+
+def get_gameplay_hours(time, unit):
+	if time == -1:
+		return -1
+	if unit != "Hours":
+		return 1
+	return int(str(time).replace("½", ""))
+
+class Lookup:
+	# rawg / hltb can be swapped for any objects with the same search() interface, e.g. clients of local stub servers.
+	# The real clients are only created once a lookup actually misses the cache.
+	def __init__(self, rawg=None, hltb=None, cache=None, rawg_service=None, hltb_service=None):
+		self.rawg_client = rawg
+		self.hltb_client = hltb
+		self.cache = cache
+		self.rawg_service = rawg_service if rawg_service is not None else Service("RAWG")
+		self.hltb_service = hltb_service if hltb_service is not None else Service("Howlongtobeat")
+		self.lock = threading.Lock()
+
+	def get_rawg_client(self):
+		with self.lock:
+			if self.rawg_client is None:
+				self.rawg_client = get_rawg_client()
+			return self.rawg_client
+
+	def get_hltb_client(self):
+		with self.lock:
+			if self.hltb_client is None:
+				from howlongtobeatpy import HowLongToBeat
+				self.hltb_client = HowLongToBeat()
+			return self.hltb_client
+
+	def rawg(self, name, selector):
+		def fetch():
+			return fetch_rawg(self.get_rawg_client(), self.rawg_service, name, selector)
+		if self.cache is None:
+			return fetch()
+		game_rawg, selector = self.cache.fetch("rawg", name, selector, lambda: list(fetch()))
+		return game_rawg, selector
+
+	def hltb(self, name, selector):
+		def fetch():
+			return fetch_hltb(self.get_hltb_client(), self.hltb_service, name, selector)
+		if self.cache is None:
+			return fetch()
+		return self.cache.fetch("hltb", name, selector, fetch)
@@ -20,61 +20,164 @@ import torch
 from torch import nn
 import torch.nn.functional as F
 from torch.utils.data.dataset import Dataset
+from torch.utils.data.sampler import Sampler
 import numpy as np
+from features import TAG_GROUPS, get_sizes, make_bag, take_bag
+import profiling
+
+# the ids and EmbeddingBag offsets of the lists at the given indices of a bag made by make_bag
+def slice_bag(ids, offsets, indices):
+	starts = offsets[indices]
+	lengths = offsets[indices + 1] - starts
+	batch_offsets = torch.zeros(len(indices), dtype=torch.long)
+	torch.cumsum(lengths[:-1], 0, out=batch_offsets[1:])
+	positions = torch.arange(int(lengths.sum())) + torch.repeat_interleave(starts - batch_offsets, lengths)
+	return ids[positions], batch_offsets
 
 class GameDataset(Dataset):
-	def __init__(self, game_dict, keys, sizes):
-		num_games = len(keys)
+	# model_type decides what the categorical input looks like (see the model_type attribute of the models below):
+	# "one_hot" yields three one-hot tensors, "embedding" the (n, 3) tensor of series, genre and esrb ids,
+	# "multi_hot" additionally yields every genre, developer and publisher of the games as EmbeddingBag input,
+	# and "description" also the hashed words of their descriptions.
+	# descriptions are the (ids, offsets) of the hashed descriptions of every game in game_dict, in its order
+	# (see descriptions.py); they are sliced a batch at a time, so they can stay memory mapped
+	def __init__(self, game_dict, keys, sizes, model_type="one_hot", descriptions=None):
 		self.sizes = sizes
-		self.X_categorical = np.zeros((num_games, 3), dtype=np.int32)
-		self.X_continuous = np.zeros((num_games, 3), dtype=np.float32)
-		self.Y = np.zeros(num_games, dtype=np.float32)
-		indices_to_remove = []
+		self.model_type = model_type
+		keys = [key for key in keys if len(game_dict[key]["genres"]) >= 1 and game_dict[key]["gameplay_main"] != -1 and len(game_dict[key]["release_date"]) >= 4]
+		games = [game_dict[key] for key in keys]
 		
-		self.num_items = 0
-		i = 0
-		for key in keys:
-			current_game = game_dict[key]
-			
-			if current_game["metacritic"] == -1:
-				current_game["metacritic"] = 70
-			if len(current_game["genres"]) < 1 or current_game["gameplay_main"] == -1 or len(current_game["release_date"]) < 4:
-				indices_to_remove.append(i)
-				i = i + 1
-				continue
-			
-			self.X_categorical[i][0] = current_game["series"]
-			self.X_categorical[i][1] = current_game["genres"][0]
-			self.X_categorical[i][2] = current_game["esrb"]
-			
-			self.X_continuous[i][0] = current_game["gameplay_main"]
-			self.X_continuous[i][1] = current_game["metacritic"]
-			self.X_continuous[i][2] = float((current_game["release_date"])[0:4])
-			
-			self.Y[i] = current_game["target_value"]
-			self.num_items = self.num_items + 1
-			i = i + 1
+		self.descriptions = descriptions
+		self.description_rows = None
+		if descriptions is not None:
+			positions = {key: i for i, key in enumerate(game_dict)}
+			self.description_rows = np.array([positions[key] for key in keys], dtype=np.int64)
+		self.num_items = len(games)
+		self.X_categorical = np.array([(game["series"], game["genres"][0], game["esrb"]) for game in games], dtype=np.int32).reshape(-1, 3)
+		self.X_continuous = np.array([(game["gameplay_main"], 70 if game["metacritic"] == -1 else game["metacritic"], float(game["release_date"][0:4])) for game in games], dtype=np.float32).reshape(-1, 3)
+		self.Y = np.array([game["target_value"] for game in games], dtype=np.float32)
+		self.X_tags = [make_bag([game[group] for game in games]) for group in TAG_GROUPS]
+		self.make_tensors()
+	
+	# builds the dataset from the games at the given indices of a ColumnarData, without going through any dicts
+	@staticmethod
+	def from_columnar(data, indices, sizes, model_type="one_hot", descriptions=None):
+		dataset = GameDataset.__new__(GameDataset)
+		dataset.sizes = sizes
+		dataset.model_type = model_type
+		indices = np.asarray(indices, dtype=np.int64)
+		genres_offsets = data["genres_offsets"]
+		num_genres = genres_offsets[indices + 1] - genres_offsets[indices]
+		indices = indices[(num_genres >= 1) & (data["gameplay_main"][indices] != -1) & (data["release_year"][indices] != -1)]
 		
-		self.X_categorical = np.delete(self.X_categorical, indices_to_remove, 0)
-		self.X_continuous = np.delete(self.X_continuous, indices_to_remove, 0)
-		self.Y = np.delete(self.Y, indices_to_remove)
+		metacritic = data["metacritic"][indices]
+		dataset.num_items = len(indices)
+		dataset.X_categorical = np.stack([data["series"][indices], data["genres_ids"][genres_offsets[indices]], data["esrb"][indices]], 1).astype(np.int32)
+		dataset.X_continuous = np.stack([data["gameplay_main"][indices], np.where(metacritic == -1, 70, metacritic), data["release_year"][indices]], 1).astype(np.float32)
+		dataset.Y = np.asarray(data["target_value"][indices], dtype=np.float32)
+		dataset.X_tags = [take_bag(data[group + "_ids"], data[group + "_offsets"], indices) for group in TAG_GROUPS]
+		dataset.descriptions = descriptions
+		dataset.description_rows = indices if descriptions is not None else None
+		dataset.make_tensors()
+		return dataset
+	
+	# builds the dataset from arrays laid out like the attributes set by __init__ (e.g. views of shared memory)
+	@staticmethod
+	def from_arrays(X_categorical, X_continuous, Y, X_tags, sizes, model_type="one_hot", descriptions=None, description_rows=None):
+		dataset = GameDataset.__new__(GameDataset)
+		dataset.sizes = sizes
+		dataset.model_type = model_type
+		dataset.num_items = len(Y)
+		dataset.X_categorical = X_categorical
+		dataset.X_continuous = X_continuous
+		dataset.Y = Y
+		dataset.X_tags = X_tags
+		dataset.descriptions = descriptions
+		dataset.description_rows = description_rows
+		dataset.make_tensors()
+		return dataset
+	
+	# the (ids, offsets) of the hashed descriptions of the games at the given indices, as made by make_bag
+	def get_description_bag(self, indices):
+		ids, offsets = self.descriptions
+		return take_bag(ids, offsets, self.description_rows[indices])
+	
+	def make_tensors(self):
+		self.categorical_tensor = torch.from_numpy(self.X_categorical.astype(np.int64, copy=False))
+		self.continuous_tensor = torch.from_numpy(self.X_continuous)
+		self.Y_tensor = torch.from_numpy(self.Y)
+		self.tag_tensors = [(torch.from_numpy(ids), torch.from_numpy(offsets)) for ids, offsets in self.X_tags]
+		if self.descriptions is not None:
+			self.description_tensors = (torch.from_numpy(self.descriptions[0]), torch.from_numpy(self.descriptions[1]))
+			self.description_rows_tensor = torch.from_numpy(self.description_rows)
 	
 	def __len__(self):
 		return self.num_items
 	
+	# idx is either a single index, or a list / tensor of indices (as yielded by GameBatchSampler) for a whole batch
 	def __getitem__(self, idx):
+		if not isinstance(idx, (int, np.integer)):
+			return self.get_batch(torch.as_tensor(idx, dtype=torch.long))
+		if self.model_type == "embedding":
+			return (self.categorical_tensor[idx], self.continuous_tensor[idx]), self.Y[idx]
+		# bags of different games can not be collated, so a single game is returned as a batch of one
+		if self.model_type in ("multi_hot", "description"):
+			return self.get_batch(torch.tensor([idx]))
 		series_tensor = torch.squeeze(F.one_hot(torch.tensor([self.X_categorical[idx][0]], dtype=torch.long), self.sizes[0])).type(torch.FloatTensor)
 		genres_tensor = torch.squeeze(F.one_hot(torch.tensor([self.X_categorical[idx][1]], dtype=torch.long), self.sizes[1])).type(torch.FloatTensor)
 		esrb_tensor = torch.squeeze(F.one_hot(torch.tensor([self.X_categorical[idx][2]], dtype=torch.long), self.sizes[2])).type(torch.FloatTensor)
 		X_continuous = torch.from_numpy(self.X_continuous[idx])
 		Y = self.Y[idx]
 		return ((series_tensor, genres_tensor, esrb_tensor), X_continuous), Y
+	
+	def get_batch(self, indices):
+		categorical = self.categorical_tensor[indices]
+		if self.model_type == "embedding":
+			return (categorical, self.continuous_tensor[indices]), self.Y_tensor[indices]
+		if self.model_type in ("multi_hot", "description"):
+			tags = [slice_bag(ids, offsets, indices) for ids, offsets in self.tag_tensors]
+			if self.model_type == "description":
+				ids, offsets = slice_bag(*self.description_tensors, self.description_rows_tensor[indices])
+				tags.append((ids.long(), offsets))
+			return ((categorical, tags), self.continuous_tensor[indices]), self.Y_tensor[indices]
+		series_tensor = F.one_hot(categorical[:, 0], self.sizes[0]).type(torch.FloatTensor)
+		genres_tensor = F.one_hot(categorical[:, 1], self.sizes[1]).type(torch.FloatTensor)
+		esrb_tensor = F.one_hot(categorical[:, 2], self.sizes[2]).type(torch.FloatTensor)
+		return ((series_tensor, genres_tensor, esrb_tensor), self.continuous_tensor[indices]), self.Y_tensor[indices]
 
+# yields the indices of a whole batch at once, so that a DataLoader created with batch_size=None
+# hands them to GameDataset.get_batch instead of fetching and collating every item on its own
+class GameBatchSampler(Sampler):
+	# with indices, the batches are drawn from the games at those indices only (like a cross validation fold), so
+	# that the dataset does not have to be copied for them
+	def __init__(self, num_items, batch_size, shuffle=False, indices=None):
+		self.num_items = num_items if indices is None else len(indices)
+		self.batch_size = batch_size
+		self.shuffle = shuffle
+		self.indices = torch.as_tensor(indices, dtype=torch.long) if indices is not None else None
+	
+	def __len__(self):
+		return (self.num_items + self.batch_size - 1) // self.batch_size
+	
+	def __iter__(self):
+		if self.shuffle:
+			order = torch.randperm(self.num_items)
+		else:
+			order = torch.arange(self.num_items)
+		if self.indices is not None:
+			order = self.indices[order]
+		return iter(torch.split(order, self.batch_size))
+
+# The series, genre and esrb layers are registered as a ModuleList, so they are trained and saved with the model. They
+# used to be a plain list, which left them at their random initialization and out of the saved weights; checkpoints of
+# that format only hold lin.* and are still loaded by load_model, but old code can not load the checkpoints saved now
 class TrainingModel(nn.Module):
+	model_type = "one_hot"
+	
 	def __init__(self, sizes):
 		super().__init__()
 		self.lin = nn.Linear(6, 1)
-		self.linCategorical = [nn.Linear(num,1) for num in sizes]
+		self.linCategorical = nn.ModuleList([nn.Linear(num,1) for num in sizes[0:3]])
 	
 	def forward(self, xb):
 		X_series = self.linCategorical[0](xb[0][0])
@@ -83,4 +186,102 @@ class TrainingModel(nn.Module):
 		X_continuous = xb[1]
 		x = torch.cat([X_series, X_genre, X_esrb, X_continuous], 1)
 		x = torch.squeeze(self.lin(x))
-		return x
\ No newline at end of file
+		return x
+
+# Same model as TrainingModel, but takes the (n, 3) tensor of category ids instead of one-hot vectors.
+# Looking up row i of an Embedding(num, 1) gives the same value as Linear(num, 1) applied to the one-hot vector of i,
+# with the bias of the linear layer folded into every row.
+class EmbeddingTrainingModel(nn.Module):
+	model_type = "embedding"
+	
+	def __init__(self, sizes):
+		super().__init__()
+		self.lin = nn.Linear(6, 1)
+		self.embCategorical = nn.ModuleList([nn.Embedding(num, 1) for num in sizes[0:3]])
+	
+	@staticmethod
+	def from_one_hot(model):
+		sizes = [layer.in_features for layer in model.linCategorical]
+		embedding_model = EmbeddingTrainingModel(sizes)
+		with torch.no_grad():
+			embedding_model.lin.load_state_dict(model.lin.state_dict())
+			for layer, embedding in zip(model.linCategorical, embedding_model.embCategorical):
+				embedding.weight.copy_(layer.weight.t() + layer.bias)
+		return embedding_model
+	
+	def forward(self, xb):
+		X_categorical = torch.cat([embedding(xb[0][:, i]) for i, embedding in enumerate(self.embCategorical)], 1)
+		x = torch.cat([X_categorical, xb[1]], 1)
+		x = torch.squeeze(self.lin(x))
+		return x
+
+# Uses every genre, developer and publisher of a game instead of only its first genre.
+# Each of them is averaged over the game's ids by an EmbeddingBag, which takes the flat ids of a whole batch
+# plus the offset at which each game's ids start, so memory only grows with the number of ids actually present.
+class MultiHotTrainingModel(nn.Module):
+	model_type = "multi_hot"
+	
+	def __init__(self, sizes):
+		super().__init__()
+		self.lin = nn.Linear(8, 1)
+		self.embSeries = nn.Embedding(sizes[0], 1)
+		self.embEsrb = nn.Embedding(sizes[2], 1)
+		self.bagTags = nn.ModuleList([nn.EmbeddingBag(sizes[1], 1, mode="mean"), nn.EmbeddingBag(sizes[3], 1, mode="mean"), nn.EmbeddingBag(sizes[4], 1, mode="mean")])
+	
+	def forward(self, xb):
+		categorical, tags = xb[0]
+		X_series = self.embSeries(categorical[:, 0])
+		X_esrb = self.embEsrb(categorical[:, 2])
+		X_tags = [bag(ids, offsets) for bag, (ids, offsets) in zip(self.bagTags, tags)]
+		x = torch.cat([X_series, X_esrb] + X_tags + [xb[1]], 1)
+		x = torch.squeeze(self.lin(x))
+		return x
+
+# MultiHotTrainingModel plus the mean over the hashed words of the game's description, which is taken as a fourth bag.
+# sizes[5] is the number of hash buckets; the bag has sparse gradients, since a batch only touches a few of them
+class DescriptionTrainingModel(MultiHotTrainingModel):
+	model_type = "description"
+	
+	def __init__(self, sizes):
+		super().__init__(sizes)
+		self.lin = nn.Linear(9, 1)
+		self.bagTags.append(nn.EmbeddingBag(sizes[5], 1, mode="mean", sparse=True))
+
+MODEL_TYPES = {
+	"one_hot": TrainingModel,
+	"embedding": EmbeddingTrainingModel,
+	"multi_hot": MultiHotTrainingModel,
+	"description": DescriptionTrainingModel
+}
+
+def get_model_type(state_dict):
+	if "bagTags.3.weight" in state_dict:
+		return "description"
+	if any(key.startswith("bagTags.") for key in state_dict):
+		return "multi_hot"
+	if any(key.startswith("embCategorical.") for key in state_dict):
+		return "embedding"
+	return "one_hot"
+
+# the keys a one-hot model saved before its categorical layers were registered does not have
+def get_legacy_keys(model):
+	return [key for key in model.state_dict() if key.startswith("linCategorical.")]
+
+# One-hot models saved before linCategorical was a ModuleList only contain the weights of lin. Their categorical layers
+# keep their random initialization, which is what loading them always did, and model.legacy is set so that callers can
+# tell; every other checkpoint is loaded strictly
+def load_model(path, sizes):
+	with profiling.stage("torch.load"):
+		state_dict = torch.load(path)
+	model_type = get_model_type(state_dict)
+	# the number of hash buckets is not part of the map, it is whatever the model was trained with
+	if model_type == "description":
+		sizes = tuple(sizes[0:5]) + (state_dict["bagTags.3.weight"].shape[0],)
+	model = MODEL_TYPES[model_type](sizes)
+	legacy = model_type == "one_hot" and not any(key in state_dict for key in get_legacy_keys(model))
+	model.load_state_dict(state_dict, strict=not legacy)
+	model.legacy = legacy
+	if legacy:
+		print("Warning: " + path + " does not contain weights for the series / genre / esrb layers, they are left untrained. Retrain the model to fix this")
+	model.eval()
+	return model
@@ -0,0 +1,120 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Every model in model_dataset.py is linear, so its prediction is a sum of one value per series, genre and esrb
+# (or the mean of the values of a game's genres / developers / publishers for the multi_hot model, and of the hashed
+# words of its description for the description model), a dot product
+# with the continuous features, and a bias. export_tables folds the layers of a trained model into those values,
+# which NumpyModel evaluates without importing torch at all.
+
+import numpy as np
+from features import TAG_GROUPS, make_bag
+from descriptions import hash_descriptions
+
+def export_tables(model):
+	weights = model.lin.weight.detach().numpy()[0].astype(np.float32)
+	tables = {
+		"model_type": np.array(model.model_type),
+		"continuous": weights[-3:],
+		"bias": model.lin.bias.detach().numpy().astype(np.float32)
+	}
+	if model.model_type == "one_hot":
+		for i, name in enumerate(("series", "genres", "esrb")):
+			layer = model.linCategorical[i]
+			tables[name] = weights[i] * (layer.weight.detach().numpy()[0] + layer.bias.detach().numpy()[0])
+	elif model.model_type == "embedding":
+		for i, name in enumerate(("series", "genres", "esrb")):
+			tables[name] = weights[i] * model.embCategorical[i].weight.detach().numpy()[:, 0]
+	else:
+		tables["series"] = weights[0] * model.embSeries.weight.detach().numpy()[:, 0]
+		tables["esrb"] = weights[1] * model.embEsrb.weight.detach().numpy()[:, 0]
+		for i, group in enumerate(TAG_GROUPS):
+			tables[group + "_bag"] = weights[2 + i] * model.bagTags[i].weight.detach().numpy()[:, 0]
+		if model.model_type == "description":
+			tables["descriptions_bag"] = weights[5] * model.bagTags[3].weight.detach().numpy()[:, 0]
+	return {name: np.asarray(table, dtype=np.float32) if name != "model_type" else table for name, table in tables.items()}
+
+def save_tables(tables, path):
+	np.savez(path, **tables)
+
+# the mean of table[ids] for every list of a bag made by make_bag; empty lists give 0 like EmbeddingBag does
+def bag_mean(table, ids, offsets):
+	lengths = np.diff(offsets)
+	sums = np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=table[ids], minlength=len(lengths))
+	return (sums / np.maximum(lengths, 1)).astype(np.float32)
+
+class NumpyModel:
+	def __init__(self, tables):
+		self.tables = tables
+		self.model_type = str(tables["model_type"])
+	
+	@staticmethod
+	def load(path):
+		with np.load(path) as f:
+			return NumpyModel({name: f[name] for name in f.files})
+	
+	# same inputs as inference.predict: (n, 3) series / genre / esrb ids, (n, 3) continuous features,
+	# the genre / developer / publisher id lists of every game for the multi_hot model, and the description texts
+	# for the description model
+	def predict(self, categorical, continuous, tags=None, descriptions=None):
+		tag_bags = None
+		description_bag = None
+		if self.model_type == "multi_hot" or self.model_type == "description":
+			num_games = len(np.asarray(categorical).reshape(-1, 3))
+			tag_bags = [make_bag([game_tags[i] for game_tags in tags] if tags is not None else [[] for _ in range(num_games)]) for i in range(len(TAG_GROUPS))]
+			if self.model_type == "description":
+				description_bag = hash_descriptions(descriptions if descriptions is not None else [""] * num_games, len(self.tables["descriptions_bag"]))
+		return sum_contributions(self.contributions(categorical, continuous, tag_bags, description_bag))
+	
+	# the part of the prediction of every game which comes from each of its features, in the order predict adds
+	# them up. tag_bags are the (ids, offsets) of the genres, developers and publishers of the games, as made by
+	# make_bag, and description_bag those of their hashed descriptions
+	def contributions(self, categorical, continuous, tag_bags=None, description_bag=None):
+		categorical = np.asarray(categorical, dtype=np.int64).reshape(-1, 3)
+		continuous = np.asarray(continuous, dtype=np.float32).reshape(-1, 3)
+		parts = {
+			"series": self.tables["series"][categorical[:, 0]],
+			"esrb_ratings": self.tables["esrb"][categorical[:, 2]],
+			"continuous": continuous @ self.tables["continuous"],
+			"bias": self.tables["bias"][0]
+		}
+		if self.model_type != "multi_hot" and self.model_type != "description":
+			parts["genres"] = self.tables["genres"][categorical[:, 1]]
+			return parts
+		for group, (ids, offsets) in zip(TAG_GROUPS, tag_bags):
+			parts[group] = bag_mean(self.tables[group + "_bag"], ids, offsets)
+		if self.model_type == "description":
+			parts["descriptions"] = bag_mean(self.tables["descriptions_bag"], *description_bag)
+		return parts
+	
+	# what a single series / genre / esrb rating / developer / publisher (by the group names of the map) adds to the
+	# prediction of a game, for every id of the group. None for groups the model does not use
+	def get_value_table(self, group):
+		if group == "series":
+			return self.tables["series"]
+		if group == "esrb_ratings":
+			return self.tables["esrb"]
+		if group + "_bag" in self.tables:
+			return self.tables[group + "_bag"]
+		return self.tables.get(group)
+
+def sum_contributions(parts):
+	out = None
+	for part in parts.values():
+		out = part if out is None else out + part
+	return out
@@ -0,0 +1,203 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Instrumentation shared by seed.py, train.py and inference.py. Code anywhere in the project times a named stage with
+#
+#     with profiling.stage("forward"):
+#         ...
+#
+# and counts events with profiling.count("RAWG requests"). Both do nothing until an entry point starts the profiler
+# (which --profile does), so they can stay in hot loops. When the process exits, the time spent in every
+# stage, the counters and the individual stage events are written to a JSON trace, optionally together with a
+# cProfile of every Python function or a torch.profiler trace.
+
+import atexit
+import contextlib
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+# individual stage events kept for the trace; the totals of every stage are always kept
+MAX_EVENTS = 100000
+
+class Stage:
+	def __init__(self, profiler, name):
+		self.profiler = profiler
+		self.name = name
+
+	def __enter__(self):
+		if self.profiler.torch_profiler is not None:
+			import torch
+			self.record = torch.profiler.record_function(self.name)
+			self.record.__enter__()
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		end = time.perf_counter()
+		if self.profiler.torch_profiler is not None:
+			self.record.__exit__(*exc)
+		self.profiler.add_stage(self.name, self.start, end)
+		return False
+
+class Profiler:
+	def __init__(self):
+		self.enabled = False
+		self.lock = threading.Lock()
+		self.name = None
+		self.output = None
+		self.stages = {}
+		self.counters = {}
+		self.values = {}
+		self.events = []
+		self.dropped_events = 0
+		self.python_profiler = None
+		self.torch_profiler = None
+
+	# cprofile profiles every Python function, torch_profile records torch operators (and the stages) with torch.profiler
+	def start(self, name, output="", cprofile=False, torch_profile=False):
+		self.enabled = True
+		self.name = name
+		self.output = output if output != "" else os.path.join("profiles", name + "-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+		self.started = time.time()
+		self.origin = time.perf_counter()
+		if torch_profile:
+			import torch
+			self.torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+			self.torch_profiler.__enter__()
+		if cprofile:
+			import cProfile
+			self.python_profiler = cProfile.Profile()
+			self.python_profiler.enable()
+		# also covers the many places which end a run with exit()
+		atexit.register(self.finish)
+
+	def stage(self, name):
+		if not self.enabled:
+			return contextlib.nullcontext()
+		return Stage(self, name)
+
+	def add_stage(self, name, start, end):
+		with self.lock:
+			totals = self.stages.get(name)
+			if totals is None:
+				totals = self.stages[name] = {"count": 0, "total_seconds": 0., "max_seconds": 0.}
+			totals["count"] = totals["count"] + 1
+			totals["total_seconds"] = totals["total_seconds"] + end - start
+			totals["max_seconds"] = max(totals["max_seconds"], end - start)
+			if len(self.events) < MAX_EVENTS:
+				self.events.append({"name": name, "start": start - self.origin, "seconds": end - start, "thread": threading.current_thread().name})
+			else:
+				self.dropped_events = self.dropped_events + 1
+
+	def count(self, name, amount=1):
+		if not self.enabled:
+			return
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+	# a single value describing the run, like the number of games or the samples per second
+	def set(self, name, value):
+		if not self.enabled:
+			return
+		with self.lock:
+			self.values[name] = value
+
+	def get_stage_seconds(self, name):
+		with self.lock:
+			return self.stages[name]["total_seconds"] if name in self.stages else 0.
+
+	def get_counter(self, name):
+		with self.lock:
+			return self.counters.get(name, 0)
+
+	def finish(self):
+		if not self.enabled:
+			return
+		self.enabled = False
+		trace = {
+			"name": self.name,
+			"argv": sys.argv,
+			"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+			"wall_seconds": time.perf_counter() - self.origin,
+			"stages": {name: dict(totals, mean_seconds=totals["total_seconds"] / totals["count"]) for name, totals in sorted(self.stages.items(), key=lambda item: -item[1]["total_seconds"])},
+			"counters": self.counters,
+			"values": self.values,
+			"events": self.events,
+			"dropped_events": self.dropped_events
+		}
+		directory = os.path.dirname(self.output)
+		if directory != "" and not os.path.exists(directory):
+			os.makedirs(directory)
+		base = os.path.splitext(self.output)[0]
+		if self.python_profiler is not None:
+			self.python_profiler.disable()
+			self.python_profiler.dump_stats(base + ".pstats")
+			trace["cprofile"] = {"path": base + ".pstats", "top": get_top_functions(self.python_profiler)}
+		if self.torch_profiler is not None:
+			self.torch_profiler.__exit__(None, None, None)
+			self.torch_profiler.export_chrome_trace(base + ".torch.json")
+			trace["torch_profiler"] = {"path": base + ".torch.json"}
+			self.torch_profiler = None
+		with open(self.output, "w", encoding='utf-8') as f:
+			f.write(json.dumps(trace))
+		print_summary(trace)
+		print("Profile written to " + self.output)
+
+# the functions with the most cumulative time, in the order pstats prints them
+def get_top_functions(python_profiler, limit=25):
+	stats = pstats.Stats(python_profiler, stream=io.StringIO())
+	stats.sort_stats("cumulative")
+	top = []
+	for function in stats.fcn_list[0:limit]:
+		calls, primitive_calls, total_time, cumulative_time, callers = stats.stats[function]
+		top.append({"function": function[0] + ":" + str(function[1]) + "(" + function[2] + ")", "calls": calls, "total_seconds": total_time, "cumulative_seconds": cumulative_time})
+	return top
+
+def print_summary(trace):
+	print("Profile of " + trace["name"] + ": " + "%.3f" % trace["wall_seconds"] + "s")
+	for name, totals in trace["stages"].items():
+		print("  " + name + ": " + "%.3f" % totals["total_seconds"] + "s in " + str(totals["count"]) + " calls")
+	for name, value in list(trace["counters"].items()) + list(trace["values"].items()):
+		print("  " + name + ": " + str(value))
+
+profiler = Profiler()
+
+def stage(name):
+	return profiler.stage(name)
+
+def count(name, amount=1):
+	profiler.count(name, amount)
+
+def set_value(name, value):
+	profiler.set(name, value)
+
+def add_profile_arguments(parser):
+	parser.add_argument("--profile", required=False, help="time every stage of the run and write a JSON trace", action="store_true")
+	parser.add_argument("--profile_output", required=False, help="file to write the trace to (defaults to profiles/<script>-<time>.json), implies --profile", default="")
+	parser.add_argument("--profile_python", required=False, help="also profile every Python function with cProfile (slow), written next to the trace as .pstats. Implies --profile", action="store_true")
+	parser.add_argument("--profile_torch", required=False, help="also record torch operators with torch.profiler, written next to the trace as a .torch.json chrome trace. Implies --profile", action="store_true")
+
+# the other profiling arguments mean nothing without a trace to write, so each of them starts the profiler too
+def start_from_args(args, name):
+	if args.profile or args.profile_output != "" or args.profile_python or args.profile_torch:
+		profiler.start(name, args.profile_output, args.profile_python, args.profile_torch)
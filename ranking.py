@@ -0,0 +1,204 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Top-K rankings from the contribution tables of a model (see numpy_model.py). Since every model is linear, a whole
+# catalogue of games is scored with one gather per table, and only the best K games are sorted. Asking which series
+# (or genre, esrb rating, ...) is best for a game with the given gameplay, metacritic and release needs no games at
+# all: every value of the group changes the prediction by its entry of the table, so the table is the ranking.
+
+import argparse
+import csv
+import json
+import time
+import numpy as np
+from columnar import ColumnarData, is_columnar, load_map
+from descriptions import get_hashed_descriptions, hash_descriptions
+from features import TAG_GROUPS, get_sizes, make_bag, take_bag
+from inference import get_property, get_tags
+from title_index import PropertyMatcher
+from numpy_model import NumpyModel, export_tables, sum_contributions
+
+GROUPS = ("series", "genres", "esrb_ratings", "developers", "publishers")
+
+# the contribution tables of a .npz model, or of a torch model which they are computed from once
+def load_tables(path, map):
+	if path.endswith(".npz"):
+		return NumpyModel.load(path)
+	import model_dataset
+	return NumpyModel(export_tables(model_dataset.load_model(path, get_sizes(map["name-to-id"]))))
+
+# the features of every game of a seeded .json file or columnar directory which the models can score; like
+# GameDataset, games without a genre, gameplay time or release date are left out. The file is opened first, so that
+# its map can be used to load the model, and load(model) then reads the features the model needs
+class Catalogue:
+	def __init__(self, path):
+		self.path = path
+		if is_columnar(path):
+			self.data = ColumnarData(path)
+			self.map = self.data.map
+		else:
+			with open(path, "r", encoding='utf-8') as f:
+				data_file = json.loads(f.read())
+			self.data = data_file["games"]
+			self.map = data_file["map"]
+		self.num_games = len(self.data)
+
+	def load(self, model):
+		if isinstance(self.data, ColumnarData):
+			self.load_columnar(self.data, model)
+		else:
+			self.load_json(self.data, model)
+
+	def load_json(self, games, model):
+		rows = [i for i, game in enumerate(games.values()) if len(game["genres"]) >= 1 and game["gameplay_main"] != -1 and len(game["release_date"]) >= 4]
+		self.rows = np.array(rows, dtype=np.int64)
+		keys = list(games.keys())
+		self.keys = [keys[i] for i in rows]
+		selected = [games[key] for key in self.keys]
+		self.categorical = np.array([(game["series"], game["genres"][0], game["esrb"]) for game in selected], dtype=np.int64).reshape(-1, 3)
+		self.continuous = np.array([(game["gameplay_main"], 70 if game["metacritic"] == -1 else game["metacritic"], float(game["release_date"][0:4])) for game in selected], dtype=np.float32).reshape(-1, 3)
+		self.targets = np.array([game["target_value"] for game in selected], dtype=np.float32)
+		self.tag_bags = None
+		self.description_bag = None
+		if model.model_type in ("multi_hot", "description"):
+			self.tag_bags = [make_bag([game[group] for game in selected]) for group in TAG_GROUPS]
+		if model.model_type == "description":
+			self.description_bag = take_bag(*get_hashed_descriptions(self.path, games, len(model.tables["descriptions_bag"])), self.rows)
+
+	def load_columnar(self, data, model):
+		self.keys = None
+		rows = np.arange(len(data), dtype=np.int64)
+		genres_offsets = data["genres_offsets"]
+		rows = rows[(genres_offsets[1:] > genres_offsets[:-1]) & (data["gameplay_main"][:] != -1) & (data["release_year"][:] != -1)]
+		self.rows = rows
+		metacritic = data["metacritic"][rows]
+		self.categorical = np.stack([data["series"][rows], data["genres_ids"][genres_offsets[rows]], data["esrb"][rows]], 1).astype(np.int64)
+		self.continuous = np.stack([data["gameplay_main"][rows], np.where(metacritic == -1, 70, metacritic), data["release_year"][rows]], 1).astype(np.float32)
+		self.targets = np.asarray(data["target_value"][rows], dtype=np.float32)
+		self.tag_bags = None
+		self.description_bag = None
+		if model.model_type in ("multi_hot", "description"):
+			self.tag_bags = [take_bag(data[group + "_ids"], data[group + "_offsets"], rows) for group in TAG_GROUPS]
+		if model.model_type == "description":
+			self.description_bag = take_bag(*get_hashed_descriptions(self.path, data, len(model.tables["descriptions_bag"])), rows)
+
+	def __len__(self):
+		return len(self.rows)
+
+	# the key of the i-th scored game in the seeded file; text of columnar files is only read for the games asked for
+	def key(self, i):
+		if self.keys is not None:
+			return self.keys[i]
+		return self.data.key(int(self.rows[i]))
+
+# indices of the k largest scores, best first. Only the k best are sorted, the rest are just partitioned off
+def top_k(scores, k):
+	k = min(k, len(scores))
+	if k <= 0:
+		return np.zeros(0, dtype=np.int64)
+	best = np.argpartition(-scores, k - 1)[0:k]
+	return best[np.argsort(-scores[best], kind="stable")]
+
+# (index, prediction, contributions) of the k games of the catalogue with the highest predictions
+def rank_games(model, catalogue, k):
+	parts = model.contributions(catalogue.categorical, catalogue.continuous, catalogue.tag_bags, catalogue.description_bag)
+	scores = sum_contributions(parts)
+	best = top_k(scores, k)
+	return [(i, float(scores[i]), {name: float(part if np.ndim(part) == 0 else part[i]) for name, part in parts.items()}) for i in best]
+
+# (id, prediction, contribution) of the k values of the group which give the highest prediction to a game with
+# the given features. The game's own value(s) of the group are replaced by each value in turn, and the "None"
+# entry of the map is left out
+def rank_values(model, names_to_ids, group, k, categorical, continuous, tags=None, description=""):
+	table = model.get_value_table(group)
+	tag_bags = None
+	description_bag = None
+	if model.model_type in ("multi_hot", "description"):
+		tag_bags = [make_bag([ids]) for ids in (tags if tags is not None else [[], [], []])]
+		if model.model_type == "description":
+			description_bag = hash_descriptions([description], len(model.tables["descriptions_bag"]))
+	parts = model.contributions([categorical], [continuous], tag_bags, description_bag)
+	base = sum_contributions(parts)[0] - parts[group][0]
+	ids = np.arange(len(table))
+	if "None" in names_to_ids[group]:
+		ids = ids[ids != names_to_ids[group]["None"]]
+	scores = base + table[ids]
+	return [(int(ids[i]), float(scores[i]), float(table[ids[i]])) for i in top_k(scores, k)]
+
+def write_games(path, catalogue, ranked):
+	with open(path, "w", newline='', encoding='utf-8') as f:
+		writer = None
+		for rank, (i, prediction, parts) in enumerate(ranked):
+			row = {"rank": rank + 1, "key": catalogue.key(i), "prediction": "%.4f" % prediction, "target_value": catalogue.targets[i]}
+			row.update({name: "%.4f" % value for name, value in parts.items()})
+			if writer is None:
+				writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+				writer.writeheader()
+			writer.writerow(row)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input_model", required=False, help="model to rank with (.pt, or .npz exported with convert_model.py --to numpy)", default="models/model.pt")
+	parser.add_argument("--input", required=False, help="seeded .json file (or columnar directory) to rank, which also provides the map", default="seeded_data/data.json")
+	parser.add_argument("--by", required=False, help="rank the games of --input, or the values of a group for a game described by the arguments below", choices=("games",) + GROUPS, default="games")
+	parser.add_argument("--top", required=False, help="how many games / values to list", default=10)
+	parser.add_argument("--output", required=False, help="a .csv file to write the ranked games to, with the contribution of every feature", default="")
+	parser.add_argument("--series", required=False, help="the series of the game when ranking another group", default="None")
+	parser.add_argument("--genre", required=False, help="a genre of the game when ranking another group. Can be repeated for the multi_hot model, the first genre is used by the others", action="append")
+	parser.add_argument("--esrb", required=False, help="the ESRB of the game when ranking another group", default="None")
+	parser.add_argument("--developer", required=False, help="a developer of the game when ranking another group, used by the multi_hot model. Can be repeated", action="append")
+	parser.add_argument("--publisher", required=False, help="a publisher of the game when ranking another group, used by the multi_hot model. Can be repeated", action="append")
+	parser.add_argument("--description", required=False, help="the description of the game, used by the description model", default="")
+	parser.add_argument("--gameplay", required=False, help="How long to beat (hours). Required unless ranking games")
+	parser.add_argument("--metacritic", required=False, help="The metacritic score (1-100). Required unless ranking games")
+	parser.add_argument("--release", required=False, help="The release date (yyyy). Required unless ranking games")
+	args = parser.parse_args()
+	k = int(args.top)
+
+	if args.by == "games":
+		start = time.perf_counter()
+		catalogue = Catalogue(args.input)
+		model = load_tables(args.input_model, catalogue.map)
+		catalogue.load(model)
+		loaded = time.perf_counter()
+		ranked = rank_games(model, catalogue, k)
+		elapsed = time.perf_counter() - loaded
+		for rank, (i, prediction, parts) in enumerate(ranked):
+			print(str(rank + 1) + ". " + catalogue.key(i) + ": " + "%.4f" % prediction)
+		print("Ranked " + str(len(catalogue)) + " of " + str(catalogue.num_games) + " games in " + "%.3f" % elapsed + "s (loading took " + "%.3f" % (loaded - start) + "s)")
+		if args.output != "":
+			write_games(args.output, catalogue, ranked)
+			print("Wrote the ranking to " + args.output)
+		exit(0)
+
+	if args.gameplay is None or args.metacritic is None or args.release is None:
+		parser.error("--gameplay, --metacritic and --release are required when ranking " + args.by)
+	map = load_map(args.input)
+	names_to_ids = map["name-to-id"]
+	model = load_tables(args.input_model, map)
+	if model.get_value_table(args.by) is None:
+		print("Error: a " + model.model_type + " model does not use " + args.by + ". Use a multi_hot or description model to rank them")
+		exit(-1)
+	matcher = PropertyMatcher(names_to_ids)
+	genres = [genre for genre in (args.genre or []) if genre != "None"]
+	categorical = [get_property(matcher, "series", args.series), get_property(matcher, "genres", genres[0] if len(genres) > 0 else "None"), get_property(matcher, "esrb_ratings", args.esrb)]
+	continuous = [float(args.gameplay), float(args.metacritic), float(args.release)]
+	tags = get_tags(matcher, [genres, args.developer or [], args.publisher or []])
+	ids_to_names = map["id-to-name"][args.by]
+	for rank, (id, prediction, contribution) in enumerate(rank_values(model, names_to_ids, args.by, k, categorical, continuous, tags, args.description)):
+		print(str(rank + 1) + ". " + ids_to_names[str(id)] + ": " + "%.4f" % prediction + " (" + "%+.4f" % contribution + ")")
@@ -16,10 +16,15 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import rawg.rawgpy as rawgpy
-from howlongtobeatpy import HowLongToBeat
+from concurrency import Service, ordered_map
+from lookup import Lookup, get_gameplay_hours
+from cache import CacheMissError, add_cache_arguments, get_cache_from_args
+from profiling import add_profile_arguments, start_from_args
+import profiling
+import hashlib
 import json
 import csv
+import os
 import argparse
 
 def add_to_dict(ids_to_names, names_to_ids, group, name):
@@ -30,12 +35,239 @@ def add_to_dict(ids_to_names, names_to_ids, group, name):
 		return id
 	return names_to_ids[group][name]
 
-def create_games(input, output):
-	with open("rawg_info.json", "r", encoding='utf-8') as f:
-		rawg_data = json.loads(f.read())
-		user_agent = rawg_data["user-agent"]
-		api_key = rawg_data["key"]
-	rawg = rawgpy.RAWG(user_agent, api_key)
+def read_rows(input):
+	with open(input, 'r', newline='', encoding='utf-8') as games_file:
+		reader = csv.reader(games_file)
+		next(reader)
+		for row in reader:
+			yield {
+				"name": row[0],
+				"series": row[1],
+				"target_value": int(row[2]),
+				"selector": int(row[3])
+			}
+
+# returns the key and the game; keys holds the keys of the games seeded so far, which a remake is told apart from
+def add_game(keys, ids_to_names, names_to_ids, row, game_rawg, game_hltb):
+	name = row["name"]
+	game_developers = []
+	game_publishers = []
+	game_genres = []
+	game_esrb = 0
+	game_metacritic = -1
+	game_gameplay_main = -1
+	game_gameplay_completionist = -1
+	
+	if game_rawg["metacritic"] is not None:
+		game_metacritic = game_rawg["metacritic"]
+	if game_rawg["esrb"] is not None and game_rawg["esrb"] != "No Rating" and game_rawg["esrb"] != "Rating Pending":
+		game_esrb = add_to_dict(ids_to_names, names_to_ids, "esrb_ratings", game_rawg["esrb"])
+		
+	for genre in game_rawg["genres"]:
+		game_genres.append(add_to_dict(ids_to_names, names_to_ids, "genres", genre))
+	for developer in game_rawg["developers"]:
+		game_developers.append(add_to_dict(ids_to_names, names_to_ids, "developers", developer))
+	for publisher in game_rawg["publishers"]:
+		game_publishers.append(add_to_dict(ids_to_names, names_to_ids, "publishers", publisher))
+	
+	game_series = add_to_dict(ids_to_names, names_to_ids, "series", row["series"])
+	
+	if game_hltb is not None:
+		game_gameplay_main = get_gameplay_hours(game_hltb["gameplay_main"], game_hltb["gameplay_main_unit"])
+		game_gameplay_completionist = get_gameplay_hours(game_hltb["gameplay_completionist"], game_hltb["gameplay_completionist_unit"])
+	
+	key_name = name
+	if name in keys:
+		key_name = name + " " + game_rawg["released"][0:4]
+	return key_name, {
+		"name": name,
+		"esrb": game_esrb,
+		"description": game_rawg["description"],
+		"release_date": game_rawg["released"],
+		"metacritic": game_metacritic,
+		"genres": game_genres,
+		"developers": game_developers,
+		"publishers": game_publishers,
+		"series": game_series,
+		"gameplay_main": game_gameplay_main,
+		"gameplay_completionist": game_gameplay_completionist,
+		"target_value": row["target_value"],
+		"selector": row["selector"]
+	}
+
+# a row which was already seeded keeps everything it looked up; only the values taken from the csv can change
+def reuse_game(keys, ids_to_names, names_to_ids, row, previous_game):
+	name = row["name"]
+	key_name = name
+	if name in keys:
+		key_name = name + " " + previous_game["release_date"][0:4]
+	game = dict(previous_game)
+	game["series"] = add_to_dict(ids_to_names, names_to_ids, "series", row["series"])
+	game["target_value"] = row["target_value"]
+	game["selector"] = row["selector"]
+	return key_name, game
+
+def load_previous_games(path):
+	with open(path, "r", encoding='utf-8') as f:
+		data = json.loads(f.read())
+	# json turns the integer ids into strings, they need to be integers again for add_to_dict
+	ids_to_names = {group: {int(id): name for id, name in names.items()} for group, names in data["map"]["id-to-name"].items()}
+	names_to_ids = data["map"]["name-to-id"]
+	# games seeded before the selector was recorded are assumed to use selector 0
+	previous_games = {}
+	for game in data["games"].values():
+		previous_games.setdefault((game["name"], game.get("selector", 0)), []).append(game)
+	return previous_games, ids_to_names, names_to_ids
+
+def match_previous_games(rows, previous_games):
+	for row in rows:
+		matches = previous_games.get((row["name"], row["selector"]), [])
+		yield row, matches.pop(0) if len(matches) > 0 else None
+
+# the sha256 of a file, read a chunk at a time
+def get_file_hash(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+# a journal which can not be resumed by this run
+class JournalError(Exception):
+	pass
+
+# Every finished row is appended to the journal as one line of json, holding the game (or that the row was skipped)
+# and the map entries it added, and is flushed right away. Only the keys of the games stay in memory. Once every row is
+# done, compact() streams the journal into the usual seeded file, so a crash at any point loses at most the row which
+# was being written, and --resume replays the journal to continue where the last run stopped.
+# The first line is a header with the mode of the run and the hash of the seeded file it started from (with
+# --incremental), whose map the ids in the journal continue; a journal is only resumed by a run which starts the same way
+class SeedJournal:
+	def __init__(self, path, ids_to_names, names_to_ids, resume=False, incremental=False, base_hash=None):
+		self.path = path
+		self.ids_to_names = ids_to_names
+		self.names_to_ids = names_to_ids
+		self.header = {"incremental": incremental, "base": base_hash}
+		self.keys = set()
+		self.done = {}
+		self.num_games = 0
+		has_header = False
+		if resume and os.path.exists(path):
+			has_header = self.replay()
+		self.file = open(path, "a" if resume else "w", encoding='utf-8')
+		if not has_header:
+			self.file.write(json.dumps({"header": self.header}) + "\n")
+			self.file.flush()
+		self.map_sizes = self.get_map_sizes()
+	
+	def get_map_sizes(self):
+		return {group: len(names) for group, names in self.ids_to_names.items()}
+	
+	def check_header(self, header):
+		if header["incremental"] != self.header["incremental"]:
+			raise JournalError("the journal " + self.path + " is of a run " + ("with" if header["incremental"] else "without") + " --incremental. Resume it the same way, or seed again without --resume")
+		if header["base"] != self.header["base"]:
+			raise JournalError("the seeded file the run in the journal " + self.path + " started from has changed since. Seed again without --resume")
+	
+	# returns whether the journal has its header (it has none if the last run was killed while writing it)
+	def replay(self):
+		valid_size = 0
+		has_header = False
+		with open(self.path, "r", encoding='utf-8') as f:
+			for line in f:
+				# the last line is incomplete if the previous run was killed while writing it
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					break
+				if not line.endswith("\n"):
+					break
+				valid_size = valid_size + len(line.encode('utf-8'))
+				if not has_header:
+					if "header" not in entry:
+						raise JournalError("the journal " + self.path + " was written by an older seed.py and can not be resumed. Seed again without --resume")
+					self.check_header(entry["header"])
+					has_header = True
+					continue
+				for group, names in entry["map"].items():
+					for name in names:
+						add_to_dict(self.ids_to_names, self.names_to_ids, group, name)
+				self.done[entry["row"]] = entry["name"]
+				if "key" in entry:
+					self.keys.add(entry["key"])
+					self.num_games = self.num_games + 1
+		with open(self.path, "r+", encoding='utf-8') as f:
+			f.truncate(valid_size)
+		return has_header
+	
+	def is_done(self, index, row):
+		if index not in self.done:
+			return False
+		if self.done[index] != row["name"]:
+			raise JournalError("row " + str(index) + " of the input is \"" + row["name"] + "\", but \"" + self.done[index] + "\" in the journal " + self.path + ". The input changed since the last run, seed again without --resume")
+		return True
+	
+	def write(self, index, row, key=None, game=None):
+		map_sizes = self.get_map_sizes()
+		entry = {"row": index, "name": row["name"], "map": {group: [self.ids_to_names[group][id] for id in range(self.map_sizes[group], size)] for group, size in map_sizes.items() if size > self.map_sizes[group]}}
+		self.map_sizes = map_sizes
+		if key is not None:
+			entry["key"] = key
+			entry["game"] = game
+			self.keys.add(key)
+			self.num_games = self.num_games + 1
+		self.file.write(json.dumps(entry) + "\n")
+		self.file.flush()
+	
+	# writes the same file as json.dumps({"games": ..., "map": ...}) would, one game at a time
+	def compact(self, output):
+		self.file.close()
+		with open(output + ".tmp", "w", encoding='utf-8') as out:
+			out.write('{"games": {')
+			first = True
+			with open(self.path, "r", encoding='utf-8') as f:
+				for line in f:
+					entry = json.loads(line)
+					if "key" not in entry:
+						continue
+					if not first:
+						out.write(", ")
+					out.write(json.dumps(entry["key"]) + ": " + json.dumps(entry["game"]))
+					first = False
+			out.write('}, "map": ' + json.dumps({"id-to-name": self.ids_to_names, "name-to-id": self.names_to_ids}) + "}")
+		os.replace(output + ".tmp", output)
+		os.remove(self.path)
+
+# rows which could not be looked up, since they were not in the cache with --offline. They are not journaled, so that
+# --resume tries them again, but are written to a .csv file laid out like the input, so that a finished run still
+# records which rows are missing from its output
+class SkippedRows:
+	def __init__(self, path):
+		self.path = path
+		self.file = None
+		self.writer = None
+		self.count = 0
+		# the rows skipped by an earlier run are tried again by this one
+		if os.path.exists(path):
+			os.remove(path)
+	
+	def write(self, row):
+		if self.file is None:
+			self.file = open(self.path, "w", newline='', encoding='utf-8')
+			self.writer = csv.writer(self.file)
+			self.writer.writerow(["Name", "Series", "Target Value", "Selector"])
+		self.writer.writerow([row["name"], row["series"], row["target_value"], row["selector"]])
+		self.file.flush()
+		self.count = self.count + 1
+	
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+
+def create_games(input, output, workers=1, rawg_rate=0, hltb_rate=0, retries=0, backoff=1., rawg=None, hltb=None, cache=None, incremental=False, resume=False):
+	rawg_service = Service("RAWG", rawg_rate, retries, backoff)
+	hltb_service = Service("Howlongtobeat", hltb_rate, retries, backoff)
+	lookup = Lookup(rawg, hltb, cache, rawg_service, hltb_service)
 	
 	ids_to_names = {
 		"esrb_ratings": {0: "None"},
@@ -51,101 +283,101 @@ def create_games(input, output):
 		"publishers": {"None": 0},
 		"series": {"None": 0}
 	}
-	games_dict = {}
+	previous_games = {}
+	base_hash = None
+	num_reused = 0
 	
-	with open(input, 'r', newline='', encoding='utf-8') as games_file:
-		reader = csv.reader(games_file)
-		next(reader)
-		for row in reader:
-			name = row[0]
-			series = row[1]
-			target_value = int(row[2])
-			selector = int(row[3])
-			results = rawg.search(name)
-			if len(results) == 0:
+	# existing ids are kept as they are, so that models trained on the previous file stay valid
+	if incremental and os.path.exists(output):
+		with profiling.stage("load previous games"):
+			previous_games, ids_to_names, names_to_ids = load_previous_games(output)
+			base_hash = get_file_hash(output)
+	elif incremental:
+		print("No seeded data found at " + output + ", seeding every game")
+	
+	journal = SeedJournal(output + ".journal", ids_to_names, names_to_ids, resume, incremental, base_hash)
+	num_resumed = journal.num_games
+	skipped = SkippedRows(output + ".skipped.csv")
+	if resume:
+		print("Resuming after " + str(len(journal.done)) + " rows from " + journal.path)
+	
+	# rows which are in the journal are still matched, so that incremental mode does not count their games as removed
+	def get_pending_rows():
+		for index, (row, previous_game) in enumerate(match_previous_games(read_rows(input), previous_games)):
+			if not journal.is_done(index, row):
+				yield index, row, previous_game
+	
+	def fetch(pending_row):
+		index, row, previous_game = pending_row
+		if previous_game is not None:
+			return index, row, previous_game, None, None, None
+		try:
+			game_rawg, selector = lookup.rawg(row["name"], row["selector"])
+			if game_rawg is None:
+				return index, row, None, None, None, None
+			return index, row, None, game_rawg, lookup.hltb(row["name"], selector), None
+		except CacheMissError as e:
+			return index, row, None, None, None, e
+	
+	try:
+		for index, row, previous_game, game_rawg, game_hltb, error in ordered_map(fetch, get_pending_rows(), workers):
+			name = row["name"]
+			if previous_game is not None:
+				journal.write(index, row, *reuse_game(journal.keys, ids_to_names, names_to_ids, row, previous_game))
+				num_reused = num_reused + 1
+				profiling.count("games reused")
+				continue
+			if error is not None:
+				print(str(error) + ". Skipping")
+				skipped.write(row)
+				continue
+			if game_rawg is None:
 				print("Could not find entry for \"" + name + "\" on RAWG. Skipping")
+				journal.write(index, row)
 				continue
-			if len(results) < selector:
-				print("a selector of " + selector + " was specified, but there were only " + len(results) + " results. Using first result")
-				selector = 0
-			game_rawg = results[selector]
-			game_rawg.populate()
-			results = HowLongToBeat().search(name)
-			game_hltb = -1
-			if len(results) != 0:
-				game_hltb = results[selector]
-			else:
+			if game_hltb is None:
 				print("Could not find entry for \"" + name + "\" on Howlongtobeat. Entering null value for gameplay time")
-			
-			game_developers = []
-			game_publishers = []
-			game_genres = []
-			game_esrb = 0
-			game_metacritic = -1
-			game_gameplay_main = -1
-			game_gameplay_completionist = -1
-			
-			# RAWG does not always have data for these categories
-			if hasattr(game_rawg, "metacritic"):
-				game_metacritic = game_rawg.metacritic
-			if hasattr(game_rawg, "esrb_rating") and game_rawg.esrb_rating["name"] != "No Rating" and game_rawg.esrb_rating["name"] != "Rating Pending":
-				game_esrb = add_to_dict(ids_to_names, names_to_ids, "esrb_ratings", game_rawg.esrb_rating["name"])
-				
-			for genre in game_rawg.genres:
-				game_genres.append(add_to_dict(ids_to_names, names_to_ids, "genres", genre.name))
-			for developer in game_rawg.developers:
-				game_developers.append(add_to_dict(ids_to_names, names_to_ids, "developers", developer.name))
-			for publisher in game_rawg.publishers:
-				game_publishers.append(add_to_dict(ids_to_names, names_to_ids, "publishers", publisher.name))
-			
-			game_series = add_to_dict(ids_to_names, names_to_ids, "series", series)
-			
-			if game_hltb != -1:
-				if game_hltb.gameplay_main != -1:
-					if game_hltb.gameplay_main_unit != "Hours":
-						game_gameplay_main = 1
-					else:
-						game_gameplay_main = int(game_hltb.gameplay_main.replace("½", ""))
-				if game_hltb.gameplay_completionist != -1:
-					if game_hltb.gameplay_completionist_unit != "Hours":
-						game_gameplay_completionist = 1
-					else:
-						game_gameplay_completionist = int(game_hltb.gameplay_completionist.replace("½", ""))
-			
-			key_name = name
-			if name in games_dict:
-				key_name = name + " " + game_rawg.released[0:4]
-			games_dict[key_name] = {
-				"name": name,
-				"esrb": game_esrb,
-				"description": game_rawg.description_raw,
-				"release_date": game_rawg.released,
-				"metacritic": game_metacritic,
-				"genres": game_genres,
-				"developers": game_developers,
-				"publishers": game_publishers,
-				"series": game_series,
-				"gameplay_main": game_gameplay_main,
-				"gameplay_completionist": game_gameplay_completionist,
-				"target_value": target_value
-			}
+			journal.write(index, row, *add_game(journal.keys, ids_to_names, names_to_ids, row, game_rawg, game_hltb))
+			profiling.count("games looked up")
 			print("Successfully read \"" + name + "\"")
-
-	final_dict = {
-		"games": games_dict,
-		"map": {
-			"id-to-name": ids_to_names,
-			"name-to-id": names_to_ids
-		}
-	}
+	except BaseException:
+		journal.file.close()
+		skipped.close()
+		print("Seeding stopped, " + str(journal.num_games) + " games are saved in " + journal.path + ". Continue with --resume")
+		raise
 	
+	if incremental:
+		num_removed = sum(len(games) for games in previous_games.values())
+		print("Reused " + str(num_reused) + " games, looked up " + str(journal.num_games - num_reused - num_resumed) + " games, removed " + str(num_removed) + " games")
+	if resume:
+		print("Resumed " + str(num_resumed) + " games from the journal")
+	if cache is not None:
+		print(cache.stats())
+	skipped.close()
+	if skipped.count > 0:
+		print("Skipped " + str(skipped.count) + " rows which are not in the cache, they are missing from the output and listed in " + skipped.path + ". Seed again without --offline to add them (with --incremental to keep the games which were found)")
 	print("Finished: writing to disk at " + output)
-	with open(output, "w+", encoding='utf-8') as f:
-		f.write(json.dumps(final_dict))
+	with profiling.stage("write output"):
+		journal.compact(output)
 
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser()
 	parser.add_argument("--input", required=False, help="input .csv file to seed games for", default="raw_data/games.csv")
 	parser.add_argument("--output", required=False, help="name (without extension) of the two files to output", default="seeded_data/data.json")
+	parser.add_argument("--workers", required=False, help="the number of games to look up concurrently", default=4)
+	parser.add_argument("--rawg_rate", required=False, help="maximum requests per second sent to RAWG (0 for no limit)", default=4)
+	parser.add_argument("--hltb_rate", required=False, help="maximum requests per second sent to Howlongtobeat (0 for no limit)", default=2)
+	parser.add_argument("--retries", required=False, help="how many times a failed request is retried", default=3)
+	parser.add_argument("--backoff", required=False, help="seconds to wait before the first retry, doubled for every retry after", default=1.0)
+	parser.add_argument("--incremental", required=False, help="update the existing output file, only looking up games which are not in it yet", action="store_true")
+	parser.add_argument("--resume", required=False, help="continue a run which was interrupted, skipping the rows it already saved to the journal (<output>.journal)", action="store_true")
+	add_cache_arguments(parser)
+	add_profile_arguments(parser)
 	args = parser.parse_args()
-	create_games(args.input, args.output)
\ No newline at end of file
+	start_from_args(args, "seed")
+	cache = get_cache_from_args(args)
+	try:
+		create_games(args.input, args.output, int(args.workers), float(args.rawg_rate), float(args.hltb_rate), int(args.retries), float(args.backoff), cache=cache, incremental=args.incremental, resume=args.resume)
+	except JournalError as e:
+		print("Error: " + str(e))
+		exit(-1)
@@ -0,0 +1,209 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import argparse
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from features import get_sizes
+from inference import get_row_names, get_tags, load_model, predict
+from columnar import load_map
+from title_index import PropertyMatcher
+
+class PendingRequest:
+	def __init__(self, categorical, continuous, tags, description):
+		self.categorical = categorical
+		self.continuous = continuous
+		self.tags = tags
+		self.description = description
+		self.created = time.perf_counter()
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+
+# collects requests from many handler threads and runs them through the model in a single forward pass.
+# A batch is run once it holds max_batch_size requests, or max_wait seconds after its first request arrived.
+class MicroBatcher:
+	def __init__(self, model, sizes, max_batch_size=64, max_wait=0.002, history=10000):
+		self.model = model
+		self.sizes = sizes
+		self.max_batch_size = max_batch_size
+		self.max_wait = max_wait
+		self.queue = queue.Queue()
+		self.latencies = deque(maxlen=history)
+		self.num_requests = 0
+		self.num_batches = 0
+		self.lock = threading.Lock()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def submit(self, categorical, continuous, tags, description=""):
+		request = PendingRequest(categorical, continuous, tags, description)
+		self.queue.put(request)
+		request.done.wait()
+		if request.error is not None:
+			raise request.error
+		return request.result
+
+	def run(self):
+		while True:
+			batch = [self.queue.get()]
+			deadline = time.perf_counter() + self.max_wait
+			while len(batch) < self.max_batch_size:
+				remaining = deadline - time.perf_counter()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self.queue.get(timeout=remaining))
+				except queue.Empty:
+					break
+			try:
+				out = predict(self.model, self.sizes, [request.categorical for request in batch], [request.continuous for request in batch], [request.tags for request in batch], [request.description for request in batch]).reshape(-1)
+				for request, result in zip(batch, out.tolist()):
+					request.result = result
+			except Exception as e:
+				for request in batch:
+					request.error = e
+			now = time.perf_counter()
+			with self.lock:
+				self.num_requests = self.num_requests + len(batch)
+				self.num_batches = self.num_batches + 1
+				for request in batch:
+					self.latencies.append(now - request.created)
+			for request in batch:
+				request.done.set()
+
+	def stats(self):
+		with self.lock:
+			latencies = np.array(self.latencies, dtype=np.float64) * 1000
+			num_requests = self.num_requests
+			num_batches = self.num_batches
+		stats = {
+			"requests": num_requests,
+			"batches": num_batches,
+			"mean_batch_size": num_requests / num_batches if num_batches > 0 else 0,
+			"queue_depth": self.queue.qsize(),
+			"p50_ms": None,
+			"p99_ms": None
+		}
+		if len(latencies) > 0:
+			stats["p50_ms"] = float(np.percentile(latencies, 50))
+			stats["p99_ms"] = float(np.percentile(latencies, 99))
+		return stats
+
+class InvalidGameError(Exception):
+	pass
+
+# same attributes as get_attributes_from_user in inference.py, but errors are returned to the client instead of exiting
+# the genre can be a list of genres (used by the multi_hot model), as can the optional developers and publishers,
+# and the optional description is used by the description model. Like in inference.py, a series, genre or esrb which
+# is not in the map of matcher is replaced by the closest match, which is returned in matches (by field) for the
+# client to see
+def get_attributes_from_request(game, matcher):
+	names_to_ids = matcher.map
+	genres = get_row_names(game, "genre")
+	ids = []
+	matches = {}
+	for field, property in (("series", "series"), ("genre", "genres"), ("esrb", "esrb_ratings")):
+		if field == "genre":
+			name = genres[0] if len(genres) > 0 else "None"
+		else:
+			name = str(game.get(field, "None"))
+		if name not in names_to_ids[property]:
+			match = matcher.match(property, name)
+			if match is None:
+				raise InvalidGameError("could not find \"" + name + "\" in map of \"" + property + "\" to ids")
+			matches[field] = match
+			name = match
+		ids.append(names_to_ids[property][name])
+	try:
+		continuous = [float(game["gameplay"]), float(game["metacritic"]), float(game["release"])]
+	except (KeyError, TypeError, ValueError):
+		raise InvalidGameError("gameplay, metacritic and release must be given as numbers")
+	tags = get_tags(matcher, [genres, get_row_names(game, "developers"), get_row_names(game, "publishers")], True)
+	return ids, continuous, tags, str(game.get("description") or ""), matches
+
+# the default listen backlog of 5 drops connections as soon as a few clients send requests at the same time
+class Server(ThreadingHTTPServer):
+	request_queue_size = 1024
+	daemon_threads = True
+
+def make_handler(batcher, matcher):
+	class Handler(BaseHTTPRequestHandler):
+		def send_json(self, code, body):
+			data = json.dumps(body).encode('utf-8')
+			self.send_response(code)
+			self.send_header("Content-Type", "application/json")
+			self.send_header("Content-Length", str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+
+		def do_GET(self):
+			if self.path == "/stats":
+				self.send_json(200, batcher.stats())
+			else:
+				self.send_json(404, {"error": "unknown path"})
+
+		def do_POST(self):
+			if self.path != "/predict":
+				self.send_json(404, {"error": "unknown path"})
+				return
+			try:
+				game = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+				categorical, continuous, tags, description, matches = get_attributes_from_request(game, matcher)
+			except (ValueError, AttributeError, InvalidGameError) as e:
+				self.send_json(400, {"error": str(e)})
+				return
+			# an error of the model fails every request of its batch, but still answers each of them
+			try:
+				prediction = batcher.submit(categorical, continuous, tags, description)
+			except Exception as e:
+				self.send_json(500, {"error": type(e).__name__ + ": " + str(e)})
+				return
+			body = {"prediction": prediction}
+			if len(matches) > 0:
+				body["matches"] = matches
+			self.send_json(200, body)
+
+		def log_message(self, format, *args):
+			pass
+	return Handler
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input_model", required=False, help="model to use for inference", default="models/model.pt")
+	parser.add_argument("--input_map", required=False, help="name of json file (or columnar directory) which maps ids to categories, vice versa", default="seeded_data/data.json")
+	parser.add_argument("--host", required=False, help="the address to listen on", default="127.0.0.1")
+	parser.add_argument("--port", required=False, help="the port to listen on", default=8000)
+	parser.add_argument("--max_batch_size", required=False, help="the most requests which are run through the model at once", default=64)
+	parser.add_argument("--max_wait_ms", required=False, help="how long a request waits for others to batch with (milliseconds)", default=2)
+	args = parser.parse_args()
+
+	data = load_map(args.input_map)["name-to-id"]
+
+	batcher = MicroBatcher(load_model(args.input_model, data), get_sizes(data), int(args.max_batch_size), float(args.max_wait_ms) / 1000)
+	server = Server((args.host, int(args.port)), make_handler(batcher, PropertyMatcher(data)))
+	print("Serving on http://" + args.host + ":" + str(args.port) + " (POST /predict, GET /stats)")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		server.server_close()
@@ -0,0 +1,226 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Direct solvers for the linear models in model_dataset.py. Every game is one sparse row of a design matrix:
+# a 1 in the column of its series, genre and esrb (or the mean over its genres / developers / publishers for the
+# multi_hot model), its three continuous features and an intercept. Up to DENSE_COLUMNS coefficients, the normal
+# equations X^T W X b = X^T W y are assembled straight from those sparse rows, a chunk of games at a time, and solved
+# exactly; larger models (big maps, or the hashed descriptions) are solved iteratively without ever forming X^T W X.
+# "lstsq" minimizes the squared error; "l1" minimizes the absolute error (the L1Loss used by train.py) by
+# iteratively reweighted least squares. The solution is written back into the layers of a normal model.
+
+import numpy as np
+import torch
+from features import TAG_GROUPS, take_bag
+
+# the dense normal equations take num_columns^2 * 8 bytes and their solve grows with num_columns^3; from about this
+# size on, the iterative solver is faster as well
+DENSE_COLUMNS = 1024
+
+# the categorical blocks of the design matrix, in the order their coefficients are written back to the model
+def get_blocks(model_type, sizes):
+	if model_type == "multi_hot":
+		return [("series", sizes[0]), ("esrb", sizes[2]), ("genres", sizes[1]), ("developers", sizes[3]), ("publishers", sizes[4])]
+	if model_type == "description":
+		return get_blocks("multi_hot", sizes) + [("descriptions", sizes[5])]
+	return [("series", sizes[0]), ("genres", sizes[1]), ("esrb", sizes[2])]
+
+# indices selects the games of the dataset the matrix is made of (all of them by default), so that a fold needs no
+# copy of the dataset
+class DesignMatrix:
+	def __init__(self, dataset, model_type, indices=None):
+		blocks = get_blocks(model_type, dataset.sizes)
+		selected = indices is not None
+		indices = np.asarray(indices, dtype=np.int64) if selected else np.arange(len(dataset))
+		self.num_items = len(indices)
+		offsets = np.cumsum([0] + [size for _, size in blocks])
+		self.num_columns = int(offsets[-1]) + 4
+		self.block_offsets = offsets
+		
+		# continuous features are standardized to keep the normal equations well conditioned
+		continuous = dataset.X_continuous[indices].astype(np.float64)
+		self.mean = continuous.mean(0) if self.num_items > 0 else np.zeros(3)
+		self.std = continuous.std(0) if self.num_items > 0 else np.ones(3)
+		self.std[self.std == 0] = 1
+		continuous = (continuous - self.mean) / self.std
+		
+		rows = []
+		cols = []
+		vals = []
+		items = np.arange(self.num_items)
+		for (name, size), offset in zip(blocks, offsets):
+			if name == "descriptions" or (name in TAG_GROUPS and model_type != "one_hot" and model_type != "embedding"):
+				if name == "descriptions":
+					ids, bag_offsets = dataset.get_description_bag(indices)
+				else:
+					ids, bag_offsets = dataset.X_tags[TAG_GROUPS.index(name)]
+					if selected:
+						ids, bag_offsets = take_bag(ids, bag_offsets, indices)
+				lengths = np.diff(bag_offsets)
+				rows.append(np.repeat(items, lengths))
+				cols.append(ids + offset)
+				vals.append(np.repeat(1. / np.maximum(lengths, 1), lengths))
+			else:
+				rows.append(items)
+				cols.append(dataset.X_categorical[indices, ("series", "genres", "esrb").index(name)].astype(np.int64) + offset)
+				vals.append(np.ones(self.num_items))
+		for i in range(3):
+			rows.append(items)
+			cols.append(np.full(self.num_items, offsets[-1] + i))
+			vals.append(continuous[:, i])
+		rows.append(items)
+		cols.append(np.full(self.num_items, self.num_columns - 1))
+		vals.append(np.ones(self.num_items))
+		
+		# sorted by game, so that the entries of each game are contiguous (CSR layout)
+		rows = np.concatenate(rows)
+		order = np.argsort(rows, kind="stable")
+		self.rows = rows[order]
+		self.cols = np.concatenate(cols)[order]
+		self.vals = np.concatenate(vals)[order]
+		self.row_offsets = np.zeros(self.num_items + 1, dtype=np.int64)
+		np.cumsum(np.bincount(rows, minlength=self.num_items), out=self.row_offsets[1:])
+	
+	def predict(self, coefficients):
+		return np.bincount(self.rows, weights=self.vals * coefficients[self.cols], minlength=self.num_items)
+	
+	# X^T values, for one value per game
+	def transpose_multiply(self, values):
+		return np.bincount(self.cols, weights=self.vals * values[self.rows], minlength=self.num_columns)
+	
+	# X^T W X and X^T W y, built from every pair of entries within each game
+	def normal_equations(self, y, weights, chunk_size=65536):
+		d = self.num_columns
+		A = np.zeros(d * d)
+		b = np.zeros(d)
+		rows = self.rows
+		b += np.bincount(self.cols, weights=self.vals * (weights * y)[rows], minlength=d)
+		for start in range(0, self.num_items, chunk_size):
+			end = min(start + chunk_size, self.num_items)
+			first = self.row_offsets[start]
+			lengths = np.diff(self.row_offsets[start:end + 1])
+			# every entry is paired with every entry of the same game, including itself
+			entries = np.arange(first, self.row_offsets[end])
+			pair_counts = np.repeat(lengths, lengths)
+			left = np.repeat(entries, pair_counts)
+			row_starts = np.repeat(np.repeat(self.row_offsets[start:end], lengths), pair_counts)
+			pair_starts = np.cumsum(pair_counts) - pair_counts
+			right = row_starts + np.arange(len(left)) - np.repeat(pair_starts, pair_counts)
+			values = self.vals[left] * self.vals[right] * weights[rows[left]]
+			A += np.bincount(self.cols[left] * d + self.cols[right], weights=values, minlength=d * d)
+		return A.reshape(d, d), b
+
+	# the one-hot blocks always sum to the intercept, so the system is singular; lstsq returns the minimum norm
+	# solution, which gives categories that never occur in the data a coefficient of 0.
+	# l2 adds a ridge penalty on every coefficient except the intercept, which makes the system regular, so that the
+	# much faster np.linalg.solve can be used instead. start is where the iterative solver starts from
+	def solve(self, y, weights, l2=0., start=None):
+		if self.num_columns > DENSE_COLUMNS:
+			return self.solve_iterative(y, weights, l2, start)
+		A, b = self.normal_equations(y, weights)
+		if l2 > 0:
+			A[np.arange(self.num_columns - 1), np.arange(self.num_columns - 1)] += l2
+			try:
+				return np.linalg.solve(A, b)
+			except np.linalg.LinAlgError:
+				pass
+		return np.linalg.lstsq(A, b, rcond=None)[0]
+	
+	# conjugate gradients on the normal equations, preconditioned with their diagonal, which only needs products with X
+	# and X^T. Started from 0, a category which never occurs keeps a coefficient of 0 like with lstsq; the singular
+	# system is consistent, so the predictions are those of the exact solution once the residual is small
+	def solve_iterative(self, y, weights, l2=0., start=None, max_iterations=2000, tolerance=1e-6):
+		penalty = np.full(self.num_columns, float(l2))
+		penalty[-1] = 0
+		def multiply(coefficients):
+			return self.transpose_multiply(weights * self.predict(coefficients)) + penalty * coefficients
+		b = self.transpose_multiply(weights * y)
+		diagonal = np.bincount(self.cols, weights=self.vals * self.vals * weights[self.rows], minlength=self.num_columns) + penalty
+		inverse = np.divide(1., diagonal, out=np.zeros(self.num_columns), where=diagonal > 0)
+		coefficients = np.zeros(self.num_columns) if start is None else start.copy()
+		residual = b - multiply(coefficients)
+		z = inverse * residual
+		direction = z.copy()
+		rz = residual @ z
+		threshold = tolerance * np.linalg.norm(b)
+		for _ in range(max_iterations):
+			if np.linalg.norm(residual) <= threshold:
+				break
+			product = multiply(direction)
+			curvature = direction @ product
+			if curvature <= 0:
+				break
+			step = rz / curvature
+			coefficients += step * direction
+			residual -= step * product
+			z = inverse * residual
+			next_rz = residual @ z
+			direction = z + (next_rz / rz) * direction
+			rz = next_rz
+		return coefficients
+	
+	def fit(self, y, solver="lstsq", l2=0., iterations=50, epsilon=1e-3, tolerance=1e-6):
+		y = y.astype(np.float64)
+		weights = np.ones(self.num_items)
+		coefficients = self.solve(y, weights, l2)
+		if solver == "l1":
+			previous_loss = np.inf
+			for _ in range(iterations):
+				residuals = np.abs(y - self.predict(coefficients))
+				loss = residuals.mean()
+				if np.isfinite(previous_loss) and previous_loss - loss <= tolerance * max(previous_loss, 1):
+					break
+				previous_loss = loss
+				weights = 1. / np.maximum(residuals, epsilon)
+				coefficients = self.solve(y, weights, l2, coefficients)
+		return coefficients
+	
+	# undoes the standardization, giving one coefficient table per block, the continuous weights and the intercept
+	def unpack(self, coefficients):
+		offsets = self.block_offsets
+		tables = [coefficients[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+		continuous = coefficients[offsets[-1]:offsets[-1] + 3] / self.std
+		intercept = coefficients[-1] - np.sum(continuous * self.mean)
+		return tables, continuous, intercept
+
+# writes the solution into the layers of a model, so that it is saved in the usual state_dict layout:
+# the categorical layers hold the coefficients, and lin adds them up with a weight of 1
+def set_model_weights(model, tables, continuous, intercept):
+	num_categorical = model.lin.weight.shape[1] - 3
+	with torch.no_grad():
+		model.lin.weight.copy_(torch.tensor([[1.] * num_categorical + list(continuous)], dtype=torch.float32))
+		model.lin.bias.fill_(float(intercept))
+		if model.model_type == "one_hot":
+			layers = [(layer.weight, layer.bias) for layer in model.linCategorical]
+			for (weight, bias), table in zip(layers, tables):
+				weight.copy_(torch.tensor(table, dtype=torch.float32).unsqueeze(0))
+				bias.zero_()
+			return
+		if model.model_type == "embedding":
+			embeddings = list(model.embCategorical)
+		else:
+			embeddings = [model.embSeries, model.embEsrb] + list(model.bagTags)
+		for embedding, table in zip(embeddings, tables):
+			embedding.weight.copy_(torch.tensor(table, dtype=torch.float32).unsqueeze(1))
+
+# indices are the games to fit on, all of them by default
+def fit_direct(model, dataset, solver="lstsq", l2=0., indices=None):
+	design = DesignMatrix(dataset, model.model_type, indices)
+	coefficients = design.fit(dataset.Y if indices is None else dataset.Y[indices], solver, l2)
+	set_model_weights(model, *design.unpack(coefficients))
+	return model
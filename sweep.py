@@ -0,0 +1,243 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Hyperparameter sweep with k-fold cross validation. Every combination of hyperparameters (a "trial") is trained
+# once per fold, and each of those runs is a task on a pool of worker processes. The dataset is built once, copied
+# into shared memory, and every worker maps the same arrays instead of receiving its own pickled copy; the folds are
+# derived from the seed in each worker, so a task is only the few numbers which describe it. A fold is never copied out
+# of the shared arrays: its batches are drawn from them by index.
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import torch
+from features import TAG_GROUPS
+from model_dataset import MODEL_TYPES, get_sizes, GameDataset
+from columnar import ColumnarData, is_columnar
+from solver import fit_direct
+from descriptions import DEFAULT_BUCKETS, get_cache_path, get_hashed_descriptions, load_hashed_descriptions
+from train import get_model, get_full_data_set, get_folds, get_fold_data, get_loss, fit
+
+LEADERBOARD_FIELDS = ["rank", "model", "solver", "batch_size", "learning_rate", "epochs", "l2", "mean_loss", "std_loss", "folds", "mean_seconds"]
+
+# the dataset of the worker process, set up by init_worker
+worker_state = {}
+
+def get_dataset_arrays(dataset):
+	arrays = {
+		"categorical": dataset.X_categorical.astype(np.int64),
+		"continuous": dataset.X_continuous,
+		"target": dataset.Y
+	}
+	for group, (ids, offsets) in zip(TAG_GROUPS, dataset.X_tags):
+		arrays[group + "_ids"] = ids
+		arrays[group + "_offsets"] = offsets
+	if dataset.description_rows is not None:
+		arrays["description_rows"] = dataset.description_rows
+	return arrays
+
+# copies each array into a block of shared memory; the returned specs are all a process needs to map them again
+def share_arrays(arrays):
+	blocks = []
+	specs = {}
+	for name, array in arrays.items():
+		block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+		np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+		blocks.append(block)
+		specs[name] = (block.name, array.shape, array.dtype.str)
+	return blocks, specs
+
+def attach_arrays(specs):
+	blocks = []
+	arrays = {}
+	for name, (block_name, shape, dtype) in specs.items():
+		block = shared_memory.SharedMemory(name=block_name)
+		blocks.append(block)
+		arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+	return blocks, arrays
+
+# the hashed descriptions are already a memory mapped file, which every worker maps on its own
+def make_dataset(arrays, sizes, model_type, description_path=None):
+	X_tags = [(arrays[group + "_ids"], arrays[group + "_offsets"]) for group in TAG_GROUPS]
+	descriptions = load_hashed_descriptions(description_path) if description_path is not None else None
+	return GameDataset.from_arrays(arrays["categorical"], arrays["continuous"], arrays["target"], X_tags, sizes, model_type, descriptions, arrays.get("description_rows"))
+
+def init_worker(specs, sizes, model_type, num_folds, seed, threads, description_path=None):
+	torch.set_num_threads(threads)
+	blocks, arrays = attach_arrays(specs)
+	# the blocks have to stay open for as long as the arrays are used
+	worker_state["blocks"] = blocks
+	set_worker_dataset(make_dataset(arrays, sizes, model_type, description_path), num_folds, seed)
+
+def set_worker_dataset(dataset, num_folds, seed):
+	worker_state["dataset"] = dataset
+	worker_state["folds"] = get_folds(len(dataset), num_folds, seed)
+	worker_state["seed"] = seed
+
+def run_trial(trial, params, fold):
+	dataset = worker_state["dataset"]
+	train_indices, valid_indices = worker_state["folds"][fold]
+	torch.manual_seed(worker_state["seed"] + trial * len(worker_state["folds"]) + fold)
+	# the batches are taken from the shared arrays by the fold's indices, without copying the fold
+	train_dl, valid_dl = get_fold_data(dataset, train_indices, valid_indices, params["batch_size"] or 32, 1024)
+	model, opt = get_model(dataset.sizes, params["learning_rate"] or 0., dataset.model_type)
+	start = time.perf_counter()
+	if params["solver"] == "sgd":
+		fit(fold, params["epochs"], model, torch.nn.L1Loss(), opt, train_dl, valid_dl, verbose=False)
+	else:
+		fit_direct(model, dataset, params["solver"], params["l2"], train_indices)
+	seconds = time.perf_counter() - start
+	return trial, fold, float(get_loss(model, torch.nn.L1Loss(), valid_dl)), seconds
+
+def parse_list(value, type):
+	return [type(item) for item in str(value).split(",") if item.strip() != ""]
+
+# the direct solvers ignore the batch size, learning rate and epochs, and sgd ignores l2,
+# so those are left out (None) instead of repeating the same trial for each of their values
+def get_trials(solvers, batch_sizes, learning_rates, epochs, l2s):
+	trials = []
+	for solver in solvers:
+		if solver == "sgd":
+			for batch_size, learning_rate, num_epochs in itertools.product(batch_sizes, learning_rates, epochs):
+				trials.append({"solver": solver, "batch_size": batch_size, "learning_rate": learning_rate, "epochs": num_epochs, "l2": None})
+		else:
+			for l2 in l2s:
+				trials.append({"solver": solver, "batch_size": None, "learning_rate": None, "epochs": None, "l2": l2})
+	return trials
+
+def get_leaderboard(trials, results, model_type):
+	rows = []
+	for trial, params in enumerate(trials):
+		losses = [loss for _, loss, _ in results[trial]]
+		seconds = [elapsed for _, _, elapsed in results[trial]]
+		row = {"model": model_type}
+		row.update(params)
+		row.update({"mean_loss": np.mean(losses), "std_loss": np.std(losses), "folds": len(losses), "mean_seconds": np.mean(seconds)})
+		rows.append(row)
+	rows.sort(key=lambda row: row["mean_loss"])
+	for rank, row in enumerate(rows):
+		row["rank"] = rank + 1
+	return rows
+
+def write_leaderboard(path, rows):
+	directory = os.path.dirname(path)
+	if directory != "" and not os.path.exists(directory):
+		os.makedirs(directory)
+	with open(path, "w", encoding='utf-8', newline='') as f:
+		writer = csv.DictWriter(f, fieldnames=LEADERBOARD_FIELDS)
+		writer.writeheader()
+		for row in rows:
+			writer.writerow({field: "" if row[field] is None else row[field] for field in LEADERBOARD_FIELDS})
+
+def sweep(dataset, trials, num_folds, workers, threads, seed=0, description_path=None):
+	tasks = [(trial, fold) for trial in range(len(trials)) for fold in range(num_folds)]
+	results = {trial: [] for trial in range(len(trials))}
+
+	def record(trial, fold, loss, seconds):
+		results[trial].append((fold, loss, seconds))
+		print("[" + str(sum(len(result) for result in results.values())) + "/" + str(len(tasks)) + "] trial " + str(trial) + " " + json.dumps(trials[trial]) + " fold " + str(fold) + ": " + str(loss))
+
+	if workers <= 1:
+		torch.set_num_threads(threads)
+		set_worker_dataset(dataset, num_folds, seed)
+		for trial, fold in tasks:
+			record(*run_trial(trial, trials[trial], fold))
+		return results
+
+	blocks, specs = share_arrays(get_dataset_arrays(dataset))
+	try:
+		# spawned workers start from a clean interpreter instead of a fork of this one, whose torch thread pools
+		# are not safe to fork
+		context = multiprocessing.get_context("spawn")
+		with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(specs, dataset.sizes, dataset.model_type, num_folds, seed, threads, description_path)) as executor:
+			futures = [executor.submit(run_trial, trial, trials[trial], fold) for trial, fold in tasks]
+			for future in as_completed(futures):
+				record(*future.result())
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+	return results
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input", required=False, help="name of the game data file (or columnar directory) to use for training", default="seeded_data/data.json")
+	parser.add_argument("--leaderboard", required=False, help="csv file to write the trials to, best first", default="models/leaderboard.csv")
+	parser.add_argument("--model", required=False, help="the model type to train (see train.py)", choices=list(MODEL_TYPES), default="one_hot")
+	parser.add_argument("--description_buckets", required=False, help="number of hash buckets the words of the descriptions are hashed into (description model)", default=DEFAULT_BUCKETS)
+	parser.add_argument("--folds", required=False, help="number of cross validation folds each trial is trained on", default=5)
+	parser.add_argument("--search", required=False, help="grid tries every combination, random only --trials of them", choices=["grid", "random"], default="grid")
+	parser.add_argument("--trials", required=False, help="number of combinations tried by a random search", default=20)
+	parser.add_argument("--solver", required=False, help="comma separated solvers to try: sgd, lstsq, l1", default="sgd")
+	parser.add_argument("--batch_size", required=False, help="comma separated batch sizes to try (sgd)", default="16,32,64")
+	parser.add_argument("--learning_rate", required=False, help="comma separated learning rates to try (sgd)", default="0.000001,0.00001")
+	parser.add_argument("--epochs", required=False, help="comma separated numbers of epochs to try (sgd)", default="100,1000")
+	parser.add_argument("--l2", required=False, help="comma separated ridge penalties to try (lstsq and l1)", default="0,1,10")
+	parser.add_argument("--workers", required=False, help="number of trials trained at once, in separate processes", default=os.cpu_count() or 1)
+	parser.add_argument("--threads", required=False, help="torch threads per worker (default: the cores divided among the workers)", default=0)
+	parser.add_argument("--seed", required=False, help="seed for the folds, the random search and the models", default=0)
+	args = parser.parse_args()
+
+	for solver in parse_list(args.solver, str):
+		if solver not in ("sgd", "lstsq", "l1"):
+			print("Error: unknown solver \"" + solver + "\"")
+			exit(-1)
+	seed = int(args.seed)
+	trials = get_trials(parse_list(args.solver, str), parse_list(args.batch_size, int), parse_list(args.learning_rate, float), parse_list(args.epochs, int), parse_list(args.l2, float))
+	if args.search == "random" and int(args.trials) < len(trials):
+		trials = random.Random(seed).sample(trials, int(args.trials))
+
+	if is_columnar(args.input):
+		games_json = ColumnarData(args.input)
+		map_json = games_json.map["id-to-name"]
+	else:
+		with open(args.input, "r", encoding='utf-8') as f:
+			data_file = json.loads(f.read())
+			games_json = data_file["games"]
+			map_json = data_file["map"]["id-to-name"]
+	sizes = get_sizes(map_json)
+	descriptions = None
+	description_path = None
+	if args.model == "description":
+		descriptions = get_hashed_descriptions(args.input, games_json, int(args.description_buckets))
+		description_path = get_cache_path(args.input, int(args.description_buckets))
+		sizes = sizes + (int(args.description_buckets),)
+	dataset = get_full_data_set(games_json, sizes, args.model, descriptions)
+	num_folds = int(args.folds)
+	if num_folds < 2 or num_folds > len(dataset):
+		print("Error: --folds must be between 2 and the number of games (" + str(len(dataset)) + ")")
+		exit(-1)
+
+	workers = max(1, min(int(args.workers), len(trials) * num_folds))
+	threads = int(args.threads) if int(args.threads) > 0 else max(1, (os.cpu_count() or 1) // workers)
+	print(str(len(trials)) + " trials x " + str(num_folds) + " folds on " + str(len(dataset)) + " games, " + str(workers) + " workers with " + str(threads) + " threads each")
+	start = time.perf_counter()
+	results = sweep(dataset, trials, num_folds, workers, threads, seed, description_path)
+	rows = get_leaderboard(trials, results, args.model)
+	write_leaderboard(args.leaderboard, rows)
+	print("Finished in " + str(time.perf_counter() - start) + "s, leaderboard written to " + args.leaderboard)
+	for row in rows[0:5]:
+		print(str(row["rank"]) + ". " + json.dumps({field: row[field] for field in LEADERBOARD_FIELDS[1:]}))
@@ -0,0 +1,80 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# scoring a batch of games with inference.run_batch, and scoring its output again
+
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from columnar import load_map
+from inference import read_batch_rows, run_batch
+from numpy_model import NumpyModel
+
+class RunBatchTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.map = load_map("seeded_data/example_data.json")["name-to-id"]
+		tables = {"model_type": np.array("multi_hot"), "continuous": np.array([1, 0.1, 0], dtype=np.float32), "bias": np.zeros(1, dtype=np.float32)}
+		tables["series"] = np.zeros(len(self.map["series"]), dtype=np.float32)
+		tables["esrb"] = np.zeros(len(self.map["esrb_ratings"]), dtype=np.float32)
+		for group in ("genres", "developers", "publishers"):
+			tables[group + "_bag"] = np.arange(len(self.map[group]), dtype=np.float32)
+		self.model = NumpyModel(tables)
+		self.rows = [
+			{"series": "None", "genre": ["Racing", "RPG"], "gameplay": 10, "metacritic": 80, "release": 2010},
+			{"series": "None", "genre": ["RPG"], "developers": [list(self.map["developers"])[1]], "gameplay": 5, "metacritic": 60, "release": 2000, "note": "later field"},
+			{"series": "None", "gameplay": "", "metacritic": 60, "release": 2000},
+			{"series": "None", "genre": "Racing|Adventure", "gameplay": 20, "metacritic": 90, "release": 2020}
+		]
+		self.input = os.path.join(self.directory.name, "games.jsonl")
+		with open(self.input, "w", encoding='utf-8') as f:
+			for row in self.rows:
+				f.write(json.dumps(row) + "\n")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def run_batch(self, input, output):
+		with contextlib.redirect_stdout(io.StringIO()):
+			run_batch(self.model, self.map, input, output, 2)
+		return list(read_batch_rows(output))
+
+	def test_csv_output(self):
+		rows = self.run_batch(self.input, os.path.join(self.directory.name, "predictions.csv"))
+		self.assertEqual(len(rows), 3)
+		with open(os.path.join(self.directory.name, "predictions.csv"), "r", newline='', encoding='utf-8') as f:
+			self.assertEqual(next(csv.reader(f)), ["series", "genre", "gameplay", "metacritic", "release", "developers", "note", "prediction"])
+		self.assertEqual(rows[0]["genre"], "Racing|RPG")
+		self.assertEqual(rows[1]["note"], "later field")
+		# the output is a valid input, and is scored the same
+		again = self.run_batch(os.path.join(self.directory.name, "predictions.csv"), os.path.join(self.directory.name, "again.csv"))
+		self.assertEqual([row["prediction"] for row in again], [row["prediction"] for row in rows])
+
+	def test_jsonl_output(self):
+		rows = self.run_batch(self.input, os.path.join(self.directory.name, "predictions.jsonl"))
+		self.assertEqual([{field: value for field, value in row.items() if field != "prediction"} for row in rows], [self.rows[0], self.rows[1], self.rows[3]])
+		csv_rows = self.run_batch(self.input, os.path.join(self.directory.name, "predictions.csv"))
+		self.assertEqual(["%.4f" % row["prediction"] for row in rows], [row["prediction"] for row in csv_rows])
+
+if __name__ == '__main__':
+	unittest.main()
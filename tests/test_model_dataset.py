@@ -0,0 +1,77 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# loading one-hot models saved before and after their categorical layers were registered
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import torch
+from columnar import load_map
+from model_dataset import TrainingModel, get_sizes, load_model
+
+class LoadModelTest(unittest.TestCase):
+	def setUp(self):
+		self.sizes = get_sizes(load_map("seeded_data/example_data.json")["name-to-id"])
+
+	def test_legacy_one_hot(self):
+		output = io.StringIO()
+		with contextlib.redirect_stdout(output):
+			model = load_model("models/example_model.pt", self.sizes)
+		self.assertIn("left untrained", output.getvalue())
+		self.assertTrue(model.legacy)
+		self.assertTrue(torch.equal(model.lin.weight, torch.load("models/example_model.pt")["lin.weight"]))
+
+	def test_one_hot(self):
+		model = TrainingModel(self.sizes)
+		# the categorical layers are trained along with lin
+		self.assertEqual(len(list(model.parameters())), 8)
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "model.pt")
+			torch.save(model.state_dict(), path)
+			output = io.StringIO()
+			with contextlib.redirect_stdout(output):
+				loaded = load_model(path, self.sizes)
+		self.assertEqual(output.getvalue(), "")
+		self.assertFalse(loaded.legacy)
+		for key, value in model.state_dict().items():
+			self.assertTrue(torch.equal(loaded.state_dict()[key], value), key)
+
+	def test_partial_one_hot(self):
+		state_dict = TrainingModel(self.sizes).state_dict()
+		del state_dict["linCategorical.1.weight"]
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "model.pt")
+			torch.save(state_dict, path)
+			with self.assertRaises(RuntimeError):
+				load_model(path, self.sizes)
+
+	# the random layers of a legacy model would end up in the converted one
+	def test_convert_legacy(self):
+		with tempfile.TemporaryDirectory() as directory:
+			result = subprocess.run([sys.executable, "convert_model.py", "--input_model", "models/example_model.pt", "--input_map", "seeded_data/example_data.json", "--to", "numpy", "--output", os.path.join(directory, "model.npz")], capture_output=True, text=True)
+			self.assertNotEqual(result.returncode, 0)
+			self.assertIn("can not be converted", result.stdout)
+			self.assertFalse(os.path.exists(os.path.join(directory, "model.npz")))
+
+if __name__ == '__main__':
+	unittest.main()
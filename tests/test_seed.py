@@ -0,0 +1,145 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# seed.create_games against the stub RAWG / Howlongtobeat server of benchmarks.stubs, which answers every search with
+# two results. Run from the base directory with python -m unittest (or pytest)
+
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import seed
+from cache import ResponseCache
+from benchmarks.stubs import NUM_RESULTS, StubHltb, StubRawg, start_stub_server
+from benchmarks.synthetic import SyntheticVocabulary
+
+NUM_ROWS = 60
+
+# fails every search after the first limit ones, like a run which is killed
+class FailingRawg(StubRawg):
+	def __init__(self, url, limit):
+		super().__init__(url)
+		self.limit = limit
+		self.searches = 0
+
+	def search(self, name):
+		self.searches = self.searches + 1
+		if self.searches > self.limit:
+			raise RuntimeError("killed")
+		return super().search(name)
+
+class SeedTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.vocabulary = SyntheticVocabulary(num_series=50, num_developers=50, num_publishers=20, num_words=200)
+		cls.server = start_stub_server(cls.vocabulary, latency=0.002)
+		cls.url = "http://127.0.0.1:" + str(cls.server.server_port)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		cls.server.server_close()
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.input = os.path.join(self.directory.name, "games.csv")
+		# selectors of 0 to NUM_RESULTS, the last of which is one past the results and falls back to the first
+		with open(self.input, "w", newline='', encoding='utf-8') as f:
+			writer = csv.writer(f)
+			writer.writerow(["Name", "Series", "Target Value", "Selector"])
+			for i, (row, rawg) in enumerate(self.vocabulary.make_games(NUM_ROWS)):
+				writer.writerow([row["name"], row["series"], row["target_value"], i % (NUM_RESULTS + 1)])
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def seed(self, name, workers, input=None, rawg=None, incremental=False, resume=False, cache=None):
+		output = os.path.join(self.directory.name, name)
+		with contextlib.redirect_stdout(io.StringIO()):
+			seed.create_games(input or self.input, output, workers=workers, rawg=rawg or StubRawg(self.url), hltb=StubHltb(self.url), cache=cache, incremental=incremental, resume=resume)
+		with open(output, "r", encoding='utf-8') as f:
+			return f.read()
+
+	# the first num_rows rows of the input
+	def write_rows(self, name, num_rows):
+		path = os.path.join(self.directory.name, name)
+		with open(self.input, "r", encoding='utf-8') as f:
+			lines = f.readlines()[0:num_rows + 1]
+		with open(path, "w", encoding='utf-8') as f:
+			f.writelines(lines)
+		return path
+
+	def test_concurrent_is_sequential(self):
+		sequential = self.seed("sequential.json", 1)
+		self.assertEqual(self.seed("concurrent.json", 8), sequential)
+
+	def test_selector_past_results(self):
+		games = json.loads(self.seed("data.json", 4))["games"]
+		self.assertEqual(len(games), NUM_ROWS)
+		self.assertEqual(sum(game["selector"] == NUM_RESULTS for game in games.values()), NUM_ROWS // (NUM_RESULTS + 1))
+
+	def test_resume(self):
+		expected = self.seed("expected.json", 1)
+		with self.assertRaises(RuntimeError):
+			self.seed("data.json", 1, rawg=FailingRawg(self.url, 20))
+		# the journal holds ids of a map built from scratch, not ones continuing an existing file
+		with self.assertRaises(seed.JournalError):
+			self.seed("data.json", 1, incremental=True, resume=True)
+		self.assertEqual(self.seed("data.json", 4, resume=True), expected)
+
+	def test_resume_incremental(self):
+		base = self.write_rows("base.csv", NUM_ROWS // 2)
+		self.seed("expected.json", 1, input=base)
+		shutil.copy(os.path.join(self.directory.name, "expected.json"), os.path.join(self.directory.name, "data.json"))
+		expected = self.seed("expected.json", 1, incremental=True)
+		with self.assertRaises(RuntimeError):
+			self.seed("data.json", 1, rawg=FailingRawg(self.url, 10), incremental=True)
+		# the reused games in the journal have ids of the map of the previous file
+		with self.assertRaises(seed.JournalError):
+			self.seed("data.json", 1, resume=True)
+		self.assertEqual(self.seed("data.json", 4, incremental=True, resume=True), expected)
+
+	def test_resume_changed_base(self):
+		base = self.write_rows("base.csv", NUM_ROWS // 2)
+		self.seed("data.json", 1, input=base)
+		with self.assertRaises(RuntimeError):
+			self.seed("data.json", 1, rawg=FailingRawg(self.url, 10), incremental=True)
+		self.seed("other.json", 1, input=self.write_rows("other.csv", NUM_ROWS // 3))
+		shutil.copy(os.path.join(self.directory.name, "other.json"), os.path.join(self.directory.name, "data.json"))
+		with self.assertRaises(seed.JournalError):
+			self.seed("data.json", 1, incremental=True, resume=True)
+
+	def test_offline_skipped(self):
+		path = os.path.join(self.directory.name, "cache.sqlite")
+		self.seed("data.json", 1, input=self.write_rows("base.csv", NUM_ROWS // 3), cache=ResponseCache(path))
+		output = json.loads(self.seed("data.json", 4, cache=ResponseCache(path, offline=True)))
+		with open(self.input, "r", newline='', encoding='utf-8') as f:
+			rows = list(csv.reader(f))
+		self.assertEqual(sorted(game["name"] for game in output["games"].values()), sorted(row[0] for row in rows[1:NUM_ROWS // 3 + 1]))
+		with open(os.path.join(self.directory.name, "data.json.skipped.csv"), "r", newline='', encoding='utf-8') as f:
+			self.assertEqual(list(csv.reader(f)), rows[0:1] + rows[NUM_ROWS // 3 + 1:])
+		# found online, and nothing is skipped any more
+		self.seed("data.json", 1, incremental=True, cache=ResponseCache(path))
+		self.assertFalse(os.path.exists(os.path.join(self.directory.name, "data.json.skipped.csv")))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,77 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# requests to serve.py, answered by a model of numpy tables
+
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+import numpy as np
+from columnar import load_map
+from features import get_sizes
+from numpy_model import NumpyModel
+from serve import MicroBatcher, Server, make_handler
+from title_index import PropertyMatcher
+
+class FailingModel(NumpyModel):
+	def predict(self, categorical, continuous, tags=None, descriptions=None):
+		raise RuntimeError("broken model")
+
+class ServeTest(unittest.TestCase):
+	def setUp(self):
+		self.map = load_map("seeded_data/example_data.json")["name-to-id"]
+		tables = {"model_type": np.array("embedding"), "continuous": np.array([1, 0, 0], dtype=np.float32), "bias": np.zeros(1, dtype=np.float32)}
+		for name, group in (("series", "series"), ("genres", "genres"), ("esrb", "esrb_ratings")):
+			tables[name] = np.zeros(len(self.map[group]), dtype=np.float32)
+		self.tables = tables
+
+	def start(self, model):
+		server = Server(("127.0.0.1", 0), make_handler(MicroBatcher(model, get_sizes(self.map)), PropertyMatcher(self.map)))
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		self.addCleanup(server.server_close)
+		self.addCleanup(server.shutdown)
+		return "http://127.0.0.1:" + str(server.server_port) + "/predict"
+
+	# the status and body of the answer
+	def post(self, url, game):
+		request = urllib.request.Request(url, data=json.dumps(game).encode('utf-8'), method="POST")
+		try:
+			with urllib.request.urlopen(request) as response:
+				return response.status, json.loads(response.read())
+		except urllib.error.HTTPError as e:
+			return e.code, json.loads(e.read())
+
+	def test_closest_match(self):
+		url = self.start(NumpyModel(self.tables))
+		game = {"series": "None", "genre": "Racng", "esrb": "None", "gameplay": 10, "metacritic": 90, "release": 2030}
+		self.assertEqual(self.post(url, game), (200, {"prediction": 10, "matches": {"genre": "Racing"}}))
+		game["genre"] = "Racing"
+		self.assertEqual(self.post(url, game), (200, {"prediction": 10}))
+		game["genre"] = "Qqqqqqqq"
+		self.assertEqual(self.post(url, game)[0], 400)
+
+	def test_model_error(self):
+		url = self.start(FailingModel(self.tables))
+		status, body = self.post(url, {"series": "None", "genre": "Racing", "esrb": "None", "gameplay": 10, "metacritic": 90, "release": 2030})
+		self.assertEqual(status, 500)
+		self.assertIn("broken model", body["error"])
+
+if __name__ == '__main__':
+	unittest.main()
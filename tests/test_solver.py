@@ -0,0 +1,77 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# the iterative solver used for large models against the dense normal equations, on the example data
+
+import json
+import unittest
+import numpy as np
+import solver
+from features import take_bag
+from model_dataset import GameDataset, get_sizes
+from train import get_full_data_set
+
+class SolverTest(unittest.TestCase):
+	def setUp(self):
+		with open("seeded_data/example_data.json", "r", encoding='utf-8') as f:
+			data = json.loads(f.read())
+		self.sizes = get_sizes(data["map"]["id-to-name"])
+		self.games = data["games"]
+
+	def fit(self, model_type, method, l2, dense_columns):
+		dataset = get_full_data_set(self.games, self.sizes, model_type)
+		design = solver.DesignMatrix(dataset, model_type)
+		previous = solver.DENSE_COLUMNS
+		solver.DENSE_COLUMNS = dense_columns
+		try:
+			return design, design.fit(dataset.Y, method, l2)
+		finally:
+			solver.DENSE_COLUMNS = previous
+
+	def test_iterative_is_dense(self):
+		for model_type in ("one_hot", "multi_hot"):
+			for method, l2 in (("lstsq", 0.), ("lstsq", 1.), ("l1", 1.)):
+				design, dense = self.fit(model_type, method, l2, 10 ** 9)
+				_, iterative = self.fit(model_type, method, l2, 0)
+				if method == "lstsq":
+					np.testing.assert_allclose(design.predict(iterative), design.predict(dense), atol=1e-3, err_msg=model_type)
+				else:
+					# the l1 solution is not unique, only its loss is
+					y = get_full_data_set(self.games, self.sizes, model_type).Y
+					self.assertAlmostEqual(np.abs(design.predict(iterative) - y).mean(), np.abs(design.predict(dense) - y).mean(), delta=0.01)
+
+	def test_unused_categories(self):
+		# series which no game of the example data has keep a coefficient of 0, as with lstsq
+		design, coefficients = self.fit("one_hot", "lstsq", 0., 0)
+		used = np.zeros(design.num_columns, dtype=bool)
+		used[design.cols] = True
+		self.assertTrue(np.all(coefficients[~used] == 0))
+
+	# the matrix of the games at some indices, as used for a cross validation fold, is that of a copy of those games
+	def test_indices(self):
+		for model_type in ("one_hot", "multi_hot"):
+			dataset = get_full_data_set(self.games, self.sizes, model_type)
+			indices = np.random.default_rng(0).permutation(len(dataset))[0:len(dataset) // 2]
+			copy = GameDataset.from_arrays(dataset.X_categorical[indices], dataset.X_continuous[indices], dataset.Y[indices], [take_bag(ids, offsets, indices) for ids, offsets in dataset.X_tags], self.sizes, model_type)
+			selected = solver.DesignMatrix(dataset, model_type, indices)
+			copied = solver.DesignMatrix(copy, model_type)
+			for name in ("rows", "cols", "vals", "row_offsets"):
+				np.testing.assert_array_equal(getattr(selected, name), getattr(copied, name), err_msg=model_type + " " + name)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,89 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# the title index of a seeded file, which is saved next to it by the first lookup and loaded by the ones after it
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from columnar import export_columnar
+from title_index import GameIndex, PropertyMatcher, TitleIndex, get_index_path
+
+class GameIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "data.json")
+		shutil.copy("seeded_data/example_data.json", self.path)
+		with open(self.path, "r", encoding='utf-8') as f:
+			self.names = [game["name"] for game in json.loads(f.read())["games"].values()]
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	# the names found for every title, for a misspelled one, and for one which is not in the file
+	def find_all(self, index):
+		queries = self.names + [self.names[0][1:], "Not A Game At All"]
+		return [(game or {}).get("name") for game in (index.find(name, threshold=0.5) for name in queries)]
+
+	def check_saved(self, path):
+		built = GameIndex(path)
+		self.assertTrue(os.path.exists(os.path.join(get_index_path(path), "meta.json")))
+		loaded = GameIndex(path)
+		self.assertNotIsInstance(loaded.index.names, list)
+		self.assertEqual(self.find_all(loaded), self.find_all(built))
+		self.assertEqual(self.find_all(loaded)[0:len(self.names)], self.names)
+
+	def test_json(self):
+		self.check_saved(self.path)
+
+	def test_columnar(self):
+		with open(self.path, "r", encoding='utf-8') as f:
+			export_columnar(json.loads(f.read()), os.path.join(self.directory.name, "columnar"))
+		self.check_saved(os.path.join(self.directory.name, "columnar"))
+
+	def test_rebuilt_when_changed(self):
+		GameIndex(self.path)
+		with open(self.path, "r", encoding='utf-8') as f:
+			data = json.loads(f.read())
+		key = next(iter(data["games"]))
+		data["games"][key]["name"] = "Renamed Game"
+		with open(self.path, "w", encoding='utf-8') as f:
+			f.write(json.dumps(data))
+		self.assertEqual(GameIndex(self.path).find("renamed game")["name"], "Renamed Game")
+
+class TitleIndexTest(unittest.TestCase):
+	# every title written only in non-latin script normalizes to ""
+	def test_empty_normalized(self):
+		index = TitleIndex(["ポケモン", "Pokémon", "!!!"])
+		self.assertEqual(index.find("ドラゴンクエスト"), [])
+		self.assertEqual(index.find(""), [])
+		self.assertIsNone(index.match("ドラゴンクエスト", 0.))
+		self.assertEqual(index.find("pokemon"), [1])
+
+class PropertyMatcherTest(unittest.TestCase):
+	def test_own_map(self):
+		self.assertEqual(PropertyMatcher({"genres": {"None": 0, "Racing": 1}}).match("genres", "Racng"), "Racing")
+		# a matcher of a new map never uses the indices of an earlier one, whatever ids the maps get
+		for _ in range(3):
+			self.assertEqual(PropertyMatcher({"genres": {"None": 0, "Racers": 1}}).match("genres", "Racng"), None)
+			self.assertEqual(PropertyMatcher({"genres": {"None": 0, "Racing Game": 1}}).match("genres", "Racing Gam"), "Racing Game")
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,274 @@
+"""
+DeepGameInference
+Copyright (C) 2021 Daniel Fuerlinger
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# In memory lookup of game titles and of the names in the map, so that inference.py can resolve a game which is
+# already in the seeded data without asking RAWG or Howlongtobeat, and can tell what a misspelled series, genre or
+# esrb rating was meant to be. Titles are normalized (lowercase, no accents or punctuation) and split into trigrams
+# of letters and digits; the index stores, for every trigram, the titles which contain it (as flat arrays with
+# offsets, like make_bag), and a title is matched by counting the trigrams it shares with the query.
+# The index of the games of a seeded file is built once and saved next to it (or inside a columnar directory), and
+# later runs memory map it instead of building it again.
+
+import json
+import mmap
+import os
+import re
+import unicodedata
+import zlib
+import numpy as np
+from columnar import ColumnarData, is_columnar, load_seeded
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+# marks the end of a title in the concatenated text the trigrams are taken from
+SEPARATOR = len(ALPHABET)
+BASE = len(ALPHABET) + 1
+NUM_TRIGRAMS = BASE ** 3
+CODES = np.full(128, ALPHABET.index(" "), dtype=np.int32)
+CODES[np.frombuffer(ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(len(ALPHABET))
+CODES[ord("|")] = SEPARATOR
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+NUMBER = re.compile(r"[0-9]+")
+# the arrays of a TitleIndex which are saved as .npy files
+ARRAYS = ("titles", "offsets", "num_trigrams", "hash_order", "hashes")
+
+# "The Legend of Zelda: Breath of the Wild" -> "the legend of zelda breath of the wild", "Pokémon" -> "pokemon"
+def normalize(name):
+	decomposed = unicodedata.normalize("NFKD", str(name).lower())
+	ascii = decomposed.encode("ascii", "ignore").decode("ascii")
+	return NON_ALPHANUMERIC.sub(" ", ascii).strip()
+
+# the (title, trigram) pairs of normalized titles, each title padded with a space on both sides
+def get_trigrams(normalized):
+	text = "|".join(" " + name + " " for name in normalized) + "|"
+	codes = CODES[np.frombuffer(text.encode('ascii'), dtype=np.uint8)]
+	trigrams = codes[:-2] * BASE * BASE + codes[1:-1] * BASE + codes[2:]
+	lengths = np.array([len(name) + 3 for name in normalized], dtype=np.int64)
+	titles = np.repeat(np.arange(len(normalized), dtype=np.int32), lengths)[0:len(trigrams)]
+	valid = (codes[:-2] != SEPARATOR) & (codes[1:-1] != SEPARATOR) & (codes[2:] != SEPARATOR)
+	return titles[valid], trigrams[valid]
+
+# the distinct values of a sorted array and how often each occurs (np.unique, without sorting again)
+def count_sorted(values):
+	starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]])) if len(values) > 0 else np.zeros(0, dtype=np.int64)
+	return values[starts], np.diff(np.append(starts, len(values)))
+
+# titles are compared by the Dice similarity of their trigrams: 1 for the same normalized title, 0 for no trigram
+# in common
+class TitleIndex:
+	def __init__(self, names):
+		self.names = [normalize(name) for name in names]
+		titles, trigrams = get_trigrams(self.names)
+		# sorted by trigram, then by title, and every trigram counts once per title
+		pairs = count_sorted(np.sort(trigrams.astype(np.int64) * len(self.names) + titles))[0]
+		titles = pairs % max(len(self.names), 1)
+		trigrams = pairs // max(len(self.names), 1)
+		self.titles = titles.astype(np.int32)
+		self.offsets = np.zeros(NUM_TRIGRAMS + 1, dtype=np.int64)
+		np.cumsum(np.bincount(trigrams, minlength=NUM_TRIGRAMS), out=self.offsets[1:])
+		self.num_trigrams = np.bincount(titles, minlength=len(self.names)).astype(np.int32)
+		# exact lookups binary search the sorted hashes of the normalized titles instead
+		hashes = np.fromiter((zlib.crc32(name.encode('ascii')) for name in self.names), dtype=np.uint32, count=len(self.names))
+		self.hash_order = np.argsort(hashes, kind="stable").astype(np.int32)
+		self.hashes = hashes[self.hash_order]
+
+	def __len__(self):
+		return len(self.names)
+
+	def save(self, path):
+		if not os.path.exists(path):
+			os.makedirs(path)
+		for name in ARRAYS:
+			np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+		offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+		with open(os.path.join(path, "names.bin"), "wb") as f:
+			for i, name in enumerate(self.names):
+				encoded = name.encode('ascii')
+				f.write(encoded)
+				offsets[i + 1] = offsets[i] + len(encoded)
+		np.save(os.path.join(path, "names_offsets.npy"), offsets)
+
+	@staticmethod
+	def load(path):
+		index = TitleIndex.__new__(TitleIndex)
+		for name in ARRAYS:
+			setattr(index, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+		index.names = SavedNames(path)
+		return index
+
+	# (index, similarity) of the titles most similar to name, best first, leaving out those below threshold
+	def search(self, name, limit=5, threshold=0.):
+		normalized = normalize(name)
+		_, trigrams = get_trigrams([normalized])
+		trigrams = np.unique(trigrams)
+		if len(trigrams) == 0:
+			return []
+		postings = [self.titles[self.offsets[trigram]:self.offsets[trigram + 1]] for trigram in trigrams]
+		candidates, common = count_sorted(np.sort(np.concatenate(postings)))
+		if len(candidates) == 0:
+			return []
+		similarity = 2 * common / (len(trigrams) + self.num_trigrams[candidates])
+		# only the best few are sorted
+		if len(similarity) > limit:
+			best = np.argpartition(-similarity, limit - 1)[0:limit]
+			best = best[np.argsort(-similarity[best], kind="stable")]
+		else:
+			best = np.argsort(-similarity, kind="stable")
+		return [(int(candidates[i]), float(similarity[i])) for i in best if similarity[i] >= threshold]
+
+	# indices of the titles which are the same as name once normalized. A name without any letters or digits (like
+	# one written only in non-latin script) is the same as no name, and is never found
+	def find(self, name):
+		normalized = normalize(name)
+		if normalized == "":
+			return []
+		hash = np.uint32(zlib.crc32(normalized.encode('ascii')))
+		start = np.searchsorted(self.hashes, hash, side="left")
+		end = np.searchsorted(self.hashes, hash, side="right")
+		return [int(index) for index in self.hash_order[start:end] if self.names[index] == normalized]
+
+	# the index of the title most similar to name, or None if none is at least threshold similar. Titles with other
+	# numbers than name are never matched, so that a sequel is not mistaken for the game before it
+	def match(self, name, threshold=0.5):
+		normalized = normalize(name)
+		if normalized == "":
+			return None
+		numbers = NUMBER.findall(normalized)
+		for index, similarity in self.search(name, limit=20, threshold=threshold):
+			if NUMBER.findall(self.names[index]) == numbers:
+				return index
+		return None
+
+# the normalized titles of a saved TitleIndex, which are only read when one is asked for
+class SavedNames:
+	def __init__(self, path):
+		self.offsets = np.load(os.path.join(path, "names_offsets.npy"), mmap_mode="r")
+		with open(os.path.join(path, "names.bin"), "rb") as f:
+			# an empty file can not be memory mapped
+			if os.fstat(f.fileno()).st_size == 0:
+				self.blob = b""
+			else:
+				self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, i):
+		return self.blob[self.offsets[i]:self.offsets[i + 1]].decode('ascii')
+
+# the index of a seeded .json file is a directory next to it, the index of a columnar directory lives inside it
+def get_index_path(input):
+	if is_columnar(input):
+		return os.path.join(input, "titles")
+	return os.path.splitext(input)[0] + "_titles"
+
+# the file the titles were read from; the index is built again when it changes
+def get_source(input):
+	path = os.path.join(input, "names.bin") if is_columnar(input) else input
+	stat = os.stat(path)
+	return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def is_index_valid(path, num_games, source):
+	if not os.path.exists(os.path.join(path, "meta.json")):
+		return False
+	with open(os.path.join(path, "meta.json"), "r", encoding='utf-8') as f:
+		meta = json.loads(f.read())
+	return meta["num_games"] == num_games and meta["source"] == source
+
+# the TitleIndex of the names of the games of a seeded file, loaded from its saved index if that is up to date.
+# Otherwise it is built and saved, unless the directory can not be written to
+def get_title_index(input, names, num_games):
+	path = get_index_path(input)
+	source = get_source(input)
+	if is_index_valid(path, num_games, source):
+		return TitleIndex.load(path)
+	index = TitleIndex(names)
+	try:
+		index.save(path)
+		# written last, so that an interrupted save is never mistaken for a finished one
+		with open(os.path.join(path, "meta.json"), "w", encoding='utf-8') as f:
+			f.write(json.dumps({"num_games": num_games, "source": source}))
+	except OSError as e:
+		print("Could not save the title index to " + path + " (" + str(e) + "), it is built again on every run")
+	return index
+
+# finds the closest names in the groups of one map (its "name-to-id" part), which it holds on to, so that its indices
+# always belong to that map. The index of a group is built the first time it is asked for. reported holds the
+# (group, name) pairs whose match a caller printed already, so that it can print each of them once
+class PropertyMatcher:
+	def __init__(self, map):
+		self.map = map
+		self.indices = {}
+		self.reported = set()
+
+	# the name in the map of property (series, genres, ...) which is most similar to name, or None
+	def match(self, property, name, threshold=0.5):
+		if property not in self.indices:
+			names = list(self.map[property])
+			self.indices[property] = (TitleIndex(names), names)
+		index, names = self.indices[property]
+		match = index.match(name, threshold)
+		return names[match] if match is not None else None
+
+# the games of a seeded .json file or columnar directory, indexed by their names. A game is returned as a dict
+# laid out like the games of a seeded .json file. seeded is the file as returned by load_seeded, if it was loaded
+# already
+class GameIndex:
+	def __init__(self, path, seeded=None):
+		if seeded is None:
+			seeded = load_seeded(path)
+		if isinstance(seeded, ColumnarData):
+			self.data = seeded
+			names = (seeded.name(i) for i in range(len(seeded)))
+		else:
+			self.data = list(seeded["games"].values())
+			names = (game["name"] for game in self.data)
+		self.index = get_title_index(path, names, len(self.data))
+
+	def get_game(self, i):
+		if not isinstance(self.data, ColumnarData):
+			return self.data[i]
+		data = self.data
+		return {
+			"name": data.name(i),
+			"esrb": int(data["esrb"][i]),
+			"description": data.description(i),
+			"release_date": str(data["release_year"][i]) if data["release_year"][i] != -1 else "",
+			"metacritic": int(data["metacritic"][i]),
+			"genres": data.get_list("genres", i),
+			"developers": data.get_list("developers", i),
+			"publishers": data.get_list("publishers", i),
+			"series": int(data["series"][i]),
+			"gameplay_main": int(data["gameplay_main"][i]),
+			"gameplay_completionist": int(data["gameplay_completionist"][i]),
+			"selector": int(data["selector"][i])
+		}
+
+	# the game called name (once normalized), or the most similar one if threshold is below 1. When several games
+	# have the name (like a game and its remake), the one seeded with the same RAWG selector is preferred
+	def find(self, name, selector=0, threshold=1.):
+		indices = self.index.find(name)
+		if len(indices) == 0 and threshold < 1:
+			match = self.index.match(name, threshold)
+			indices = [match] if match is not None else []
+		if len(indices) == 0:
+			return None
+		games = [self.get_game(i) for i in indices]
+		for game in games:
+			if game.get("selector", 0) == selector:
+				return game
+		return games[0]
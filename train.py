@@ -18,8 +18,17 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
 import random
-from model_dataset import TrainingModel
+from model_dataset import MODEL_TYPES
+from model_dataset import get_sizes
 from model_dataset import GameDataset
+from model_dataset import GameBatchSampler
+from columnar import ColumnarData, is_columnar
+from solver import fit_direct
+import distributed
+from distributed import AllReduceOptimizer, DistributedBatchSampler
+from descriptions import DEFAULT_BUCKETS, get_hashed_descriptions
+from profiling import add_profile_arguments, start_from_args
+import profiling
 import torch
 from torch.utils.data import DataLoader
 from torch import optim
@@ -27,78 +36,340 @@ import numpy as np
 import argparse
 import os
 
-def get_model(sizes, lr):
-	model = TrainingModel(sizes)
+def get_model(sizes, lr, model_type="one_hot"):
+	model = MODEL_TYPES[model_type](sizes)
 	return model, optim.SGD(model.parameters(), lr=lr)
 
 # taken from https://pytorch.org/tutorials/beginner/nn_tutorial.html
 def loss_batch(model, loss_func, xb, yb, opt=None):
-	loss = loss_func(model(xb), yb)
+	with profiling.stage("forward"):
+		loss = loss_func(model(xb), yb)
 	if opt is not None:
-		loss.backward()
-		opt.step()
-		opt.zero_grad()
-	return loss.item(), len(xb)
+		with profiling.stage("backward"):
+			loss.backward()
+			opt.step()
+			opt.zero_grad()
+	return loss.item(), len(yb)
+
+# keeps the weights with the lowest validation loss, and tells fit to stop once the loss has not improved by more
+# than min_delta for patience evaluations in a row (a patience of 0 never stops)
+class EarlyStopping:
+	def __init__(self, patience=0, min_delta=0.):
+		self.patience = patience
+		self.min_delta = min_delta
+		self.reset()
+	
+	def reset(self):
+		self.best_loss = np.inf
+		self.best_state = None
+		self.bad_evaluations = 0
+	
+	# returns whether the loss is a new best
+	def step(self, loss, model):
+		if loss < self.best_loss - self.min_delta:
+			self.best_loss = loss
+			self.best_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
+			self.bad_evaluations = 0
+			return True
+		self.bad_evaluations = self.bad_evaluations + 1
+		return False
+	
+	def should_stop(self):
+		return self.patience > 0 and self.bad_evaluations >= self.patience
+	
+	def restore(self, model):
+		if self.best_state is not None:
+			model.load_state_dict(self.best_state)
+	
+	def state_dict(self):
+		return {"best_loss": self.best_loss, "best_state": self.best_state, "bad_evaluations": self.bad_evaluations}
+	
+	def load_state_dict(self, state):
+		self.best_loss = state["best_loss"]
+		self.best_state = state["best_state"]
+		self.bad_evaluations = state["bad_evaluations"]
 
 # taken mostly from https://pytorch.org/tutorials/beginner/nn_tutorial.html
-def fit(shuffles, epochs, model, loss_func, opt, train_dl, valid_dl):
-	for epoch in range(epochs):
+# The validation loss is computed every eval_interval epochs (and after the last one); with verbose=False and no
+# stopper it is never computed. on_evaluate(shuffle, next_epoch, improved) is called after every evaluation, with
+# next_epoch set to epochs when training stops early, and a stopper which stopped early restores the best weights.
+# evaluate(model, loss_func, valid_dl) computes the validation loss, get_loss by default.
+def fit(shuffles, epochs, model, loss_func, opt, train_dl, valid_dl, verbose=True, eval_interval=1, stopper=None, on_evaluate=None, start_epoch=0, evaluate=None):
+	for epoch in range(start_epoch, epochs):
 		model.train()
-		for xb, yb in train_dl:
+		# a DistributedBatchSampler draws the order of every epoch from the epoch, so that all ranks draw the same
+		if hasattr(train_dl.sampler, "set_epoch"):
+			train_dl.sampler.set_epoch(epoch)
+		batches = iter(train_dl)
+		while True:
+			with profiling.stage("load batch"):
+				batch = next(batches, None)
+			if batch is None:
+				break
+			xb, yb = batch
 			loss_batch(model, loss_func, xb, yb, opt)
+			profiling.count("train samples", len(yb))
 		
-		model.eval()
-		with torch.no_grad():
-			losses, nums = zip(*[loss_batch(model, loss_func, xb, yb) for xb, yb in valid_dl])
-		val_loss = np.sum(np.multiply(losses, nums)) / np.sum(nums)
-		print(shuffles, epoch, val_loss)
+		if not verbose and stopper is None and on_evaluate is None:
+			continue
+		if (epoch + 1) % eval_interval != 0 and epoch != epochs - 1:
+			continue
+		with profiling.stage("validate"):
+			val_loss = (evaluate or get_loss)(model, loss_func, valid_dl)
+		if verbose:
+			print(shuffles, epoch, val_loss)
+		improved = stopper is not None and stopper.step(val_loss, model)
+		stop = stopper is not None and stopper.should_stop()
+		if stop:
+			if verbose:
+				print("No improvement for " + str(stopper.bad_evaluations) + " evaluations, stopping at epoch " + str(epoch) + " with the best loss " + str(stopper.best_loss))
+			stopper.restore(model)
+		if on_evaluate is not None:
+			on_evaluate(shuffles, epochs if stop else epoch + 1, improved)
+		if stop:
+			break
+
+# everything needed to continue training where it left off, including the random state the current shuffle's
+# train / validity split was made with (split_state) so that the same split is made again, and the state right
+# after it (next_split_state) which the split of the next shuffle continues from
+def save_checkpoint(path, model, opt, stopper, shuffle, epoch, split_state, next_split_state):
+	checkpoint = {
+		"model_type": model.model_type,
+		"model": model.state_dict(),
+		"optimizer": opt.state_dict(),
+		"stopper": stopper.state_dict(),
+		"shuffle": shuffle,
+		"epoch": epoch,
+		"split_state": split_state,
+		"next_split_state": next_split_state,
+		"torch_rng_state": torch.get_rng_state()
+	}
+	# written next to the old checkpoint first, so that an interrupted save never leaves a broken file behind
+	torch.save(checkpoint, path + ".tmp")
+	os.replace(path + ".tmp", path)
+
+def get_split_state():
+	return {"random": random.getstate(), "numpy": np.random.get_state()}
+
+def set_split_state(state):
+	random.setstate(state["random"])
+	np.random.set_state(state["numpy"])
+
+def get_loss(model, loss_func, valid_dl):
+	model.eval()
+	with torch.no_grad():
+		losses, nums = zip(*[(loss_func(model(xb), yb).item(), len(yb)) for xb, yb in valid_dl])
+	return np.sum(np.multiply(losses, nums)) / np.sum(nums)
 		
 # taken mostly from https://pytorch.org/tutorials/beginner/nn_tutorial.html
+# batches are sliced out of the dataset in one go instead of being collated item by item
 def get_data(train_ds, valid_ds, bs, vs):
-	return (DataLoader(train_ds, batch_size=bs, shuffle=True), DataLoader(valid_ds, batch_size=vs))
+	return (DataLoader(train_ds, sampler=GameBatchSampler(len(train_ds), bs, shuffle=True), batch_size=None), DataLoader(valid_ds, sampler=GameBatchSampler(len(valid_ds), vs), batch_size=None))
 
-def get_data_sets(games_dict, sizes):
+# the loaders of one rank of data parallel training: each step's batch of bs games is split among the ranks,
+# and every rank validates its share of the validity set vs games at a time
+def get_distributed_data(train_ds, valid_ds, bs, vs, rank, world_size, seed):
+	train_sampler = DistributedBatchSampler(len(train_ds), bs, rank, world_size, shuffle=True, seed=seed)
+	valid_sampler = DistributedBatchSampler(len(valid_ds), vs * world_size, rank, world_size, pad=False)
+	return DataLoader(train_ds, sampler=train_sampler, batch_size=None), DataLoader(valid_ds, sampler=valid_sampler, batch_size=None)
+
+# games_dict can also be a ColumnarData, which is split by index instead of by key
+# descriptions are the hashed descriptions of every game, only used by the description model
+def get_data_sets(games_dict, sizes, model_type="one_hot", descriptions=None):
+	if isinstance(games_dict, ColumnarData):
+		indices = np.random.permutation(len(games_dict))
+		split_point = int(len(indices) * 0.8)
+		train_ds = GameDataset.from_columnar(games_dict, indices[0:split_point], sizes, model_type, descriptions)
+		valid_ds = GameDataset.from_columnar(games_dict, indices[split_point:], sizes, model_type, descriptions)
+		return train_ds, valid_ds
 	keys = list(games_dict)
 	random.shuffle(keys)
 	split_point = int(len(keys) * 0.8)
-	train_ds = GameDataset(games_dict, keys[0:split_point], sizes)
-	valid_ds = GameDataset(games_dict, keys[split_point:], sizes)
+	train_ds = GameDataset(games_dict, keys[0:split_point], sizes, model_type, descriptions)
+	valid_ds = GameDataset(games_dict, keys[split_point:], sizes, model_type, descriptions)
 	return train_ds, valid_ds
 
-if __name__ == '__main__':
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--input", required=False, help="name of the game data file to use for training", default="seeded_data/data.json")
-	parser.add_argument("--output", required=False, help="name of the model to output", default="models/model.pt")
-	parser.add_argument("--batch_size", required=False, help="batch size for training. Use smaller batches for smaller datasets!", default=32)
-	parser.add_argument("--validity_size", required=False, help="size of the validity batch which loss will be calculated on", default=64)
-	parser.add_argument("--shuffles", required=False, help="the number of validity set shuffles (num evolutions = shuffles * epochs)", default=2)
-	parser.add_argument("--epochs", required=False, help="the number of epochs to train for (num evolutions = shuffles * epochs)", default=1000)
-	parser.add_argument("--learning_rate", required=False, help="the learning rate for training", default=0.000001)
-	args = parser.parse_args()
-	
-	with open(args.input, "r", encoding='utf-8') as f:
-		data_file = json.loads(f.read())
-		games_json = data_file["games"]
-		map_json = data_file["map"]["id-to-name"]
+# every game in the data set, in one GameDataset which can be split into folds
+def get_full_data_set(games_dict, sizes, model_type="one_hot", descriptions=None):
+	if isinstance(games_dict, ColumnarData):
+		return GameDataset.from_columnar(games_dict, np.arange(len(games_dict)), sizes, model_type, descriptions)
+	return GameDataset(games_dict, list(games_dict), sizes, model_type, descriptions)
+
+# splits the shuffled games into k folds; fold i is validated on part i and trained on the other k - 1 parts
+def get_folds(num_items, k, seed=0):
+	parts = np.array_split(np.random.default_rng(seed).permutation(num_items), k)
+	return [(np.concatenate(parts[:i] + parts[i + 1:]), parts[i]) for i in range(k)]
+
+# the loaders of a fold, which draw its games from the whole dataset instead of copies of them
+def get_fold_data(dataset, train_indices, valid_indices, bs, vs):
+	return (DataLoader(dataset, sampler=GameBatchSampler(len(dataset), bs, shuffle=True, indices=train_indices), batch_size=None), DataLoader(dataset, sampler=GameBatchSampler(len(dataset), vs, indices=valid_indices), batch_size=None))
+
+# with a world_size above 1, this is one rank of data parallel training (see distributed.py), which only prints and
+# writes files on rank 0
+def train(args, rank=0, world_size=1):
+	verbose = rank == 0
+	with profiling.stage("load input"):
+		if is_columnar(args.input):
+			games_json = ColumnarData(args.input)
+			map_json = games_json.map["id-to-name"]
+		else:
+			with open(args.input, "r", encoding='utf-8') as f:
+				data_file = json.loads(f.read())
+				games_json = data_file["games"]
+				map_json = data_file["map"]["id-to-name"]
 	
-	num_series = len(map_json["series"].keys())
-	num_genres = len(map_json["genres"].keys())
-	num_esrb_ratings = len(map_json["esrb_ratings"])
-	sizes = (num_series, num_genres, num_esrb_ratings)
+	sizes = get_sizes(map_json)
+	descriptions = None
+	if args.model == "description":
+		# rank 0 builds the cache of the hashed descriptions before the other ranks read it
+		if rank != 0:
+			distributed.barrier()
+		with profiling.stage("hash descriptions"):
+			descriptions = get_hashed_descriptions(args.input, games_json, int(args.description_buckets))
+		if rank == 0 and world_size > 1:
+			distributed.barrier()
+		sizes = sizes + (int(args.description_buckets),)
 	
 	bs = int(args.batch_size)
 	vs = int(args.validity_size)
 	lr = float(args.learning_rate)  # learning rate
 	epochs = int(args.epochs)  # how many epochs to train for
 	shuffles = int(args.shuffles)
-	model, opt = get_model(sizes, lr)
+	evaluate = get_loss
+	if world_size > 1:
+		# every rank makes the same splits and starts from the same weights
+		seed = distributed.broadcast_object(random.randrange(2 ** 31))
+		random.seed(seed)
+		np.random.seed(seed)
+		torch.manual_seed(seed)
+		evaluate = distributed.get_loss
+	model, opt = get_model(sizes, lr, args.model)
+	if world_size > 1:
+		opt = AllReduceOptimizer(model, opt)
+	
+	if args.solver != "sgd":
+		shuffles = 0
+		with profiling.stage("build datasets"):
+			train_ds, valid_ds = get_data_sets(games_json, sizes, model.model_type, descriptions)
+		with profiling.stage("solve"):
+			fit_direct(model, train_ds, args.solver, float(args.l2))
+		print(args.solver, get_loss(model, torch.nn.L1Loss(), get_data(train_ds, valid_ds, bs, vs)[1]))
 	
-	for i in range(0, shuffles):
-		train_ds, valid_ds = get_data_sets(games_json, sizes)
-		train_dl, valid_dl = get_data(train_ds, valid_ds, bs, vs)
-		fit(i, epochs, model, torch.nn.L1Loss(), opt, train_dl, valid_dl)
+	stopper = EarlyStopping(int(args.patience), float(args.min_delta))
+	start_shuffle = 0
+	start_epoch = 0
+	split_state = None
+	if args.resume:
+		if args.checkpoint == "" or not os.path.exists(args.checkpoint):
+			print("Error: --resume needs an existing --checkpoint")
+			exit(-1)
+		checkpoint = torch.load(args.checkpoint, weights_only=False)
+		if checkpoint["model_type"] != model.model_type:
+			print("Error: the checkpoint is of a " + checkpoint["model_type"] + " model, not " + model.model_type)
+			exit(-1)
+		model.load_state_dict(checkpoint["model"])
+		opt.load_state_dict(checkpoint["optimizer"])
+		stopper.load_state_dict(checkpoint["stopper"])
+		start_shuffle = checkpoint["shuffle"]
+		start_epoch = checkpoint["epoch"]
+		split_state = checkpoint["split_state"]
+		if start_epoch >= epochs:
+			start_shuffle = start_shuffle + 1
+			start_epoch = 0
+			split_state = None
+			set_split_state(checkpoint["next_split_state"])
+			stopper.reset()
+		if verbose:
+			print("Resuming at shuffle " + str(start_shuffle) + ", epoch " + str(start_epoch))
 	
+	for i in range(start_shuffle, shuffles):
+		if split_state is not None:
+			set_split_state(split_state)
+		split_state = get_split_state()
+		with profiling.stage("build datasets"):
+			train_ds, valid_ds = get_data_sets(games_json, sizes, model.model_type, descriptions)
+		if world_size > 1:
+			# drawn before next_split_state, so that resuming at the next shuffle draws the same random numbers
+			sampler_seed = int(np.random.randint(2 ** 31))
+		next_split_state = get_split_state()
+		if world_size > 1:
+			train_dl, valid_dl = get_distributed_data(train_ds, valid_ds, bs, vs, rank, world_size, sampler_seed)
+		else:
+			train_dl, valid_dl = get_data(train_ds, valid_ds, bs, vs)
+		if i == start_shuffle and args.resume:
+			torch.set_rng_state(checkpoint["torch_rng_state"])
+		
+		def on_evaluate(shuffle, next_epoch, improved):
+			if improved and args.best_output != "":
+				with profiling.stage("save best model"):
+					torch.save(stopper.best_state, args.best_output)
+			if args.checkpoint != "":
+				with profiling.stage("checkpoint"):
+					save_checkpoint(args.checkpoint, model, opt, stopper, shuffle, next_epoch, split_state, next_split_state)
+		
+		# only the first worker writes files
+		saves = rank == 0 and (args.checkpoint != "" or args.best_output != "")
+		fit(i, epochs, model, torch.nn.L1Loss(), opt, train_dl, valid_dl, verbose=verbose, eval_interval=int(args.eval_interval), stopper=stopper, on_evaluate=on_evaluate if saves else None, start_epoch=start_epoch, evaluate=evaluate)
+		start_epoch = 0
+		split_state = None
+		# the validity set of the next shuffle is a different one, so its losses can not be compared with this one's
+		stopper.reset()
+	
+	train_seconds = sum(profiling.profiler.get_stage_seconds(name) for name in ("load batch", "forward", "backward"))
+	if train_seconds > 0:
+		# every rank trains on as many samples as rank 0, which is the one profiled
+		profiling.set_value("train samples per second", profiling.profiler.get_counter("train samples") * world_size / train_seconds)
+	
+	if rank != 0:
+		return
 	print("Saving to " + args.output)
-	if os.path.exists(args.output):
-		os.remove(args.output)
-	torch.save(model.state_dict(), args.output)
\ No newline at end of file
+	with profiling.stage("save model"):
+		if os.path.exists(args.output):
+			os.remove(args.output)
+		torch.save(model.state_dict(), args.output)
+
+# the processes started by train.py --workers never run the exit handlers, so rank 0 finishes its profile itself
+def run_worker(rank, world_size, args, threads):
+	torch.set_num_threads(threads)
+	if rank == 0:
+		start_from_args(args, "train")
+	train(args, rank, world_size)
+	profiling.profiler.finish()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--input", required=False, help="name of the game data file (or columnar directory) to use for training", default="seeded_data/data.json")
+	parser.add_argument("--output", required=False, help="name of the model to output", default="models/model.pt")
+	parser.add_argument("--batch_size", required=False, help="batch size for training. Use smaller batches for smaller datasets!", default=32)
+	parser.add_argument("--validity_size", required=False, help="size of the validity batch which loss will be calculated on", default=64)
+	parser.add_argument("--shuffles", required=False, help="the number of validity set shuffles (num evolutions = shuffles * epochs)", default=2)
+	parser.add_argument("--epochs", required=False, help="the number of epochs to train for (num evolutions = shuffles * epochs)", default=1000)
+	parser.add_argument("--learning_rate", required=False, help="the learning rate for training", default=0.000001)
+	parser.add_argument("--solver", required=False, help="sgd, or solve for the best weights directly: lstsq (least squares) or l1 (least absolute error, like the L1Loss used by sgd). Direct solvers only use the first shuffle and ignore the epochs / batch sizes / learning rate", choices=["sgd", "lstsq", "l1"], default="sgd")
+	parser.add_argument("--l2", required=False, help="ridge penalty used by the lstsq and l1 solvers, helps small datasets generalize", default=0)
+	parser.add_argument("--eval_interval", required=False, help="number of epochs between validation losses", default=1)
+	parser.add_argument("--patience", required=False, help="stop a shuffle after this many validations without improvement and keep its best weights (0 to train every epoch)", default=0)
+	parser.add_argument("--min_delta", required=False, help="smallest decrease of the validation loss which counts as an improvement", default=0)
+	parser.add_argument("--best_output", required=False, help="also save the model with the best validation loss of the current shuffle here, whenever it improves", default="")
+	parser.add_argument("--checkpoint", required=False, help="file to save the model, optimizer and training position to after every validation", default="")
+	parser.add_argument("--resume", required=False, help="continue training from --checkpoint", action="store_true")
+	parser.add_argument("--model", required=False, help="one_hot, embedding to look up category ids directly (much less memory for large maps), multi_hot to also use every genre, developer and publisher, or description to also use the words of the description", choices=list(MODEL_TYPES), default="one_hot")
+	parser.add_argument("--description_buckets", required=False, help="number of hash buckets the words of the descriptions are hashed into (description model)", default=DEFAULT_BUCKETS)
+	parser.add_argument("--workers", required=False, help="train with this many processes in parallel, each on its share of every batch (sgd only)", default=1)
+	parser.add_argument("--threads", required=False, help="torch threads per worker (default: the cores divided among the workers)", default=0)
+	add_profile_arguments(parser)
+	args = parser.parse_args()
+	
+	workers = int(args.workers)
+	if workers > 1:
+		if args.solver != "sgd":
+			print("Error: --workers only applies to --solver sgd")
+			exit(-1)
+		threads = int(args.threads) if int(args.threads) > 0 else max(1, (os.cpu_count() or 1) // workers)
+		print("Training with " + str(workers) + " workers with " + str(threads) + " threads each")
+		distributed.launch(run_worker, workers, args, threads)
+		exit(0)
+	if int(args.threads) > 0:
+		torch.set_num_threads(int(args.threads))
+	start_from_args(args, "train")
+	train(args)